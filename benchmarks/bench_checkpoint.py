@@ -0,0 +1,149 @@
+# bench_checkpoint.py
+"""Coût du checkpointer SQLite (`src.checkpoint`) et reprise après interruption.
+
+Runs the graph on `--tickets` synthetic tickets (fake LLM, outbox sink)
+with `CompactCheckpointSaver` on a temporary database, with and without
+zlib compression, and reports `put` latency p50 / p95, checkpoints
+written and bytes on disk per ticket.
+
+The resume check runs until the human review `interrupt()`, then opens
+a new saver on the same file (as a restarted service would), resumes with
+`Command(resume=...)` and checks that no categorization call is repeated.
+
+    python -m benchmarks.bench_checkpoint --tickets 200
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+from benchmarks.bench_pipeline import _ROOT, _parse_mix, _percentile, _templates, synthetic_tickets
+from benchmarks.fakes import install_fake_llm, install_outbox_sink
+
+
+def _timed_saver(path, compress_min, samples):
+    from src.checkpoint import CompactCheckpointSaver, SQLiteCheckpointStore
+
+    saver = CompactCheckpointSaver(SQLiteCheckpointStore(path), compress_min=compress_min)
+    put = saver.put
+
+    def timed_put(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return put(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    saver.put = timed_put
+    return saver
+
+
+async def _drive(graph, payload, config):
+    interrupts = []
+    async for chunk in graph.astream(payload, config, stream_mode="updates"):
+        interrupts.extend(chunk.get("__interrupt__", ()))
+    return interrupts
+
+
+def _answer(interrupts):
+    """Reviewer answer: validate nothing, acknowledge tool calls."""
+    value = interrupts[0].value if interrupts else None
+    if isinstance(value, dict) and value.get("action") == "review_required":
+        return {"validated_tickets": []}
+    return {"ok": True}
+
+
+def _resume_all(graph, interrupts, config, limit=10):
+    """Answer interrupts until the run ends; returns how many were answered."""
+    from langgraph.types import Command
+
+    answered = 0
+    while interrupts and answered < limit:
+        interrupts = asyncio.run(_drive(graph, Command(resume=_answer(interrupts)), config))
+        answered += 1
+    return answered
+
+
+def measure(tickets, compress_min, directory):
+    from src.graph import create_graph
+
+    path = os.path.join(directory, f"size-{compress_min}.sqlite3")
+    samples = []
+    saver = _timed_saver(path, compress_min, samples)
+    graph = create_graph(checkpointer=saver)
+    config = {"configurable": {"thread_id": "bench"}}
+    _resume_all(graph, asyncio.run(_drive(graph, {"tickets": tickets}, config)), config)
+    size = saver.store.size_bytes()
+    saver.store.close()
+    return {
+        "puts": len(samples),
+        "p50_ms": _percentile(samples, 0.50) * 1000,
+        "p95_ms": _percentile(samples, 0.95) * 1000,
+        "bytes_per_ticket": size / len(tickets),
+    }
+
+
+def resume_check(tickets, directory, fake):
+    from src.checkpoint import CompactCheckpointSaver, SQLiteCheckpointStore
+    from src.graph import create_graph
+
+    path = os.path.join(directory, "resume.sqlite3")
+    config = {"configurable": {"thread_id": "resume"}}
+    first = CompactCheckpointSaver(SQLiteCheckpointStore(path))
+    interrupts = asyncio.run(_drive(create_graph(checkpointer=first), {"tickets": tickets}, config))
+    first.store.close()
+    before = fake.stats["calls"]
+
+    # A fresh saver on the same file, as after a restart
+    second = CompactCheckpointSaver(SQLiteCheckpointStore(path))
+    graph = create_graph(checkpointer=second)
+    _resume_all(graph, interrupts, config)
+    state = graph.get_state(config)
+    second.store.close()
+    return {
+        "interrupted": bool(interrupts),
+        "calls_before": before,
+        "calls_after_resume": fake.stats["calls"] - before,
+        "finished": not state.next,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--mix", default="information_search=0.4,feedback=0.4,product_complaint=0.2")
+    parser.add_argument("--templates", default=os.path.join(_ROOT, "ticket.json"))
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    os.environ.update(
+        RESULT_CACHE_ENABLED="false", FASTPATH_ENABLED="false", WARMUP_ON_STARTUP="false",
+        THREADS_ENABLED="false", EMAIL_DELIVERY_MODE="outbox", METRICS_ENABLED="false",
+        # The resume check needs the review to pause the run
+        REVIEW_MODE="interrupt",
+    )
+    os.environ.setdefault("KB_PATH", os.path.join(_ROOT, "agentia.txt"))
+    fake = install_fake_llm(latency=args.latency, seed=1)
+    install_outbox_sink()
+    tickets = synthetic_tickets(args.tickets, _parse_mix(args.mix), _templates(args.templates))
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.tickets} tickets")
+        # compress_min above any blob size disables compression
+        for label, compress_min in (("raw", 1 << 62), ("zlib", 256)):
+            r = measure(tickets, compress_min, directory)
+            print(f"  {label:5s} {r['puts']:4d} puts  p50={r['p50_ms']:7.2f} ms  p95={r['p95_ms']:7.2f} ms  "
+                  f"{r['bytes_per_ticket']:8.0f} bytes/ticket on disk")
+
+        r = resume_check(tickets, directory, fake)
+    print(f"resume: interrupted={r['interrupted']}, {r['calls_before']} LLM calls before the review, "
+          f"{r['calls_after_resume']} after resume, finished={r['finished']}")
+    if not r["interrupted"] or not r["finished"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# bench_fanout.py
+"""Latence de queue : graphe par lots vs fan-out par ticket (Send).
+
+Runs the same mixed batch (information requests, feedback, product
+complaints) through both graph modes against the fake LLM, where a small
+fraction of calls is very slow (`--slow-rate`, `--slow-latency`). A
+ticket is considered done when the last graph update mentioning it
+is streamed (RAG answer, feedback type / email, product email). Reports
+p50 / p95 / max completion time per mode, measured from the routing step
+(categorization is identical in both modes) and end to end.
+
+    python -m benchmarks.bench_fanout --tickets 60 --slow-rate 0.05
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+from benchmarks.fakes import install_fake_llm, install_outbox_sink
+
+_TEMPLATES = (
+    ("Question livraison", "Bonjour, comment suivre ma commande ? Est-il possible de changer l'adresse ?"),
+    ("Merci", "Merci pour votre service, j'adore la nouvelle interface, une suggestion : un mode sombre."),
+    ("Produit cassé", "Le produit reçu est cassé et ne fonctionne pas, je demande un remboursement."),
+)
+
+
+def _tickets(n):
+    return [{"id": i, "subject": _TEMPLATES[i % 3][0], "body": f"{_TEMPLATES[i % 3][1]} (#{i})"} for i in range(n)]
+
+
+def _ids_in(update):
+    """Ticket ids a node update reports results for."""
+    ids = set()
+    for field in ("rag_answers", "ticket_feedback_types"):
+        ids.update((update.get(field) or {}).keys())
+    for field in ("sent_ids", "product_sent_ids"):
+        ids.update(update.get(field) or [])
+    return ids
+
+
+async def _run(graph, tickets):
+    started = time.perf_counter()
+    routed_at = 0.0
+    done = {}
+    async for chunk in graph.astream({"tickets": tickets}, stream_mode="updates"):
+        now = time.perf_counter() - started
+        if "route_ticket" in chunk:
+            routed_at = now
+        for update in chunk.values():
+            if isinstance(update, dict):
+                for tid in _ids_in(update):
+                    done[tid] = now
+    return done, routed_at
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    # Offline: no result cache, no fast path, emails go to a local outbox
+    os.environ.update(RESULT_CACHE_ENABLED="false", FASTPATH_ENABLED="false", EMAIL_DELIVERY_MODE="outbox")
+    os.environ.setdefault("KB_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agentia.txt"))
+    install_outbox_sink()
+
+    from src.graph import create_graph
+
+    tickets = _tickets(args.tickets)
+    report = {}
+    for mode in ("batch", "per_ticket"):
+        # Same seed per mode so both see the same slow calls
+        install_fake_llm(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency, seed=1)
+        done, routed_at = asyncio.run(_run(create_graph(mode), tickets))
+        branch = [t - routed_at for t in done.values()]
+        report[mode] = (len(done), _percentile(branch, 0.5), _percentile(branch, 0.95), max(branch), max(done.values()))
+
+    print("completion time after routing:")
+    for mode, (n, p50, p95, worst, total) in report.items():
+        print(f"{mode:10s} tickets={n:4d}  p50={p50:6.2f}s  p95={p95:6.2f}s  max={worst:6.2f}s  (run {total:.2f}s)")
+    return 0 if report["batch"][0] == report["per_ticket"][0] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# bench_import.py
+"""Mesure le temps d'import (cold start) et échoue au-delà d'un budget.
+
+Each module is imported in a fresh interpreter with `-X importtime`; the
+script reports the wall-clock import time and the slowest imported
+packages, and exits with status 1 when any module exceeds its budget.
+
+    python -m benchmarks.bench_import                      # src.graph, service
+    python -m benchmarks.bench_import src.nodes --budget-ms 800
+    IMPORT_BUDGET_MS=1500 python -m benchmarks.bench_import
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module, runs=3):
+    """Best of `runs` fresh-interpreter imports: (total_ms, slowest imports)."""
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, cwd=os.getcwd(),
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        entries = []
+        total_us = 0
+        for line in proc.stderr.splitlines():
+            match = _LINE.match(line)
+            if not match:
+                continue
+            cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+            if indent == 1:
+                total_us += cumulative
+            # Direct and second-level imports: enough to spot a heavy dependency
+            if indent <= 5 and name != module:
+                entries.append((cumulative / 1000.0, name))
+        total_ms = total_us / 1000.0
+        if best is None or total_ms < best[0]:
+            best = (total_ms, sorted(entries, reverse=True))
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=["src.graph", "service"])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "2000")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        total_ms, top = measure(module, args.runs)
+        status = "OK" if total_ms <= args.budget_ms else "OVER BUDGET"
+        failed |= total_ms > args.budget_ms
+        print(f"{module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        for ms, name in top[:args.top]:
+            print(f"    {ms:8.1f} ms  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# bench_ingest.py
+"""Mémoire et débit de l'ingestion en flux vs `json.load`.
+
+Generates a synthetic export (`--tickets` tickets, JSON array or JSONL),
+then measures the peak Python heap (tracemalloc) and throughput of:
+
+- `json.load` of the whole file (previous behaviour: the caller parsed
+  the export and passed the full list in the input state);
+- `src.ingest.astream_batches`, consumed batch by batch.
+
+    python -m benchmarks.bench_ingest --tickets 200000 --format jsonl
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+from src.ingest import astream_batches
+
+
+def _write_export(path, n, fmt):
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "json":
+            f.write("[\n")
+        for i in range(n):
+            ticket = {"id": i, "thread_id": f"discussion_{i // 3:06d}", "sender": f"client{i}@example.com",
+                      "subject": f"Commande {i} endommagée", "body": "Bonjour, mon colis est arrivé abîmé. " * 4}
+            line = json.dumps(ticket, ensure_ascii=False)
+            if fmt == "json":
+                f.write(("    " + line) + (",\n" if i < n - 1 else "\n"))
+            else:
+                f.write(line + "\n")
+        if fmt == "json":
+            f.write("]\n")
+
+
+def _measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=100000)
+    parser.add_argument("--format", choices=("json", "jsonl"), default="json")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"tickets.{args.format}")
+        _write_export(path, args.tickets, args.format)
+        size_mb = os.path.getsize(path) / 1e6
+
+        def full_load():
+            with open(path, "r", encoding="utf-8") as f:
+                if args.format == "json":
+                    return len(json.load(f))
+                return len([json.loads(line) for line in f if line.strip()])
+
+        def streamed():
+            async def consume():
+                n = 0
+                async for batch in astream_batches(path, args.batch_size):
+                    n += len(batch)
+                return n
+            return asyncio.run(consume())
+
+        print(f"export: {args.tickets} tickets, {size_mb:.1f} MB ({args.format})")
+        results = {}
+        for name, fn in (("json.load", full_load), ("streaming", streamed)):
+            count, elapsed, peak = _measure(fn)
+            results[name] = count
+            print(f"{name:10s} {count / elapsed:10.0f} tickets/s   peak heap {peak / 1e6:8.1f} MB")
+    return 0 if results["json.load"] == results["streaming"] == args.tickets else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
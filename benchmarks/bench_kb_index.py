@@ -0,0 +1,145 @@
+# bench_kb_index.py
+"""Réindexation incrémentale de la base de connaissances vs reconstruction complète.
+
+Writes a synthetic KB directory (`--files` files of `--sections` sections
+of `--paragraphs` paragraphs from `agentia.txt`), indexes it with
+`src.kb_index`, with a fake embedding API (`--embed-latency` per request,
+`--text-latency` per text) behind a fake vector store, then edits `--edit`
+of the sections and compares:
+
+- full rebuild: a new indexer builds everything (read, chunk, tokenize,
+  embed every chunk), as a restart used to;
+- incremental: the live indexer applies the edit (`refresh()`).
+
+`--edit-mode` picks the edit: "append" adds a sentence to the last
+paragraph of a section, "insert" adds a paragraph at its start, "change"
+rewrites a paragraph in its middle. The re-embed rate is the number of
+chunks embedded again per edited section; with position-independent
+chunk boundaries it stays close to 1 whatever the mode.
+
+Checks that the incremental index matches the full rebuild (same chunks,
+same BM25 results, same vector ids) and exits 1 otherwise.
+
+    python -m benchmarks.bench_kb_index --files 200 --sections 20 --edit 0.01 --edit-mode insert
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.fakes import FakeEmbeddings, FakeVectorStore
+from src.kb_index import KnowledgeBaseIndexer
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_QUERIES = ("foundational model", "voice calling tools", "prompt improvement", "versioning downtime", "RAG own data")
+
+
+def _paragraphs():
+    with open(os.path.join(_ROOT, "agentia.txt"), "r", encoding="utf-8") as f:
+        text = f.read()
+    return [p.strip() for p in text.split("\n\n") if p.strip() and not p.strip().startswith("---")]
+
+
+def write_kb(directory, files, sections, rng, paragraphs_per_section=3):
+    paragraphs = _paragraphs()
+    for f in range(files):
+        parts = []
+        for s in range(sections):
+            body = "\n\n".join(rng.sample(paragraphs, paragraphs_per_section))
+            parts.append(f"**Document {f} section {s}** (ref-{f}-{s})\n\n{body}")
+        path = os.path.join(directory, f"part{f // 50:02d}", f"doc{f:04d}.md")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as out:
+            out.write("\n\n---\n\n".join(parts))
+
+
+def _edit_section(section, mode, rng):
+    note = f"Updated policy {rng.randrange(10 ** 6)}: contact support for details."
+    if mode == "append":
+        return f"{section} {note}"
+    paragraphs = section.split("\n\n")
+    if mode == "insert":
+        # After the section title
+        return "\n\n".join(paragraphs[:1] + [note] + paragraphs[1:])
+    middle = len(paragraphs) // 2
+    paragraphs[middle] = f"{paragraphs[middle]} {note}"
+    return "\n\n".join(paragraphs)
+
+
+def edit_kb(directory, files, sections, share, rng, mode="append"):
+    """Edit `share` of the sections (see `--edit-mode`); returns the number edited."""
+    total = files * sections
+    picked = rng.sample(range(total), max(1, int(total * share)))
+    for n in picked:
+        f, s = divmod(n, sections)
+        path = os.path.join(directory, f"part{f // 50:02d}", f"doc{f:04d}.md")
+        with open(path, "r", encoding="utf-8") as fh:
+            parts = fh.read().split("\n\n---\n\n")
+        parts[s] = _edit_section(parts[s], mode, rng)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("\n\n---\n\n".join(parts))
+    return len(picked)
+
+
+def _indexer(directory, manifest, args):
+    embeddings = FakeEmbeddings(request_latency=args.embed_latency, text_latency=args.text_latency)
+    store = FakeVectorStore(embeddings)
+    indexer = KnowledgeBaseIndexer(directory, vectorstore=store, chunk_size=args.chunk_size, manifest_path=manifest)
+    return indexer, embeddings, store
+
+
+def _timed(indexer, embeddings):
+    before = embeddings.texts
+    started = time.perf_counter()
+    summary = indexer.refresh()
+    return time.perf_counter() - started, embeddings.texts - before, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs per section")
+    parser.add_argument("--edit", type=float, default=0.01, help="share of sections edited")
+    parser.add_argument("--edit-mode", choices=("append", "insert", "change"), default="change")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="seconds per embedding request")
+    parser.add_argument("--text-latency", type=float, default=0.0005, help="seconds per embedded text")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kb = os.path.join(tmp, "kb")
+        write_kb(kb, args.files, args.sections, rng, args.paragraphs)
+        live, live_embeddings, live_store = _indexer(kb, os.path.join(tmp, "live.json"), args)
+        initial, _, summary = _timed(live, live_embeddings)
+        print(f"KB: {args.files} files, {summary['chunks']} chunks; initial build {initial:.2f}s")
+
+        edited = edit_kb(kb, args.files, args.sections, args.edit, rng, args.edit_mode)
+        incremental, inc_embedded, inc = _timed(live, live_embeddings)
+        full_indexer, full_embeddings, full_store = _indexer(kb, os.path.join(tmp, "full.json"), args)
+        full, full_embedded, _ = _timed(full_indexer, full_embeddings)
+
+        print(f"edit ({args.edit_mode}): {edited} sections in {inc['files_changed']} files "
+              f"(+{inc['chunks_added']} / -{inc['chunks_removed']} chunks)")
+        print(f"  re-embed rate {inc_embedded / edited:.2f} chunks per edited section "
+              f"({inc_embedded / summary['chunks']:.2%} of the KB)")
+        print(f"  full rebuild  {full:8.3f}s  {full_embedded:6d} texts embedded")
+        print(f"  incremental   {incremental:8.3f}s  {inc_embedded:6d} texts embedded  ({full / incremental:.0f}x faster)")
+
+        a, b = live.current, full_indexer.current
+        same = (
+            a.chunks == b.chunks
+            and a.content_hash == b.content_hash
+            and all(a.index.search(q, 10) == b.index.search(q, 10) for q in _QUERIES)
+            and set(live_store.vectors) == set(full_store.vectors)
+        )
+        print(f"  incremental index identical to full rebuild: {'yes' if same else 'NO'}")
+        return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# bench_pipeline.py
+"""Débit de bout en bout du graphe sur des lots synthétiques, hors ligne.
+
+Runs the compiled graph (`src.graph.create_graph`) on synthetic ticket
+sets built from the `ticket.json` templates, with a configurable category
+mix, against the fake LLM (`benchmarks.fakes.FakeChatModel`: latency,
+error and throttle rates). Emails go to the in-memory outbox sink, or
+through real SMTP sessions to a local `SMTPSink` with `--smtp`.
+
+Each size runs in its own subprocess so peak RSS is measured per run.
+Reports throughput, per-node p50 / p95 / p99, peak RSS and the largest
+checkpoint (state after a superstep, serialized like the LangGraph
+checkpointer does). `--save` stores the results as the baseline;
+later runs are compared against it and exit 1 on a regression beyond
+`--tolerance`.
+
+    python -m benchmarks.bench_pipeline --sizes 100,10000 --save
+    python -m benchmarks.bench_pipeline --sizes 100,10000 --mix information_search=0.6,feedback=0.3,product_complaint=0.1
+    python -m benchmarks.bench_pipeline --sizes 1000 --analysis combined
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import asyncio
+import argparse
+import functools
+import subprocess
+
+from benchmarks.fakes import SMTPSink, _category_for, install_fake_llm, install_outbox_sink
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_BASELINE = os.path.join(_ROOT, ".cache", "bench_pipeline_baseline.json")
+_CATEGORIES = ("information_search", "feedback", "product_complaint")
+
+# Used when ticket.json has no template for a category
+_FALLBACK_TEMPLATES = {
+    "information_search": ("Question livraison", "Bonjour, comment suivre ma commande ? Est-il possible de changer l'adresse ?"),
+    "feedback": ("Merci", "Merci pour votre service, j'adore la nouvelle interface, une suggestion : un mode sombre."),
+    "product_complaint": ("Produit cassé", "Le produit reçu est cassé et ne fonctionne pas, je demande un remboursement."),
+}
+
+
+class _NoChoice:
+    def choice(self, options):
+        return None
+
+
+def _templates(path):
+    """Templates of `ticket.json` grouped by the category the fake LLM gives them."""
+    grouped = {c: [] for c in _CATEGORIES}
+    with open(path, "r", encoding="utf-8") as f:
+        for t in json.load(f):
+            # Bodies the fake categorizes at random are skipped
+            category = _category_for(t.get("body", ""), _NoChoice())
+            if category is not None:
+                grouped[category].append(t)
+    for category, (subject, body) in _FALLBACK_TEMPLATES.items():
+        if not grouped[category]:
+            grouped[category].append({"subject": subject, "body": body, "source": "gmail"})
+    return grouped
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in _CATEGORIES:
+            raise SystemExit(f"unknown category in --mix: {name!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def synthetic_tickets(n, mix, templates, seed=0):
+    """`n` tickets drawn from `templates` so categories follow `mix`."""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[c] for c in names]
+    tickets = []
+    for i in range(n):
+        template = rng.choice(templates[rng.choices(names, weights)[0]])
+        tickets.append({
+            "id": i,
+            "thread_id": f"discussion_{i // 3:06d}",
+            "source": template.get("source", "gmail"),
+            "sender": f"client{i}@example.com",
+            "subject": template["subject"],
+            # Unique bodies: no two tickets share a cache entry
+            "body": f"{template['body']} (#{i})",
+        })
+    return tickets
+
+
+def _serializer():
+    try:
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+        serde = JsonPlusSerializer()
+        return lambda state: serde.dumps_typed(state)[1]
+    except ImportError:
+        return pickle.dumps
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _install_node_timer(samples):
+    """Make `create_graph` wrap nodes with a timer feeding `samples[node]`."""
+    import src.graph as graph_module
+
+    def timed(name, fn):
+        @functools.wraps(fn)
+        async def node(state):
+            started = time.perf_counter()
+            try:
+                return await fn(state)
+            finally:
+                samples.setdefault(name, []).append(time.perf_counter() - started)
+
+        return node
+
+    graph_module.instrument_node = timed
+
+
+async def _drive(graph, tickets, dumps):
+    largest = 0
+    async for state in graph.astream({"tickets": tickets}, stream_mode="values"):
+        largest = max(largest, len(dumps(state)))
+    return largest
+
+
+def run_once(args):
+    """One size, in this process; returns the result dict."""
+    os.environ.update(
+        RESULT_CACHE_ENABLED="false", FASTPATH_ENABLED="false", WARMUP_ON_STARTUP="false",
+        GRAPH_MODE=args.mode, EMAIL_DELIVERY_MODE="inline" if args.smtp else "outbox",
+        ANALYSIS_MODE=args.analysis,
+    )
+    os.environ.setdefault("KB_PATH", os.path.join(_ROOT, "agentia.txt"))
+    fake = install_fake_llm(latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=1)
+    outbox = None if args.smtp else install_outbox_sink()
+
+    samples = {}
+    _install_node_timer(samples)
+    from src.graph import create_graph
+
+    tickets = synthetic_tickets(args.size, _parse_mix(args.mix), _templates(args.templates))
+    graph = create_graph(args.mode)
+
+    sink = SMTPSink(port=args.smtp_port) if args.smtp else None
+    if sink is not None:
+        sink.__enter__()
+        os.environ.update(SMTP_HOST=sink.host, SMTP_PORT=str(sink.port), SMTP_STARTTLS="false")
+    try:
+        started = time.perf_counter()
+        checkpoint = asyncio.run(_drive(graph, tickets, _serializer()))
+        elapsed = time.perf_counter() - started
+        if outbox is not None:
+            outbox.flush()
+    finally:
+        if sink is not None:
+            sink.__exit__(None, None, None)
+
+    return {
+        "size": args.size,
+        "mode": args.mode,
+        "seconds": round(elapsed, 3),
+        "tickets_per_s": round(args.size / elapsed, 1),
+        "peak_rss_mb": _peak_rss_mb(),
+        "checkpoint_kb": round(checkpoint / 1024, 1),
+        "llm_calls": fake.stats["calls"],
+        "emails": sink.received if sink is not None else outbox.stats()["sent"],
+        "nodes": {
+            name: {
+                "calls": len(values),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+            }
+            for name, values in sorted(samples.items())
+        },
+    }
+
+
+def _run_isolated(size, argv):
+    cmd = [sys.executable, "-m", "benchmarks.bench_pipeline", "--child", "--sizes", str(size)] + argv
+    out = subprocess.run(cmd, cwd=_ROOT, check=True, capture_output=True, text=True).stdout
+    # The pipeline prints progress; the result is the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _print(result):
+    rss = f"{result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else "n/a"
+    print(f"\n{result['size']} tickets ({result['mode']}): {result['tickets_per_s']:.1f} tickets/s in {result['seconds']:.2f}s, "
+          f"peak RSS {rss}, largest checkpoint {result['checkpoint_kb']:.1f} KB, "
+          f"{result['llm_calls']} LLM calls, {result['emails']} emails")
+    for name, st in result["nodes"].items():
+        print(f"  {name:26s} n={st['calls']:6d}  p50={st['p50_ms']:9.2f}  p95={st['p95_ms']:9.2f}  p99={st['p99_ms']:9.2f} ms")
+
+
+def _regressions(result, baseline, tolerance):
+    found = []
+    if result["tickets_per_s"] < baseline["tickets_per_s"] * (1 - tolerance):
+        found.append(f"throughput {baseline['tickets_per_s']} -> {result['tickets_per_s']} tickets/s")
+    for name, st in result["nodes"].items():
+        before = baseline["nodes"].get(name)
+        if before and st["p95_ms"] > before["p95_ms"] * (1 + tolerance) + 1:
+            found.append(f"{name} p95 {before['p95_ms']} -> {st['p95_ms']} ms")
+    return found
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100", help="comma-separated ticket counts, e.g. 100,10000,100000")
+    parser.add_argument("--mix", default="information_search=0.4,feedback=0.4,product_complaint=0.2")
+    parser.add_argument("--mode", choices=("batch", "per_ticket"), default="batch")
+    parser.add_argument("--analysis", choices=("separate", "combined"), default="separate")
+    parser.add_argument("--templates", default=os.path.join(_ROOT, "ticket.json"))
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--smtp", action="store_true", help="send through a local aiosmtpd sink")
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--baseline", default=_BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    if args.child:
+        args.size = sizes[0]
+        print(json.dumps(run_once(args)))
+        return 0
+
+    forwarded = [
+        "--mix", args.mix, "--mode", args.mode, "--analysis", args.analysis, "--templates", args.templates, "--latency", str(args.latency),
+        "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate), "--smtp-port", str(args.smtp_port),
+    ] + (["--smtp"] if args.smtp else [])
+    results = [_run_isolated(size, forwarded) for size in sizes]
+    for result in results:
+        _print(result)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    status = 0
+    for result in results:
+        key = f"{result['mode']}:{result['size']}"
+        before = baseline.get("results", {}).get(key)
+        if before is None:
+            continue
+        found = _regressions(result, before, args.tolerance)
+        if found:
+            status = 1
+            print(f"\n⚠️  regression vs baseline {baseline.get('commit')} ({key}):")
+            for line in found:
+                print(f"   {line}")
+
+    if args.save:
+        merged = baseline.get("results", {})
+        merged.update({f"{r['mode']}:{r['size']}": r for r in results})
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"commit": _git_commit(), "saved_at": time.time(), "results": merged}, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
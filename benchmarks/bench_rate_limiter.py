@@ -0,0 +1,59 @@
+# bench_rate_limiter.py
+"""Vérifie le limiteur AIMD contre un faux LLM qui renvoie des 429.
+
+The fake model accepts at most `--capacity` concurrent calls and answers
+429 (with a retry-after hint) beyond that. The script pushes `--calls`
+requests through `src.llm.ainvoke` with far more concurrency than the fake
+allows and reports throughput, 429s and the limit the controller settled
+on. It exits with status 1 if any call ultimately failed or if the limit
+did not converge near the capacity.
+
+    python -m benchmarks.bench_rate_limiter --calls 400 --capacity 6
+"""
+import sys
+import time
+import asyncio
+import argparse
+
+from benchmarks.fakes import install_fake_llm
+
+
+async def _run(args):
+    from src.llm import ainvoke, get_llm
+    from src.ratelimit import get_rate_limiter
+
+    fake = install_fake_llm(latency=args.latency, capacity=args.capacity, retry_after=args.retry_after)
+    llm = get_llm("fake-gemini")
+    limiter = get_rate_limiter(llm.model)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(ainvoke(llm, f"call {i}") for i in range(args.calls)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    failures = [r for r in results if isinstance(r, Exception)]
+    stats = limiter.stats()
+
+    print(f"calls: {args.calls} in {elapsed:.2f}s -> {args.calls / elapsed:.1f} calls/s "
+          f"(ideal {args.capacity / args.latency:.1f} calls/s)")
+    print(f"server 429s: {fake.stats['throttled']}, max in flight seen by server: {fake.stats['max_in_flight']}")
+    print(f"limiter: limit={stats['limit']:.1f} increases={stats['increases']} "
+          f"decreases={stats['decreases']} throttled={stats['throttled']}")
+    print(f"failed calls: {len(failures)}")
+
+    ok = not failures and stats["limit"] <= args.capacity * 2
+    return 0 if ok else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--capacity", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# bench_sentiment_engine.py
+"""Moteurs de sentiment : temps de chargement, RSS, débit et parité des labels.
+
+Loads each engine of `--engines` in its own subprocess (so RSS is the
+engine's own) and classifies the bodies of `--tickets` synthetic tickets:
+
+- `transformers`: the torch pipeline (current default);
+- `onnx`: `src.sentiment_onnx` with the fp32 export;
+- `onnx-int8`: same, dynamically quantized to int8.
+
+Reports load time (imports included), peak RSS, tickets per second and,
+for every engine, the share of labels identical to the transformers
+pipeline. Exits 1 when an engine agrees on less than `--min-agreement`.
+Export the ONNX models first:
+
+    python -m src.sentiment_onnx --out .cache/sentiment-onnx
+    python -m benchmarks.bench_sentiment_engine --tickets 1000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from benchmarks.bench_pipeline import _ROOT, _parse_mix, _peak_rss_mb, _templates, synthetic_tickets
+
+_ENGINES = {
+    "transformers": {"SENTIMENT_ENGINE": "transformers"},
+    "onnx": {"SENTIMENT_ENGINE": "onnx", "SENTIMENT_ONNX_INT8": "false"},
+    "onnx-int8": {"SENTIMENT_ENGINE": "onnx", "SENTIMENT_ONNX_INT8": "true"},
+}
+
+
+def run_engine(args):
+    """One engine, in this process; returns the result dict."""
+    started = time.perf_counter()
+    from src.sentiment_pool import load_pipeline, normalize_label
+
+    model = load_pipeline(threads=args.threads)
+    load_s = time.perf_counter() - started
+    rss_loaded = _peak_rss_mb()
+
+    texts = [t["body"] for t in synthetic_tickets(args.tickets, _parse_mix(args.mix), _templates(args.templates))]
+    model(texts[:1])
+    started = time.perf_counter()
+    results = model(texts, batch_size=args.batch_size, truncation=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "load_s": round(load_s, 2),
+        "rss_loaded_mb": rss_loaded,
+        "peak_rss_mb": _peak_rss_mb(),
+        "tickets_per_s": round(len(texts) / elapsed, 1),
+        "labels": [normalize_label(r) for r in results],
+    }
+
+
+def _run_isolated(engine, argv):
+    env = dict(os.environ, **_ENGINES[engine])
+    cmd = [sys.executable, "-m", "benchmarks.bench_sentiment_engine", "--child", "--engines", engine] + argv
+    done = subprocess.run(cmd, cwd=_ROOT, env=env, capture_output=True, text=True)
+    if done.returncode != 0:
+        return {"error": (done.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engines", default=",".join(_ENGINES))
+    parser.add_argument("--tickets", type=int, default=500)
+    parser.add_argument("--mix", default="information_search=0.2,feedback=0.6,product_complaint=0.2")
+    parser.add_argument("--templates", default=os.path.join(_ROOT, "ticket.json"))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads per engine (default: runtime's)")
+    parser.add_argument("--min-agreement", type=float, default=0.98)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in _ENGINES]
+    if unknown:
+        raise SystemExit(f"unknown engine(s): {', '.join(unknown)}")
+
+    if args.child:
+        print(json.dumps(run_engine(args)))
+        return 0
+
+    forwarded = ["--tickets", str(args.tickets), "--mix", args.mix, "--templates", args.templates,
+                 "--batch-size", str(args.batch_size)] + (["--threads", str(args.threads)] if args.threads else [])
+    results = {engine: _run_isolated(engine, forwarded) for engine in engines}
+    reference = results.get("transformers", {}).get("labels")
+
+    status = 0
+    print(f"{args.tickets} tickets, batch size {args.batch_size}")
+    for engine, r in results.items():
+        if "error" in r:
+            print(f"  {engine:13s} unavailable: {r['error']}")
+            continue
+        agreement = ""
+        if reference and engine != "transformers":
+            share = sum(a == b for a, b in zip(r["labels"], reference)) / len(reference)
+            agreement = f"  labels {share:6.1%} identical"
+            if share < args.min_agreement:
+                status = 1
+                agreement += f"  ⚠️ below {args.min_agreement:.0%}"
+        print(f"  {engine:13s} load {r['load_s']:6.2f}s  RSS {r['rss_loaded_mb'] or 0:7.0f} MB loaded, "
+              f"{r['peak_rss_mb'] or 0:7.0f} MB peak  {r['tickets_per_s']:8.1f} tickets/s{agreement}")
+    if reference is None:
+        print("  (no transformers reference: label parity not checked)")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# bench_sentiment_pool.py
+"""Débit de l'inférence de sentiment : thread unique vs pool de processus.
+
+Classifies `--texts` texts with a CPU-bound pipeline, first the way the
+"thread" backend does (one `asyncio.to_thread` call per batch, several
+batches in flight, all sharing the GIL), then through
+`src.sentiment_pool.SentimentProcessPool` for each worker count of
+`--workers`. By default the pipeline is `benchmarks.fakes.FakeSentimentPipeline`
+(pure-Python work, no model download); `--real` loads distilbert.
+
+Throughput of the pool should grow roughly linearly with workers up to
+the number of physical cores.
+
+    python -m benchmarks.bench_sentiment_pool --texts 2000 --workers 1,2,4,8
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+from benchmarks.fakes import fake_sentiment_pipeline
+
+
+def _texts(n):
+    samples = (
+        "Le produit reçu est cassé, je demande un remboursement.",
+        "Merci pour votre service, la nouvelle interface est très claire.",
+        "Bonjour, comment suivre ma commande ?",
+    )
+    return [f"{samples[i % len(samples)]} (#{i})" for i in range(n)]
+
+
+async def _threaded(model, texts, batch_size):
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    await asyncio.gather(*(asyncio.to_thread(model, b, batch_size=batch_size) for b in batches))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma-separated worker counts")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--real", action="store_true", help="use the distilbert pipeline (needs transformers)")
+    args = parser.parse_args(argv)
+
+    from src.sentiment_pool import SentimentProcessPool, load_pipeline
+
+    factory = load_pipeline if args.real else fake_sentiment_pipeline
+    texts = _texts(args.texts)
+    print(f"{args.texts} texts, batch size {args.batch_size}, {os.cpu_count()} CPU(s)")
+
+    model = factory()
+    started = time.perf_counter()
+    asyncio.run(_threaded(model, texts, args.batch_size))
+    base = args.texts / (time.perf_counter() - started)
+    print(f"  thread            {base:9.1f} texts/s")
+
+    for workers in sorted({int(w) for w in args.workers.split(",") if w.strip()}):
+        pool = SentimentProcessPool(workers=workers, batch_size=args.batch_size, factory=factory)
+        pool.start()
+        try:
+            started = time.perf_counter()
+            labels = asyncio.run(pool.aclassify(texts))
+            rate = args.texts / (time.perf_counter() - started)
+        finally:
+            pool.shutdown()
+        assert len(labels) == len(texts) and None not in labels
+        print(f"  process x{workers:<3d}     {rate:9.1f} texts/s  ({rate / base:.2f}x thread)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# bench_smtp.py
+"""Débit d'envoi SMTP : une connexion par message vs pool + send_many.
+
+Starts a local aiosmtpd sink (optionally adding `--delay` seconds per
+message and `--handshake-delay` per new connection to mimic a remote
+server) and sends `--messages` emails twice: once with a fresh SMTP
+session per message (the previous behaviour) and once through
+`SMTPConnectionPool.send_many`. Reports messages per second for both.
+
+    pip install aiosmtpd
+    python -m benchmarks.bench_smtp --messages 200 --pool-size 4
+"""
+import sys
+import time
+import smtplib
+import argparse
+
+from benchmarks.fakes import SMTPSink
+from tool.toolgmail import SMTPConnectionPool, build_message
+
+
+def _messages(n):
+    return [build_message(f"[Ticket #{i}] bench", f"<p>message {i}</p>", "support@example.com", "bench@example.com")
+            for i in range(n)]
+
+
+def _unpooled(host, port, messages, handshake_delay):
+    for msg in messages:
+        time.sleep(handshake_delay)
+        with smtplib.SMTP(host, port) as server:
+            server.ehlo()
+            server.send_message(msg)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--delay", type=float, default=0.0, help="server-side seconds per message")
+    parser.add_argument("--handshake-delay", type=float, default=0.0,
+                        help="seconds added per new connection (TLS+AUTH stand-in)")
+    args = parser.parse_args(argv)
+
+    with SMTPSink(port=args.port, delay=args.delay) as sink:
+        started = time.perf_counter()
+        _unpooled(sink.host, sink.port, _messages(args.messages), args.handshake_delay)
+        unpooled_s = time.perf_counter() - started
+
+        pool = SMTPConnectionPool(host=sink.host, port=sink.port, user="", password="",
+                                  size=args.pool_size, starttls=False)
+        original_connect = pool._connect
+
+        def _connect():
+            time.sleep(args.handshake_delay)
+            return original_connect()
+
+        pool._connect = _connect
+        started = time.perf_counter()
+        results = pool.send_many(_messages(args.messages))
+        pooled_s = time.perf_counter() - started
+        pool.close()
+
+    print(f"unpooled: {args.messages / unpooled_s:8.1f} msg/s ({args.messages} sessions)")
+    print(f"pooled:   {args.messages / pooled_s:8.1f} msg/s ({pool.stats()['connections_opened']} sessions)")
+    print(f"delivered: {sink.received} / {2 * args.messages}")
+    return 0 if all(results) and sink.received == 2 * args.messages else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# bench_state.py
+"""Taille et coût de sérialisation d'un checkpoint : listes de copies vs table par id.
+
+Builds the end-of-run state for `--tickets` synthetic tickets in the
+previous layout (full ticket copies in `tickets`, `categorized_tickets`,
+each branch list, `human_validated_tickets`, `sent_tickets`) and in the
+current one (`ticket_table` + id lists), then serializes both with the
+LangGraph checkpoint serializer (pickle when langgraph is missing).
+
+    python -m benchmarks.bench_state --tickets 1000
+"""
+import sys
+import time
+import pickle
+import argparse
+
+
+def _serializer():
+    try:
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+        serde = JsonPlusSerializer()
+        return "jsonplus", lambda state: serde.dumps_typed(state)[1]
+    except ImportError:
+        return "pickle", pickle.dumps
+
+
+def _tickets(n):
+    categories = ("information_search", "feedback", "product_complaint")
+    return [{
+        "id": i, "thread_id": f"discussion_{i // 3:06d}", "source": "gmail", "sender": f"client{i}@example.com",
+        "subject": f"Commande {i}", "body": "Bonjour, mon colis est arrivé abîmé, que faire ? " * 6,
+        "category": categories[i % 3],
+    } for i in range(n)]
+
+
+def _list_layout(tickets):
+    by = lambda c: [dict(t) for t in tickets if t["category"] == c]
+    feedback = by("feedback")
+    validated = [dict(t, validated=True) for t in feedback[::2]]
+    return {
+        "tickets": [dict(t) for t in tickets],
+        "categorized_tickets": [dict(t) for t in tickets],
+        "information_search_tickets": by("information_search"),
+        "sentiment_tickets": feedback[1::2],
+        "product_complaint_tickets": by("product_complaint"),
+        "human_validated_tickets": validated,
+        "sent_tickets": [dict(t, sent=True) for t in validated],
+        "product_sent_tickets": [{"id": t["id"], "sent": True} for t in by("product_complaint")],
+        "ticket_sentiments": {t["id"]: "negative" for t in feedback},
+    }
+
+
+def _table_layout(tickets):
+    ids = lambda c: [t["id"] for t in tickets if t["category"] == c]
+    feedback = ids("feedback")
+    table = {t["id"]: dict(t) for t in tickets}
+    for tid in feedback[::2]:
+        table[tid].update(validated=True, sent=True, delivery="queued")
+    for tid in ids("product_complaint"):
+        table[tid].update(sent=True, delivery="queued")
+    return {
+        "tickets": [],
+        "ticket_table": table,
+        "categorized_ids": [t["id"] for t in tickets],
+        "information_search_ids": ids("information_search"),
+        "sentiment_ids": feedback[1::2],
+        "product_complaint_ids": ids("product_complaint"),
+        "human_validated_ids": feedback[::2],
+        "sent_ids": feedback[::2],
+        "product_sent_ids": ids("product_complaint"),
+        "ticket_sentiments": {tid: "negative" for tid in feedback},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    name, dumps = _serializer()
+    tickets = _tickets(args.tickets)
+    sizes = {}
+    print(f"{args.tickets} tickets, serializer: {name}")
+    for layout, build in (("lists", _list_layout), ("table", _table_layout)):
+        state = build(tickets)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            blob = dumps(state)
+        elapsed = (time.perf_counter() - started) / args.repeat
+        sizes[layout] = len(blob)
+        print(f"{layout:6s} {len(blob) / 1024:9.1f} KB per checkpoint   {elapsed * 1000:7.2f} ms to serialize")
+    print(f"size ratio: {sizes['table'] / sizes['lists']:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
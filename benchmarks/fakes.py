@@ -0,0 +1,315 @@
+# fakes.py
+"""Stand-ins locaux pour les services externes (LLM Gemini, SMTP).
+
+Used by the benchmark scripts so the pipeline can be exercised offline.
+`FakeChatModel` mimics the small part of the langchain chat-model API the
+code relies on (`invoke`, `ainvoke`, `.model`, responses with `.content`
+and `.usage_metadata`). It simulates latency and can inject 429 errors,
+either at random or whenever more than `capacity` calls are in flight /
+more than `rate_limit` calls per second arrive, like a real quota.
+
+Install it for the whole process with `install_fake_llm()`. `SMTPSink`
+runs a local aiosmtpd server that accepts and counts emails.
+`FakeSentimentPipeline` burns CPU like the distilbert pipeline.
+`FakeEmbeddings` and `FakeVectorStore` stand in for the embedding API and
+Chroma.
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+
+
+class FakeRateLimitError(Exception):
+    """Mimics google.api_core ResourceExhausted (HTTP 429)."""
+
+    code = 429
+
+    def __init__(self, retry_after=None):
+        self.retry_after = retry_after
+        hint = f" Please retry in {retry_after:.2f}s." if retry_after else ""
+        super().__init__(f"429 Resource has been exhausted (e.g. check quota).{hint}")
+
+
+class FakeResponse:
+    def __init__(self, content, prompt_chars=0):
+        self.content = content
+        self.usage_metadata = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": max(1, len(content) // 4),
+            "total_tokens": prompt_chars // 4 + max(1, len(content) // 4),
+        }
+
+
+def _prompt_text(prompt):
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, (list, tuple)):
+        return "\n".join(getattr(m, "content", str(m)) for m in prompt)
+    return getattr(prompt, "content", str(prompt))
+
+
+def default_answer(text, rng):
+    """Plausible answer for the prompts defined in src/prompts.py."""
+    lowered = text.lower()
+    if "tickets to analyze (json):" in lowered:
+        payload = text.split("Tickets to analyze (JSON):", 1)[1]
+        try:
+            tickets = json.loads(payload)
+        except Exception:
+            tickets = []
+        return json.dumps({
+            str(t.get("id")): {
+                "category": _category_for(t.get("body", ""), rng),
+                "sentiment": rng.choice(["positive", "negative", "neutral"]),
+                "queries": [t.get("subject", "")][: rng.randint(0, 1)] + [t.get("body", "")[:80]],
+            }
+            for t in tickets
+        })
+    if "tickets (json):" in lowered:
+        payload = text.split("Tickets (JSON):", 1)[1]
+        try:
+            tickets = json.loads(payload)
+        except Exception:
+            tickets = []
+        return json.dumps({str(t.get("id")): _category_for(t.get("body", ""), rng) for t in tickets})
+    if "texts (json):" in lowered:
+        payload = text.split("Texts (JSON):", 1)[1]
+        try:
+            texts = json.loads(payload)
+        except Exception:
+            texts = {}
+        return json.dumps({k: rng.choice(["positive", "negative", "neutral"]) for k in texts})
+    if "choose the single most appropriate category" in lowered:
+        body = text.rsplit("Body:", 1)[-1]
+        return _category_for(body, rng)
+    if "classify the sentiment" in lowered or "sentiment of the following" in lowered:
+        return rng.choice(["positive", "negative", "neutral"])
+    return "Réponse simulée basée sur le contexte fourni."
+
+
+def _category_for(body, rng):
+    body = body.lower()
+    if re.search(r"endommag|cass|incorrect|rembours|défect|ne fonctionne", body):
+        return "product_complaint"
+    if re.search(r"savoir|comment|how|où|possible|\?", body):
+        return "information_search"
+    if re.search(r"merci|adore|déçu|suggestion|great|love", body):
+        return "feedback"
+    return rng.choice(["information_search", "feedback", "product_complaint"])
+
+
+class FakeChatModel:
+    """Modèle de chat simulé : latence, erreurs et quota configurables."""
+
+    def __init__(self, model="fake-gemini", latency=0.05, jitter=0.02, error_rate=0.0,
+                 throttle_rate=0.0, capacity=None, rate_limit=None, retry_after=0.2,
+                 answer=None, seed=0, slow_rate=0.0, slow_latency=2.0, **settings):
+        self.model = model
+        self.latency = latency
+        self.jitter = jitter
+        # Heavy tail: a `slow_rate` fraction of calls takes `slow_latency` seconds
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.capacity = capacity
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.answer = answer or default_answer
+        self.settings = settings
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._window = []
+        self.stats = {"calls": 0, "throttled": 0, "errors": 0, "max_in_flight": 0}
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            self.stats["calls"] += 1
+            self._window = [t for t in self._window if now - t < 1.0]
+            over_rate = self.rate_limit is not None and len(self._window) >= self.rate_limit
+            over_capacity = self.capacity is not None and self._in_flight >= self.capacity
+            if over_rate or over_capacity or self._rng.random() < self.throttle_rate:
+                self.stats["throttled"] += 1
+                raise FakeRateLimitError(self.retry_after)
+            if self._rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                raise RuntimeError("500 simulated backend error")
+            self._window.append(now)
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+            if self._rng.random() < self.slow_rate:
+                return self.slow_latency
+            return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def _done(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def invoke(self, prompt, **kwargs):
+        delay = self._admit()
+        try:
+            time.sleep(delay)
+            text = _prompt_text(prompt)
+            return FakeResponse(self.answer(text, self._rng), len(text))
+        finally:
+            self._done()
+
+    async def ainvoke(self, prompt, **kwargs):
+        delay = self._admit()
+        try:
+            await asyncio.sleep(delay)
+            text = _prompt_text(prompt)
+            return FakeResponse(self.answer(text, self._rng), len(text))
+        finally:
+            self._done()
+
+
+def install_fake_llm(**options):
+    """Make `src.llm.get_llm()` hand out one shared `FakeChatModel`.
+
+    Returns the fake so callers can read its `stats`.
+    """
+    from src.llm import set_client_factory
+
+    fake = FakeChatModel(**options)
+    set_client_factory(lambda model, **settings: fake)
+    return fake
+
+
+class FakeSentimentPipeline:
+    """CPU-bound stand-in for the HF sentiment pipeline (holds the GIL).
+
+    Does a fixed amount of pure-Python work per text (a few ms, like a
+    distilbert forward pass on CPU) and labels texts from a few keywords.
+    """
+
+    def __init__(self, rounds=200):
+        self.rounds = rounds
+
+    def _burn(self):
+        return sum(sum(i * i for i in range(200)) for _ in range(self.rounds))
+
+    def __call__(self, texts, batch_size=None, truncation=None):
+        if isinstance(texts, str):
+            texts = [texts]
+        results = []
+        for text in texts:
+            self._burn()
+            lowered = text.lower()
+            label = "NEGATIVE" if any(k in lowered for k in ("cassé", "broken", "bad", "remboursement")) else "POSITIVE"
+            results.append({"label": label, "score": 0.9})
+        return results
+
+
+def fake_sentiment_pipeline(threads=None):
+    """Picklable factory for `src.sentiment_pool.SentimentProcessPool`."""
+    return FakeSentimentPipeline()
+
+
+class FakeEmbeddings:
+    """Embedding API stand-in: latency per request and per text, counted calls."""
+
+    def __init__(self, dim=64, request_latency=0.05, text_latency=0.002):
+        self.dim = dim
+        self.request_latency = request_latency
+        self.text_latency = text_latency
+        self.requests = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        rng = random.Random(text)
+        return [rng.uniform(-1, 1) for _ in range(self.dim)]
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        self.texts += len(texts)
+        time.sleep(self.request_latency + self.text_latency * len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeVectorStore:
+    """Chroma stand-in: `add_texts` embeds and stores, `delete` drops ids."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.vectors = {}
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        ids = list(ids) if ids is not None else [str(len(self.vectors) + i) for i in range(len(texts))]
+        for i, vector in zip(ids, self.embeddings.embed_documents(list(texts))):
+            self.vectors[i] = vector
+        return ids
+
+    def delete(self, ids=None):
+        for i in ids or []:
+            self.vectors.pop(i, None)
+
+
+def install_outbox_sink(path=":memory:"):
+    """Replace the shared email outbox by one whose workers deliver nowhere.
+
+    Messages are still enqueued, deduplicated and tracked; the sender just
+    reports success. Returns the outbox.
+    """
+    import tool.outbox as outbox_module
+
+    outbox = outbox_module.EmailOutbox(path=path, sender=lambda messages: [True] * len(messages))
+    outbox_module._outbox = outbox
+    outbox.start()
+    return outbox
+
+
+class SMTPSink:
+    """Serveur SMTP local (aiosmtpd) qui compte les messages reçus.
+
+    Usage:
+
+        with SMTPSink() as sink:
+            os.environ.update(SMTP_HOST=sink.host, SMTP_PORT=str(sink.port), SMTP_STARTTLS="false")
+            ...
+            print(sink.received)
+
+    `aiosmtpd` is only needed by the benchmarks (`pip install aiosmtpd`).
+    """
+
+    def __init__(self, host="127.0.0.1", port=8025, delay=0.0):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.received = 0
+        self.sessions = 0
+        self._lock = threading.Lock()
+        self._controller = None
+
+    # aiosmtpd handler hooks
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self._lock:
+            self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        with self._lock:
+            self.received += 1
+        return "250 Message accepted for delivery"
+
+    def __enter__(self):
+        from aiosmtpd.controller import Controller
+
+        self._controller = Controller(self, hostname=self.host, port=self.port)
+        self._controller.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._controller.stop()
+        return False
@@ -1,8 +1,45 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
 import os
+import json
+import asyncio
+
+from src import metrics
+from src.jobs import JobQueueFull, get_job_manager
+from src.llm import aclose_all
+from src.review import get_review_queue
+from src.warmup import start_background_warm_up, warmup_status
+from tool.outbox import get_outbox
 
 app = FastAPI(title="chatbot-langgraph-service")
 
+
+def _warmup_enabled():
+    return os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+
+@app.on_event("startup")
+async def startup():
+    # Agents and the graph are built lazily; optionally build them now, in
+    # the background, so /health answers immediately and /ready reports it.
+    if _warmup_enabled():
+        start_background_warm_up()
+    # Deliver emails left pending by a previous run (durable outbox)
+    if os.getenv("EMAIL_DELIVERY_MODE", "outbox").lower() == "outbox":
+        get_outbox()
+    # Job workers run on the service's event loop
+    get_job_manager().start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await get_job_manager().stop()
+    # Async transports of the shared LLM clients need the loop to close
+    await aclose_all()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -16,9 +53,188 @@ def ready():
         if not os.getenv(v):
             missing.append(v)
             ok = False
-    return {"ready": ok, "missing_env": missing}
+    warmup = warmup_status()
+    if _warmup_enabled() and warmup["state"] != "done":
+        ok = False
+    return {"ready": ok, "missing_env": missing, "warmup": warmup}
 
 # Lightweight endpoint to show that the repository started the app module.
 @app.get("/info")
 def info():
     return {"project": "chatbot-langgraph", "service": "fastapi", "show_email_as_tool": os.getenv("SHOW_EMAIL_AS_TOOL", "false")}
+
+
+# Prometheus scrape endpoint; queue gauges are refreshed on each scrape
+@app.get("/metrics")
+def metrics_endpoint():
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="metrics disabled (METRICS_ENABLED=false or prometheus_client missing)")
+    metrics.set_queue_depth("jobs", get_job_manager().stats()["queued"])
+    if os.getenv("EMAIL_DELIVERY_MODE", "outbox").lower() == "outbox":
+        metrics.set_queue_depth("outbox", get_outbox(start=False).stats()["pending"])
+    metrics.set_queue_depth("reviews", get_review_queue().stats()["pending"])
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+# Email outbox: queue counters and per-ticket delivery status
+@app.get("/outbox")
+def outbox_stats():
+    return get_outbox(start=False).stats()
+
+
+@app.get("/outbox/{ticket_id}")
+def outbox_ticket(ticket_id: str):
+    return {"ticket_id": ticket_id, "deliveries": get_outbox(start=False).delivery_status([ticket_id]).get(ticket_id, [])}
+
+
+# Embedding cache: hit rate since start and vectors stored
+@app.get("/embeddings")
+def embeddings_stats():
+    from src.embeddings import embedding_stats
+
+    return embedding_stats()
+
+
+# Knowledge base: index version, last build; reload applies only the changes
+@app.get("/kb")
+async def kb_stats():
+    from src.nodes import get_kb_indexer
+
+    return (await asyncio.to_thread(get_kb_indexer)).stats()
+
+
+@app.post("/kb/reload")
+async def kb_reload(force: bool = False):
+    from src.nodes import get_kb_indexer
+
+    indexer = await asyncio.to_thread(get_kb_indexer)
+    try:
+        return await asyncio.to_thread(indexer.refresh, force)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"knowledge base unreadable: {e}")
+
+
+# Review queue: negative feedback tickets waiting for a human decision
+class ClaimRequest(BaseModel):
+    reviewer: str
+    limit: int = 50
+    review_ids: Optional[List[int]] = None
+
+
+class DecisionRequest(BaseModel):
+    review_ids: List[int]
+    reviewer: Optional[str] = None
+
+
+@app.get("/reviews")
+def list_reviews(status: Optional[str] = None, limit: int = 100, offset: int = 0):
+    queue = get_review_queue()
+    return {"stats": queue.stats(), "items": queue.list(status, limit, offset)}
+
+
+@app.post("/reviews/claim")
+def claim_reviews(request: ClaimRequest):
+    return {"items": get_review_queue().claim(request.reviewer, request.limit, request.review_ids)}
+
+
+@app.post("/reviews/approve")
+async def approve_reviews(request: DecisionRequest):
+    from src.nodes import send_reviewed_tickets
+
+    queue = get_review_queue()
+    # Deciding first claims the reviews: a concurrent approval gets nothing
+    # back and cannot send the same tickets twice
+    items = await asyncio.to_thread(queue.decide, request.review_ids, True, request.reviewer)
+    # Approved tickets go out through the graph's email path
+    try:
+        sent = await send_reviewed_tickets([item["ticket"] for item in items]) if items else []
+    except Exception as e:
+        # The decision is already committed: keep the failure on the reviews
+        print(f"❌ Envoi des revues approuvées impossible : {e!r}")
+        sent = [{"sent": False, "error": repr(e)}] * len(items)
+    outcomes = {item["review_id"]: outcome for item, outcome in zip(items, sent)}
+    await asyncio.to_thread(queue.record_delivery, outcomes)
+    return {"decided": len(items), "items": [{**item, "delivery": outcomes[item["review_id"]]} for item in items]}
+
+
+@app.post("/reviews/reject")
+def reject_reviews(request: DecisionRequest):
+    items = get_review_queue().decide(request.review_ids, False, request.reviewer)
+    return {"decided": len(items), "items": items}
+
+
+# Batch jobs: submit tickets, then poll or stream status and fetch results
+class JobRequest(BaseModel):
+    tickets: List[Dict[str, Any]]
+    # Jobs with the same scope (e.g. a mailbox) reuse each other's thread
+    # classifications; without one, threads are only reused within the job
+    thread_scope: Optional[str] = None
+
+
+class ResumeRequest(BaseModel):
+    # Reviewer answer handed to the paused `interrupt()` call
+    resume: Any = None
+    # Answers keyed by interrupt id, when several are pending (per-ticket mode)
+    resumes: Optional[Dict[str, Any]] = None
+
+
+def _job_or_404(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"unknown job {job_id}")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    # Runs on the event loop: the job queue and workers live there
+    try:
+        job = get_job_manager().submit(request.tickets, request.thread_scope)
+    except JobQueueFull as e:
+        # Backpressure: the admission queue is full, the caller retries later
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job.describe()
+
+
+@app.get("/jobs")
+def jobs_stats():
+    return get_job_manager().stats()
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _job_or_404(job_id).describe()
+
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_job(job_id: str, request: ResumeRequest):
+    _job_or_404(job_id)
+    try:
+        job = get_job_manager().resume(job_id, request.resume, request.resumes)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.describe()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, since: int = 0):
+    job = _job_or_404(job_id)
+
+    async def sse():
+        async for event in get_job_manager().stream_events(job, since):
+            yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream")
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = _job_or_404(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"job {job_id} is {job.status}")
+    return {**job.describe(), "result": job.result}
@@ -1,30 +1,118 @@
 # agents.py
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+import os
+import json
+import asyncio
+import threading
 
+from src.llm import DEFAULT_MODEL, ainvoke, invoke, get_llm, get_embeddings
+from src.embeddings import with_embedding_cache
+from src.metrics import record_sentiment
+from src.sentiment_pool import get_sentiment_pool, load_pipeline, normalize_label, sentiment_backend
 from src.prompts import (
     CATEGORIZATION_PROMPT,
+    BATCH_CATEGORIZATION_PROMPT,
+    BATCH_SENTIMENT_PROMPT,
     GENERATE_RAG_QUERIES_PROMPT,
     GENERATE_RAG_ANSWER_PROMPT
 )
 
 
-# --- Agent 1 : Catégorisation des tickets ---
-def categorize_ticket(ticket):
-    """Appelle le LLM Gemini pour catégoriser un ticket."""
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.2
-    )
+SENTIMENT_LABELS = ("positive", "negative", "neutral")
 
-    prompt = CATEGORIZATION_PROMPT.format(
+
+def parse_label_map(raw, expected_ids, valid_labels, value_key="category"):
+    """Extract `{id: label}` from a JSON answer to a batch prompt.
+
+    Accepts a JSON object (`{"12": "feedback"}`) or a list of
+    `{"id": ..., value_key: ...}` objects, optionally wrapped in a markdown
+    code fence or surrounded by prose. Only ids from `expected_ids` with a
+    label from `valid_labels` are returned, so callers can fall back to
+    single-item calls for whatever is missing.
+    """
+    if not isinstance(raw, str):
+        return {}
+    text = raw.strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return {}
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+    if end <= start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except Exception:
+        return {}
+
+    pairs = []
+    if isinstance(data, dict):
+        pairs = list(data.items())
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict) and "id" in item:
+                pairs.append((item.get("id"), item.get(value_key)))
+
+    expected = {str(i) for i in expected_ids}
+    labels = {}
+    for key, value in pairs:
+        key = str(key).strip()
+        if not isinstance(value, str):
+            continue
+        label = value.strip().strip("\"'.").lower()
+        if key in expected and label in valid_labels:
+            labels[key] = label
+    return labels
+
+
+# --- Agent 1 : Catégorisation des tickets ---
+def _categorization_prompt(ticket):
+    return CATEGORIZATION_PROMPT.format(
         subject=ticket["subject"],
         body=ticket["body"]
     )
 
-    response = llm.invoke(prompt)
+
+def _batch_categorization_prompt(tickets):
+    payload = [
+        {"id": str(t.get("id")), "subject": t.get("subject", ""), "body": t.get("body", "")}
+        for t in tickets
+    ]
+    return BATCH_CATEGORIZATION_PROMPT.format(
+        tickets=json.dumps(payload, ensure_ascii=False, indent=2)
+    )
+
+
+def categorize_ticket(ticket):
+    """Appelle le LLM Gemini pour catégoriser un ticket."""
+    llm = get_llm(DEFAULT_MODEL, temperature=0.2)
+    response = invoke(llm, _categorization_prompt(ticket), agent="categorizer")
+    return response.content.strip()
+
+
+async def acategorize_ticket(ticket):
+    """Version asynchrone de `categorize_ticket` (via `src.llm.ainvoke`)."""
+    llm = get_llm(DEFAULT_MODEL, temperature=0.2)
+    response = await ainvoke(llm, _categorization_prompt(ticket), agent="categorizer")
+    return response.content.strip()
+
+
+def categorize_ticket_batch(tickets):
+    """Catégorise plusieurs tickets en un seul appel Gemini.
+
+    Returns the raw model answer (expected to be a JSON object mapping ticket
+    ids to categories). Parsing and per-ticket fallback are left to the
+    caller, see `src.categorizer.CategorizationEngine`.
+    """
+    llm = get_llm(DEFAULT_MODEL, temperature=0.2)
+    response = invoke(llm, _batch_categorization_prompt(tickets), agent="categorizer")
+    return response.content.strip()
+
+
+async def acategorize_ticket_batch(tickets):
+    """Version asynchrone de `categorize_ticket_batch`."""
+    llm = get_llm(DEFAULT_MODEL, temperature=0.2)
+    response = await ainvoke(llm, _batch_categorization_prompt(tickets), agent="categorizer")
     return response.content.strip()
 
 
@@ -46,7 +134,10 @@ class TicketRAGAgent:
             # native bindings aren't available.
             from langchain_chroma import Chroma
 
-            self.embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+            # Vectors are cached by content: re-indexing or repeating a query
+            # only embeds texts never seen before (src.embeddings)
+            model = "models/text-embedding-004"
+            self.embeddings = with_embedding_cache(get_embeddings(model), model)
             self.vectorstore = Chroma(
                 persist_directory="db",
                 embedding_function=self.embeddings
@@ -63,42 +154,62 @@ class TicketRAGAgent:
             )
 
         # Prompts RAG pour les nœuds
+        from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+
         self.generate_query_prompt = PromptTemplate(
             template=GENERATE_RAG_QUERIES_PROMPT,
             input_variables=["ticket_body"]
         )
         self.qa_prompt = ChatPromptTemplate.from_template(GENERATE_RAG_ANSWER_PROMPT)
 
-        # LLM pour la génération des réponses RAG
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.2
-        )
+        # LLM pour la génération des réponses RAG (client partagé du registre)
+        self.llm = get_llm(DEFAULT_MODEL, temperature=0.2)
+
+
 class FeedbackSentimentAgent:
     """Analyse le sentiment des feedbacks ou tickets.
 
-    This attempts to create a Hugging Face `pipeline` for sentiment-analysis.
+    This attempts to create a Hugging Face `pipeline` for sentiment-analysis
+    (or its ONNX Runtime counterpart, SENTIMENT_ENGINE=onnx).
     If `transformers`/`torch` aren't available (common in fresh venvs), we
     fall back to a lightweight heuristic that returns 'neutral'. The goal is
     to avoid import-time crashes so the graph can start in dev environments.
+
+    `analyze_batch` / `aanalyze_batch` classify a whole list at once: real
+    pipeline batches (texts sorted by length so each batch pads to similar
+    lengths) or, on the LLM fallback, one multi-item prompt per
+    SENTIMENT_LLM_BATCH_SIZE texts.
+
+    With SENTIMENT_BACKEND=process the model is not loaded here: texts go
+    to the worker processes of `src.sentiment_pool`, each with its own
+    copy of the model.
     """
 
     def __init__(self):
         self.sentiment_analyzer = None
+        self.pool = None
+        self.batch_size = max(1, int(os.getenv("SENTIMENT_BATCH_SIZE", "32")))
+        self.llm_batch_size = max(1, int(os.getenv("SENTIMENT_LLM_BATCH_SIZE", "20")))
         # LLM fallback (Gemini) for sentiment classification when HF pipeline is
         # unavailable or when you prefer LLM-based classification.
         try:
-            self.llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.0)
+            self.llm = get_llm(DEFAULT_MODEL, temperature=0.0)
         except Exception:
             self.llm = None
-        try:
-            # Lazy import to avoid hard dependency at import time
-            from transformers import pipeline
+        if sentiment_backend() == "process":
+            try:
+                pool = get_sentiment_pool()
+                pool.start()
+                self.pool = pool
+                return
+            except Exception as e:
+                import warnings
 
-            self.sentiment_analyzer = pipeline(
-                "sentiment-analysis",
-                model="distilbert-base-uncased-finetuned-sst-2-english"
-            )
+                warnings.warn(f"Sentiment process pool unavailable: {e}. Using the in-process pipeline.", RuntimeWarning)
+        try:
+            # Lazy imports inside: transformers/torch, or onnxruntime with
+            # SENTIMENT_ENGINE=onnx
+            self.sentiment_analyzer = load_pipeline()
         except Exception as e:
             # Could be ImportError or NameError due to missing torch, etc.
             import warnings
@@ -108,24 +219,68 @@ class FeedbackSentimentAgent:
                 RuntimeWarning,
             )
 
-    def analyze_sentiment(self, text) -> str:
-        """Retourne 'positive', 'negative' ou 'neutral'.
-
-        Accepts either a plain string or an object with a `.content` attribute
-        (like `HumanMessage`). If the Hugging Face pipeline isn't available
-        we use a small keyword-based heuristic as a fallback.
-        """
+    @staticmethod
+    def _text_of(text) -> str:
         # Accept HumanMessage-like objects as well as strings
         try:
             # If it's an object with .content, extract it
             if not isinstance(text, str) and hasattr(text, "content"):
-                txt = text.content
-            else:
-                txt = str(text)
+                return text.content
+            return str(text)
         except Exception:
-            txt = ""
+            return ""
+
+    @staticmethod
+    def _llm_prompt(txt) -> str:
+        return (
+            "Classify the sentiment of the following text as one of: "
+            "positive, negative, or neutral. Respond with only the single word.\n\n"
+            f"Text: '''{txt}'''"
+        )
+
+    @staticmethod
+    def _parse_llm_label(resp):
+        out = getattr(resp, "content", "").strip().lower()
+        # Extract the first token that looks like a label
+        for token in out.replace("\n", " ").split():
+            t = token.strip(".!,").lower()
+            if t in SENTIMENT_LABELS:
+                return t
+        return None
 
+    @staticmethod
+    def _keyword_sentiment(txt) -> str:
+        record_sentiment("heuristic")
         txt_l = txt.lower()
+        positive_kw = ("good", "great", "love", "excellent", "happy", "thanks", "thank", "awesome")
+        negative_kw = ("bad", "terrible", "hate", "awful", "poor", "not working", "fail", "error", "crash", "angry")
+
+        pos = any(k in txt_l for k in positive_kw)
+        neg = any(k in txt_l for k in negative_kw)
+
+        if pos and not neg:
+            return "positive"
+        if neg and not pos:
+            return "negative"
+        return "neutral"
+
+    def _pipeline_sentiment(self, txt) -> str:
+        record_sentiment("pipeline")
+        try:
+            return self._normalize_pipeline_label(self.sentiment_analyzer(txt)[0])
+        except Exception:
+            return "neutral"
+
+    def analyze_sentiment(self, text) -> str:
+        """Retourne 'positive', 'negative' ou 'neutral'.
+
+        Accepts either a plain string or an object with a `.content` attribute
+        (like `HumanMessage`). If the Hugging Face pipeline isn't available
+        we use a small keyword-based heuristic as a fallback.
+        """
+        txt = self._text_of(text)
+        if self.pool is not None:
+            return self._pool_batch([txt])[0]
 
         # If HF pipeline isn't available, prefer using the Gemini LLM (if
         # configured) to classify sentiment. This usually gives better
@@ -135,43 +290,176 @@ class FeedbackSentimentAgent:
             # Try LLM-based classification first (Gemini)
             if getattr(self, "llm", None) is not None:
                 try:
-                    prompt = (
-                        "Classify the sentiment of the following text as one of: "
-                        "positive, negative, or neutral. Respond with only the single word.\n\n"
-                        f"Text: '''{txt}'''"
-                    )
-                    resp = self.llm.invoke(prompt)
-                    out = getattr(resp, "content", "").strip().lower()
-                    # Extract the first token that looks like a label
-                    for token in out.replace("\n", " ").split():
-                        t = token.strip(".!,").lower()
-                        if t in ("positive", "negative", "neutral"):
-                            return t
+                    label = self._parse_llm_label(invoke(self.llm, self._llm_prompt(txt), agent="sentiment"))
+                    if label is not None:
+                        record_sentiment("llm")
+                        return label
                 except Exception:
                     # fall through to keyword heuristic
                     pass
+            return self._keyword_sentiment(txt)
 
-            # Keyword heuristic fallback
-            positive_kw = ("good", "great", "love", "excellent", "happy", "thanks", "thank", "awesome")
-            negative_kw = ("bad", "terrible", "hate", "awful", "poor", "not working", "fail", "error", "crash", "angry")
+        # Otherwise use the HF pipeline
+        return self._pipeline_sentiment(txt)
 
-            pos = any(k in txt_l for k in positive_kw)
-            neg = any(k in txt_l for k in negative_kw)
+    async def aanalyze_sentiment(self, text) -> str:
+        """Version asynchrone de `analyze_sentiment`.
 
-            if pos and not neg:
-                return "positive"
-            if neg and not pos:
-                return "negative"
-            return "neutral"
+        The LLM fallback is awaited natively through `src.llm.ainvoke`. The
+        HF pipeline is CPU-bound, so it still runs in a worker thread.
+        """
+        txt = self._text_of(text)
+        if self.pool is not None:
+            return (await self._apool_batch([txt]))[0]
+        if self.sentiment_analyzer is not None:
+            return await asyncio.to_thread(self._pipeline_sentiment, txt)
+        if getattr(self, "llm", None) is not None:
+            try:
+                label = self._parse_llm_label(await ainvoke(self.llm, self._llm_prompt(txt), agent="sentiment"))
+                if label is not None:
+                    record_sentiment("llm")
+                    return label
+            except Exception:
+                pass
+        return self._keyword_sentiment(txt)
 
-        # Otherwise use the HF pipeline
+    # --- Traitement par lots ---
+    @staticmethod
+    def _normalize_pipeline_label(result) -> str:
+        return normalize_label(result)
+
+    def _pool_batch(self, texts):
         try:
-            result = self.sentiment_analyzer(txt)[0]
-            label = result.get("label", "NEUTRAL").lower()
-            if "positive" in label:
-                return "positive"
-            if "negative" in label:
-                return "negative"
-            return "neutral"
+            labels = self.pool.classify(texts)
+        except Exception as e:
+            # A dead worker breaks the pool; never fail the branch for it
+            print(f"❌ Pool de sentiment indisponible : {e!r}")
+            return [self._keyword_sentiment(t) for t in texts]
+        record_sentiment("pipeline", len(texts))
+        return labels
+
+    async def _apool_batch(self, texts):
+        try:
+            labels = await self.pool.aclassify(texts)
+        except Exception as e:
+            print(f"❌ Pool de sentiment indisponible : {e!r}")
+            return [self._keyword_sentiment(t) for t in texts]
+        record_sentiment("pipeline", len(texts))
+        return labels
+
+    def _pipeline_batch(self, texts):
+        """Run the HF pipeline over `texts` with length-bucketed batches."""
+        # Sorting by length means each batch pads to similar lengths instead
+        # of the longest text of a random mix.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        labels = [None] * len(texts)
+        try:
+            results = self.sentiment_analyzer(
+                [texts[i] for i in order], batch_size=self.batch_size, truncation=True
+            )
+            for i, result in zip(order, results):
+                labels[i] = self._normalize_pipeline_label(result)
+            record_sentiment("pipeline", len(texts))
         except Exception:
-            return "neutral"
+            # Fall back to per-text calls, which never raise
+            return [self._pipeline_sentiment(t) for t in texts]
+        return labels
+
+    def _batch_prompt(self, texts):
+        payload = {str(i): t for i, t in enumerate(texts)}
+        return BATCH_SENTIMENT_PROMPT.format(texts=json.dumps(payload, ensure_ascii=False, indent=2))
+
+    def analyze_batch(self, texts):
+        """Retourne une liste de labels alignée sur `texts`."""
+        texts = [self._text_of(t) for t in texts]
+        if not texts:
+            return []
+        if self.pool is not None:
+            return self._pool_batch(texts)
+        if self.sentiment_analyzer is not None:
+            return self._pipeline_batch(texts)
+
+        labels = [None] * len(texts)
+        if getattr(self, "llm", None) is not None:
+            for start in range(0, len(texts), self.llm_batch_size):
+                chunk = texts[start:start + self.llm_batch_size]
+                try:
+                    resp = invoke(self.llm, self._batch_prompt(chunk), agent="sentiment")
+                    found = parse_label_map(getattr(resp, "content", ""), range(len(chunk)), SENTIMENT_LABELS)
+                except Exception:
+                    found = {}
+                record_sentiment("llm", len(found))
+                for key, label in found.items():
+                    labels[start + int(key)] = label
+        # Whatever the batch answer missed goes through the single-text path
+        return [label or self.analyze_sentiment(t) for label, t in zip(labels, texts)]
+
+    async def aanalyze_batch(self, texts):
+        """Version asynchrone de `analyze_batch`."""
+        texts = [self._text_of(t) for t in texts]
+        if not texts:
+            return []
+        if self.pool is not None:
+            # CPU-bound inference on the worker processes, off the GIL
+            return await self._apool_batch(texts)
+        if self.sentiment_analyzer is not None:
+            # CPU-bound inference: one worker thread for the whole list
+            return await asyncio.to_thread(self._pipeline_batch, texts)
+
+        labels = [None] * len(texts)
+        if getattr(self, "llm", None) is not None:
+            async def _chunk(start):
+                chunk = texts[start:start + self.llm_batch_size]
+                try:
+                    resp = await ainvoke(self.llm, self._batch_prompt(chunk), agent="sentiment")
+                    found = parse_label_map(getattr(resp, "content", ""), range(len(chunk)), SENTIMENT_LABELS)
+                except Exception:
+                    found = {}
+                record_sentiment("llm", len(found))
+                for key, label in found.items():
+                    labels[start + int(key)] = label
+
+            await asyncio.gather(*(_chunk(s) for s in range(0, len(texts), self.llm_batch_size)))
+
+        missing = [i for i, label in enumerate(labels) if label is None]
+        if missing:
+            retried = await asyncio.gather(*(self.aanalyze_sentiment(texts[i]) for i in missing))
+            for i, label in zip(missing, retried):
+                labels[i] = label
+        return labels
+
+
+# --------------------------
+# Instances partagées, construites au premier usage
+# --------------------------
+_singletons = {}
+_singleton_locks = {}
+_registry_lock = threading.Lock()
+
+
+def lazy_singleton(name, factory):
+    """Build `factory()` once per process, on first use, thread-safely.
+
+    Building an agent can take seconds (Chroma, embeddings, the distilbert
+    pipeline), so nothing is created at import time. Each name has its own
+    lock: concurrent first calls for the same name wait for a single
+    construction, while different names don't block each other.
+    """
+    instance = _singletons.get(name)
+    if instance is not None:
+        return instance
+    with _registry_lock:
+        lock = _singleton_locks.setdefault(name, threading.Lock())
+    with lock:
+        instance = _singletons.get(name)
+        if instance is None:
+            instance = _singletons[name] = factory()
+    return instance
+
+
+def get_rag_agent() -> TicketRAGAgent:
+    return lazy_singleton("rag_agent", TicketRAGAgent)
+
+
+def get_sentiment_agent() -> FeedbackSentimentAgent:
+    return lazy_singleton("sentiment_agent", FeedbackSentimentAgent)
@@ -0,0 +1,155 @@
+# analysis.py
+"""Analyse combinée : catégorie, sentiment et requêtes RAG en un seul appel LLM.
+
+A ticket could take up to three Gemini round trips: categorization in
+`process_ticket`, the sentiment LLM fallback, then the RAG step, whose
+queries were just the ticket body. With ANALYSIS_MODE=combined,
+`process_ticket` sends `ANALYSIS_PROMPT` once per batch of
+ANALYSIS_BATCH_SIZE tickets instead. The answer is validated per ticket
+(`parse_analysis`): a known category, a known sentiment and a list of at
+most three non-empty queries.
+
+Validated results are written on the ticket record (`category`,
+`sentiment`, `rag_queries`): `analyze_ticket_sentiment` keeps a known
+sentiment and `construct_rag_queries` uses the record's queries, so the
+feedback and RAG branches make no further analysis call. Tickets whose
+answer is missing or invalid go through the separate calls as before
+(`CategorizationEngine`, then the branch nodes).
+
+Results are stored in the persistent result cache (namespace "analysis")
+and their categories feed the local fast-path classifier.
+
+Configuration:
+- ANALYSIS_MODE: "separate" (default) or "combined"
+- ANALYSIS_BATCH_SIZE: tickets per combined request (default 10)
+- CATEGORIZATION_CONCURRENCY: requests in flight, shared with the
+  categorizer (default 8)
+"""
+import os
+import json
+import asyncio
+
+from src.agents import SENTIMENT_LABELS
+from src.cache import content_hash, get_result_cache
+from src.classifier import record_llm_labels
+from src.llm import DEFAULT_MODEL, ainvoke, get_llm
+from src.prompts import ANALYSIS_PROMPT, CATEGORIES
+
+MAX_QUERIES = 3
+
+
+def analysis_mode():
+    return os.getenv("ANALYSIS_MODE", "separate").lower()
+
+
+def analysis_cache_key(ticket):
+    return content_hash(ANALYSIS_PROMPT, DEFAULT_MODEL, ticket.get("subject", ""), ticket.get("body", ""))
+
+
+def _valid(entry):
+    """Analyse normalisée d'un ticket, ou None si elle ne respecte pas le schéma."""
+    if not isinstance(entry, dict):
+        return None
+    category = str(entry.get("category", "")).strip().strip("\"'.").lower()
+    sentiment = str(entry.get("sentiment", "")).strip().strip("\"'.").lower()
+    queries = entry.get("queries", [])
+    if category not in CATEGORIES or sentiment not in SENTIMENT_LABELS or not isinstance(queries, list):
+        return None
+    queries = [q.strip() for q in queries if isinstance(q, str) and q.strip()][:MAX_QUERIES]
+    return {"category": category, "sentiment": sentiment, "queries": queries}
+
+
+def parse_analysis(raw, expected_ids):
+    """Extract `{ticket_id: {"category", "sentiment", "queries"}}` from an answer.
+
+    Tickets missing from the answer or whose entry does not match the
+    schema are dropped, so the caller can fall back to separate calls.
+    """
+    # Tolerates a markdown fence or prose around the JSON object
+    if not isinstance(raw, str):
+        return {}
+    start, end = raw.find("{"), raw.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(raw[start:end + 1])
+    except Exception:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    expected = {str(i) for i in expected_ids}
+    found = {}
+    for key, entry in data.items():
+        key = str(key).strip()
+        entry = _valid(entry)
+        if key in expected and entry is not None:
+            found[key] = entry
+    return found
+
+
+def _analysis_prompt(tickets):
+    payload = [
+        {"id": str(t.get("id")), "subject": t.get("subject", ""), "body": t.get("body", "")}
+        for t in tickets
+    ]
+    return ANALYSIS_PROMPT.format(tickets=json.dumps(payload, ensure_ascii=False, indent=2))
+
+
+class MultiTaskAnalyzer:
+    """Catégorie, sentiment et requêtes RAG de plusieurs tickets par requête."""
+
+    def __init__(self, batch_size=None, max_concurrency=None):
+        self.batch_size = max(1, int(batch_size or os.getenv("ANALYSIS_BATCH_SIZE", "10")))
+        self.max_concurrency = max(1, int(max_concurrency or os.getenv("CATEGORIZATION_CONCURRENCY", "8")))
+
+    async def analyze(self, tickets):
+        """Return a list aligned with `tickets`: an analysis dict, or None."""
+        results = [None] * len(tickets)
+        if not tickets:
+            return results
+        cache = get_result_cache()
+        keys = [analysis_cache_key(t) for t in tickets]
+        cached = await cache.aget_many("analysis", keys) if cache is not None else {}
+
+        pending = []
+        for i, ticket in enumerate(tickets):
+            entry = _valid(cached.get(keys[i]))
+            if entry is not None:
+                results[i] = entry
+            else:
+                pending.append(i)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        await asyncio.gather(*(self._run_batch([(i, tickets[i]) for i in c], semaphore, results) for c in chunks))
+
+        fresh = {i: results[i] for i in pending if results[i] is not None}
+        if cache is not None:
+            await cache.aset_many("analysis", {keys[i]: entry for i, entry in fresh.items()})
+        await asyncio.to_thread(record_llm_labels, [(tickets[i], entry["category"]) for i, entry in fresh.items()])
+        missing = len(pending) - len(fresh)
+        if missing:
+            print(f"↩️ {missing} ticket(s) sans analyse combinée valide : appels séparés.")
+        return results
+
+    async def _run_batch(self, chunk, semaphore, results):
+        # Ids map answers back to tickets; duplicated or missing ids are
+        # left to the separate calls.
+        by_id = {}
+        for index, ticket in chunk:
+            key = str(ticket.get("id")) if ticket.get("id") is not None else None
+            if key is not None and key not in by_id:
+                by_id[key] = index
+        if not by_id:
+            return
+        tickets = [t for i, t in chunk if i in by_id.values()]
+        try:
+            async with semaphore:
+                llm = get_llm(DEFAULT_MODEL, temperature=0.2)
+                response = await ainvoke(llm, _analysis_prompt(tickets), agent="analysis")
+            found = parse_analysis(getattr(response, "content", ""), by_id.keys())
+        except Exception as e:
+            print(f"❌ Erreur analyse combinée de {len(by_id)} tickets: {e}")
+            return
+        for key, entry in found.items():
+            results[by_id[key]] = entry
@@ -0,0 +1,204 @@
+# cache.py
+"""Cache persistant adressé par contenu pour les réponses LLM.
+
+The same subject/body pairs come back again and again (auto-forwards,
+re-sent messages, templated questions). `ResultCache` stores LLM answers
+in a small SQLite file keyed by a SHA-256 of everything that determines
+the answer (prompt template, model, inputs, knowledge-base hash), so a
+repeated ticket costs a local lookup instead of a Gemini round trip.
+
+Entries expire after `ttl` seconds and the least recently used entries are
+evicted once the cache holds more than `max_entries`. Hit/miss counters
+are kept per namespace ("category", "rag", ...) for the current process.
+
+A hit only writes its access time back when the stored one is older than
+`touch_interval`, so repeated hits are pure reads (recency is tracked to
+within that interval, which is all eviction needs). Async callers use
+`aget_many` / `aset_many`, which run the SQLite work off the event loop.
+
+Configuration:
+- RESULT_CACHE_ENABLED: set to "false" to bypass the cache (default true)
+- RESULT_CACHE_PATH: SQLite file (default ".cache/results.sqlite3")
+- RESULT_CACHE_TTL: entry lifetime in seconds (default 7 days)
+- RESULT_CACHE_MAX_ENTRIES: size bound (default 100000)
+- RESULT_CACHE_TOUCH_SECONDS: minimum age of an access time before a hit
+  refreshes it (default 3600)
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+
+
+# Eviction scans the table, so it runs every N writes rather than on each
+# one; the cache may briefly hold up to N entries more than `max_entries`.
+_EVICT_EVERY = 64
+
+
+def content_hash(*parts) -> str:
+    """SHA-256 stable d'une suite de valeurs JSON-sérialisables."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Cache clé/valeur SQLite avec TTL, borne de taille et statistiques."""
+
+    def __init__(self, path=None, ttl=None, max_entries=None, touch_interval=None):
+        self.path = path or os.getenv("RESULT_CACHE_PATH", ".cache/results.sqlite3")
+        self.ttl = float(ttl if ttl is not None else os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("RESULT_CACHE_MAX_ENTRIES", "100000"))
+        if touch_interval is None:
+            touch_interval = os.getenv("RESULT_CACHE_TOUCH_SECONDS", "3600")
+        self.touch_interval = float(touch_interval)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {}
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            self._conn.commit()
+            self._evict()
+
+    def _count(self, namespace, field):
+        counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "writes": 0})
+        counters[field] += 1
+
+    def get(self, namespace, key):
+        """Retourne la valeur en cache ou None (entrée absente ou expirée)."""
+        return self.get_many(namespace, [key]).get(key)
+
+    def get_many(self, namespace, keys):
+        """Look up several keys at once; returns `{key: value}` for hits only."""
+        keys = list(keys)
+        found = {}
+        if not keys:
+            return found
+        now = time.time()
+        with self._lock:
+            rows = []
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows.extend(self._conn.execute(
+                    f"SELECT key, value, created_at, accessed_at FROM entries WHERE namespace = ? AND key IN ({marks})",
+                    [namespace, *part],
+                ).fetchall())
+            touched = []
+            for key, value, created_at, accessed_at in rows:
+                if now - created_at > self.ttl:
+                    continue
+                try:
+                    found[key] = json.loads(value)
+                except Exception:
+                    continue
+                if now - accessed_at >= self.touch_interval:
+                    touched.append((now, namespace, key))
+            if touched:
+                self._conn.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?", touched
+                )
+                self._conn.commit()
+            for key in keys:
+                self._count(namespace, "hits" if key in found else "misses")
+        return found
+
+    async def aget_many(self, namespace, keys):
+        return await asyncio.to_thread(self.get_many, namespace, list(keys))
+
+    async def aget(self, namespace, key):
+        return (await self.aget_many(namespace, [key])).get(key)
+
+    def set(self, namespace, key, value):
+        self.set_many(namespace, {key: value})
+
+    def set_many(self, namespace, items):
+        if not items:
+            return
+        now = time.time()
+        rows = [(namespace, k, json.dumps(v, ensure_ascii=False), now, now) for k, v in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            for _ in rows:
+                self._count(namespace, "writes")
+            self._writes += len(rows)
+            if self._writes >= _EVICT_EVERY:
+                self._evict()
+
+    async def aset_many(self, namespace, items):
+        await asyncio.to_thread(self.set_many, namespace, dict(items))
+
+    async def aset(self, namespace, key, value):
+        await self.aset_many(namespace, {key: value})
+
+    def _evict(self):
+        # Caller holds self._lock
+        self._writes = 0
+        self._conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        overflow = size - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE rowid IN ("
+                " SELECT rowid FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+        self._conn.commit()
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM entries")
+            else:
+                self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+
+    def stats(self, namespace=None):
+        """Hit/miss counters for this process, per namespace (or one namespace)."""
+        with self._lock:
+            stats = {ns: dict(c) for ns, c in self._stats.items()}
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        for counters in stats.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+        if namespace is not None:
+            return stats.get(namespace, {"hits": 0, "misses": 0, "writes": 0, "hit_rate": 0.0})
+        return {"entries": size, "namespaces": stats}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Cache partagé du process, ou None si RESULT_CACHE_ENABLED=false."""
+    global _cache
+    if os.getenv("RESULT_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
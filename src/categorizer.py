@@ -0,0 +1,172 @@
+# categorizer.py
+"""Moteur de catégorisation concurrent (et optionnellement par lots).
+
+`process_ticket` used to await one Gemini round trip per ticket before
+starting the next one. `CategorizationEngine` keeps up to
+`max_concurrency` calls in flight and, when `batch_size > 1`, packs several
+tickets into a single `BATCH_CATEGORIZATION_PROMPT` request. Labels coming
+back from a batch are mapped to tickets by id; tickets whose label is
+missing or invalid are re-sent individually with `acategorize_ticket`.
+
+Valid labels are stored in the persistent result cache (`src.cache`) under
+a hash of the prompt, model and ticket content, so repeated tickets skip
+the LLM entirely. Tickets not found in the cache first go through the
+local fast-path classifier (`src.classifier`); only those below
+FASTPATH_CONFIDENCE reach Gemini, and their labels feed the classifier.
+
+Configuration (environment variables, read when the engine is created):
+- CATEGORIZATION_CONCURRENCY: max calls in flight (default 8)
+- CATEGORIZATION_BATCH_SIZE: tickets per LLM request; 1 disables batching (default 1)
+"""
+import os
+import asyncio
+
+from src.agents import acategorize_ticket, acategorize_ticket_batch, parse_label_map
+from src.cache import content_hash, get_result_cache
+from src.llm import DEFAULT_MODEL
+from src.classifier import fastpath_threshold, get_fastpath_classifier, record_llm_labels
+from src.prompts import CATEGORIES, CATEGORIZATION_PROMPT
+
+
+VALID_CATEGORIES = CATEGORIES
+
+
+def _normalize_label(value):
+    if not isinstance(value, str):
+        return None
+    label = value.strip().strip("\"'.").lower()
+    return label if label in VALID_CATEGORIES else None
+
+
+def category_cache_key(ticket):
+    """Clé de cache d'un ticket : prompt, modèle et contenu du ticket."""
+    return content_hash(
+        CATEGORIZATION_PROMPT, DEFAULT_MODEL, ticket.get("subject", ""), ticket.get("body", "")
+    )
+
+
+def parse_batch_labels(raw, expected_ids):
+    """Extract `{ticket_id: category}` from a batch answer.
+
+    Ids missing from the answer or with an invalid category are dropped so
+    the caller can fall back to single-ticket calls for them.
+    """
+    return parse_label_map(raw, expected_ids, VALID_CATEGORIES)
+
+
+class CategorizationEngine:
+    """Catégorise une liste de tickets avec un nombre borné d'appels en vol."""
+
+    def __init__(self, max_concurrency=None, batch_size=None):
+        self.max_concurrency = max(1, int(max_concurrency or os.getenv("CATEGORIZATION_CONCURRENCY", "8")))
+        self.batch_size = max(1, int(batch_size or os.getenv("CATEGORIZATION_BATCH_SIZE", "1")))
+
+    async def categorize(self, tickets):
+        """Return a list of categories aligned with `tickets`.
+
+        Entries are `None` for tickets that could not be categorized or got
+        a label outside CATEGORIES (the error is printed, matching the
+        previous per-ticket behaviour).
+        """
+        results = [None] * len(tickets)
+        if not tickets:
+            return results
+
+        cache = get_result_cache()
+        keys = [category_cache_key(t) for t in tickets]
+        cached = await cache.aget_many("category", keys) if cache is not None else {}
+        fastpath = get_fastpath_classifier()
+        threshold = fastpath_threshold()
+        local = 0
+
+        # Identical tickets inside the same run are sent once and share the label.
+        indexed = []
+        duplicates = {}
+        first_index = {}
+        for i, ticket in enumerate(tickets):
+            label = _normalize_label(cached.get(keys[i]))
+            if label is not None:
+                results[i] = label
+                continue
+            if fastpath is not None:
+                label, confidence = fastpath.predict_ticket(ticket)
+                if confidence >= threshold:
+                    results[i] = label
+                    local += 1
+                    continue
+            if keys[i] in first_index:
+                duplicates[i] = first_index[keys[i]]
+            else:
+                first_index[keys[i]] = i
+                indexed.append((i, ticket))
+
+        if local:
+            print(f"⚡ {local} ticket(s) catégorisé(s) localement (confiance ≥ {threshold}).")
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self.batch_size > 1:
+            chunks = [indexed[i:i + self.batch_size] for i in range(0, len(indexed), self.batch_size)]
+            await asyncio.gather(*(self._run_batch(chunk, semaphore, results) for chunk in chunks))
+        else:
+            await asyncio.gather(*(self._run_single(i, t, semaphore, results) for i, t in indexed))
+
+        for i, source in duplicates.items():
+            results[i] = results[source]
+
+        fresh = {}
+        for i, ticket in indexed:
+            label = _normalize_label(results[i])
+            if label is not None:
+                fresh[i] = label
+        if cache is not None:
+            await cache.aset_many("category", {keys[i]: label for i, label in fresh.items()})
+        # LLM answers become training data for the local classifier
+        await asyncio.to_thread(record_llm_labels, [(tickets[i], label) for i, label in fresh.items()])
+        return results
+
+    async def _run_single(self, index, ticket, semaphore, results):
+        try:
+            async with semaphore:
+                category = await acategorize_ticket(ticket)
+        except Exception as e:
+            print(f"❌ Erreur ticket {ticket.get('id', '?')}: {e}")
+            return
+        # Same check as the batch path: anything outside CATEGORIES is no label
+        label = _normalize_label(category)
+        if label is None:
+            print(f"❌ Catégorie invalide pour le ticket {ticket.get('id', '?')}: {category!r}")
+        results[index] = label
+
+    async def _run_batch(self, chunk, semaphore, results):
+        # Ids must be unique inside a batch to map labels back; tickets with a
+        # missing or duplicated id go straight to the single-ticket path.
+        by_id = {}
+        singles = []
+        for index, ticket in chunk:
+            key = str(ticket.get("id")) if ticket.get("id") is not None else None
+            if key is None or key in by_id:
+                singles.append((index, ticket))
+            else:
+                by_id[key] = (index, ticket)
+
+        labels = {}
+        if by_id:
+            try:
+                async with semaphore:
+                    raw = await acategorize_ticket_batch([t for _, t in by_id.values()])
+                labels = parse_batch_labels(raw, by_id.keys())
+            except Exception as e:
+                print(f"❌ Erreur lot de {len(by_id)} tickets: {e}")
+
+        missing = 0
+        for key, (index, ticket) in by_id.items():
+            if key in labels:
+                results[index] = labels[key]
+            else:
+                singles.append((index, ticket))
+                missing += 1
+
+        if missing:
+            print(f"↩️ {missing} ticket(s) recatégorisé(s) individuellement après réponse de lot incomplète.")
+        await asyncio.gather(*(self._run_single(i, t, semaphore, results) for i, t in singles))
@@ -0,0 +1,393 @@
+# checkpoint.py
+"""Checkpointer durable (SQLite/WAL) pour reprendre les runs interrompus.
+
+`human_validation_loop` and the tool nodes pause the graph with
+`interrupt()`. Without a durable checkpointer, a restart while a reviewer
+is deciding loses the categorization and RAG work done before the pause.
+`CompactCheckpointSaver` is a LangGraph `BaseCheckpointSaver` that:
+
+- stores each channel value once per version, and on every checkpoint
+  only writes the channels listed in `new_versions` (the keys that
+  changed); a checkpoint row itself only holds the channel versions;
+- compresses serialized blobs with zlib above `CHECKPOINT_COMPRESS_MIN`
+  bytes;
+- keeps pending writes of finished tasks, so a resumed run does not
+  re-run nodes that completed before the interrupt;
+- garbage-collects by a retention policy: the last `CHECKPOINT_KEEP`
+  checkpoints per thread, and threads idle for more than
+  `CHECKPOINT_MAX_AGE_DAYS`. Blobs no longer referenced are deleted.
+  (The pipeline's channels are plain values; delta channels are not
+  supported by this GC.)
+
+Storage goes through a small backend interface (`SQLiteCheckpointStore`),
+so another database can be plugged in by implementing the same methods.
+
+Configuration:
+- CHECKPOINTER: "sqlite" to compile the graph with this saver, "none"
+  to leave persistence to the runtime, e.g. LangGraph Studio (default none)
+- CHECKPOINT_PATH: SQLite file (default ".cache/checkpoints.sqlite3")
+- CHECKPOINT_COMPRESS_MIN: smallest blob compressed, in bytes; 0 disables (default 256)
+- CHECKPOINT_KEEP: checkpoints kept per thread (default 20)
+- CHECKPOINT_MAX_AGE_DAYS: idle threads deleted after this many days, 0 = never (default 30)
+"""
+import os
+import json
+import time
+import zlib
+import random
+import sqlite3
+import asyncio
+import threading
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+
+# Retention runs every N checkpoints rather than on each one
+_GC_EVERY = 50
+
+
+class SQLiteCheckpointStore:
+    """Backend de stockage : lignes de checkpoints, blobs par version et writes."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("CHECKPOINT_PATH", ".cache/checkpoints.sqlite3")
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+                " parent_id TEXT, checkpoint_type TEXT NOT NULL, checkpoint BLOB NOT NULL,"
+                " metadata_type TEXT NOT NULL, metadata BLOB NOT NULL,"
+                " versions TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));"
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL,"
+                " version TEXT NOT NULL, type TEXT NOT NULL, blob BLOB,"
+                " PRIMARY KEY (thread_id, checkpoint_ns, channel, version));"
+                "CREATE TABLE IF NOT EXISTS writes ("
+                " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+                " task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL,"
+                " type TEXT NOT NULL, blob BLOB, task_path TEXT NOT NULL DEFAULT '',"
+                " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));"
+            )
+            self._conn.commit()
+
+    # --- écriture ---
+    def put_checkpoint(self, thread_id, ns, checkpoint_id, parent_id, checkpoint, metadata, versions, blobs):
+        """`checkpoint`/`metadata`: `(type, blob)`; `blobs`: `[(channel, version, type, blob)]`
+        for the changed channels only."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO blobs (thread_id, checkpoint_ns, channel, version, type, blob)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(thread_id, ns, c, str(v), t, b) for c, v, t, b in blobs],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_id,"
+                " checkpoint_type, checkpoint, metadata_type, metadata, versions, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint_id, parent_id, *checkpoint, *metadata, versions, time.time()),
+            )
+            self._conn.commit()
+
+    def put_writes(self, thread_id, ns, checkpoint_id, rows):
+        """`rows`: `[(task_id, idx, channel, type, blob, task_path)]`.
+
+        Special writes (negative idx: errors, interrupts) replace earlier
+        ones; regular writes are kept as first written.
+        """
+        with self._lock:
+            for verb, part in (("INSERT OR IGNORE", [r for r in rows if r[1] >= 0]),
+                               ("INSERT OR REPLACE", [r for r in rows if r[1] < 0])):
+                self._conn.executemany(
+                    f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, blob,"
+                    " task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(thread_id, ns, checkpoint_id, *row) for row in part],
+                )
+            self._conn.commit()
+
+    # --- lecture ---
+    def get_checkpoint(self, thread_id, ns, checkpoint_id=None):
+        query = ("SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata FROM checkpoints"
+                 " WHERE thread_id = ? AND checkpoint_ns = ?")
+        params = [thread_id, ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", params).fetchone()
+
+    def list_checkpoints(self, thread_id=None, ns=None, checkpoint_id=None, before=None):
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint_type, checkpoint,"
+                 " metadata_type, metadata FROM checkpoints")
+        clauses, params = [], []
+        for column, value in (("thread_id", thread_id), ("checkpoint_ns", ns), ("checkpoint_id", checkpoint_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if before is not None:
+            clauses.append("checkpoint_id < ?")
+            params.append(before)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY checkpoint_id DESC", params).fetchall()
+
+    def get_blobs(self, thread_id, ns, versions):
+        """`{channel: (type, blob)}` for the given `{channel: version}`."""
+        if not versions:
+            return {}
+        pairs = [(c, str(v)) for c, v in versions.items()]
+        marks = " OR ".join("(channel = ? AND version = ?)" for _ in pairs)
+        params = [thread_id, ns] + [x for pair in pairs for x in pair]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT channel, type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND ({marks})",
+                params,
+            ).fetchall()
+        return {c: (t, b) for c, t, b in rows}
+
+    def get_writes(self, thread_id, ns, checkpoint_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT task_id, idx, channel, type, blob, task_path FROM writes"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, ns, checkpoint_id),
+            ).fetchall()
+
+    # --- rétention ---
+    def delete_thread(self, thread_id):
+        with self._lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def gc(self, keep, max_age):
+        """Apply the retention policy; returns the number of checkpoints removed."""
+        removed = 0
+        if max_age:
+            with self._lock:
+                idle = [r[0] for r in self._conn.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+                    (time.time() - max_age,),
+                ).fetchall()]
+            for thread_id in idle:
+                self.delete_thread(thread_id)
+            removed += len(idle)
+        with self._lock:
+            crowded = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns FROM checkpoints GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > ?",
+                (keep,),
+            ).fetchall()
+            for thread_id, ns in crowded:
+                old = [r[0] for r in self._conn.execute(
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                    (thread_id, ns, keep),
+                ).fetchall()]
+                self._conn.executemany(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    [(thread_id, ns, cid) for cid in old],
+                )
+                self._conn.executemany(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    [(thread_id, ns, cid) for cid in old],
+                )
+                # Blobs survive only while a remaining checkpoint references them
+                live = set()
+                for (versions,) in self._conn.execute(
+                    "SELECT versions FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, ns)
+                ):
+                    live.update((c, str(v)) for c, v in json.loads(versions).items())
+                stale = [
+                    (thread_id, ns, c, v)
+                    for c, v in self._conn.execute(
+                        "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, ns)
+                    ).fetchall()
+                    if (c, v) not in live
+                ]
+                self._conn.executemany(
+                    "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?", stale
+                )
+                removed += len(old)
+            self._conn.commit()
+        return removed
+
+    def size_bytes(self):
+        if self.path == ":memory:":
+            return 0
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CompactCheckpointSaver(BaseCheckpointSaver):
+    """Checkpointer LangGraph : blobs par canal modifié, compressés, avec rétention."""
+
+    def __init__(self, store=None, compress_min=None, keep=None, max_age_days=None, serde=None):
+        super().__init__(serde=serde)
+        self.store = store or SQLiteCheckpointStore()
+        self.compress_min = int(compress_min if compress_min is not None else os.getenv("CHECKPOINT_COMPRESS_MIN", "256"))
+        self.keep = max(1, int(keep or os.getenv("CHECKPOINT_KEEP", "20")))
+        max_age_days = float(max_age_days if max_age_days is not None else os.getenv("CHECKPOINT_MAX_AGE_DAYS", "30"))
+        self.max_age = max_age_days * 86400
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+
+    # --- (dé)sérialisation ---
+    def _dump(self, value):
+        type_, blob = self.serde.dumps_typed(value)
+        if self.compress_min and blob is not None and len(blob) >= self.compress_min:
+            # "z:" marks zlib-compressed payloads
+            return "z:" + type_, zlib.compress(blob, 6)
+        return type_, blob
+
+    def _load(self, type_, blob):
+        if type_.startswith("z:"):
+            type_, blob = type_[2:], zlib.decompress(blob)
+        return self.serde.loads_typed((type_, blob))
+
+    def _tuple(self, thread_id, ns, row):
+        checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        checkpoint = self._load(checkpoint_type, checkpoint)
+        blobs = self.store.get_blobs(thread_id, ns, checkpoint["channel_versions"])
+        values = {c: self._load(t, b) for c, (t, b) in blobs.items() if t != "empty"}
+        writes = sorted(self.store.get_writes(thread_id, ns, checkpoint_id), key=lambda w: writes_sort_key(w[5], w[0], w[1]))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self._load(metadata_type, metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self._load(t, b)) for task_id, _, channel, t, b, _ in writes],
+        )
+
+    # --- API BaseCheckpointSaver ---
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        row = self.store.get_checkpoint(thread_id, ns, get_checkpoint_id(config))
+        return self._tuple(thread_id, ns, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        configurable = (config or {}).get("configurable", {})
+        rows = self.store.list_checkpoints(
+            configurable.get("thread_id"),
+            configurable.get("checkpoint_ns"),
+            get_checkpoint_id(config) if config else None,
+            get_checkpoint_id(before) if before else None,
+        )
+        for thread_id, ns, *row in rows:
+            if limit is not None and limit <= 0:
+                return
+            item = self._tuple(thread_id, ns, row)
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        stored = dict(checkpoint)
+        values = stored.pop("channel_values")
+        # Only the channels that changed since the parent are written
+        blobs = [
+            (c, v, *(self._dump(values[c]) if c in values else ("empty", None)))
+            for c, v in new_versions.items()
+        ]
+        self.store.put_checkpoint(
+            thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+            self._dump(stored),
+            self._dump(get_checkpoint_metadata(config, metadata)),
+            json.dumps({c: str(v) for c, v in checkpoint["channel_versions"].items()}),
+            blobs,
+        )
+        self._maybe_gc()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        configurable = config["configurable"]
+        rows = [
+            (task_id, WRITES_IDX_MAP.get(channel, idx), channel, *self._dump(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        self.store.put_writes(configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                              configurable["checkpoint_id"], rows)
+
+    def delete_thread(self, thread_id):
+        self.store.delete_thread(thread_id)
+
+    def get_next_version(self, current, channel=None):
+        # Same scheme as LangGraph's savers: zero-padded counter + random suffix
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(str(current).split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- async : SQLite tourne hors de la boucle ---
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # --- rétention ---
+    def _maybe_gc(self):
+        with self._puts_lock:
+            self._puts += 1
+            due = self._puts % _GC_EVERY == 0
+        if due:
+            self.gc()
+
+    def gc(self):
+        """Applique la politique de rétention ; retourne le nombre de checkpoints supprimés."""
+        return self.store.gc(self.keep, self.max_age)
+
+
+_saver = None
+_saver_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """Checkpointer partagé du process selon CHECKPOINTER, ou None."""
+    global _saver
+    if os.getenv("CHECKPOINTER", "none").lower() != "sqlite":
+        return None
+    if _saver is None:
+        with _saver_lock:
+            if _saver is None:
+                _saver = CompactCheckpointSaver()
+    return _saver
@@ -0,0 +1,359 @@
+# classifier.py
+"""Classifieur local « fast path » placé devant le catégoriseur Gemini.
+
+Most tickets are easy to label, yet each one used to cost a full LLM round
+trip. `FastPathClassifier` is a small linear model (multinomial logistic
+regression over TF-IDF weighted character n-grams and words) that returns
+one of the three `CATEGORIZATION_PROMPT` labels with a confidence score.
+`CategorizationEngine` only escalates tickets below the confidence
+threshold to `categorize_ticket`; while the fast path is enabled, the
+labels the LLM returns are appended to a JSONL training log and applied
+as online updates, and the offline `train` command folds that log back
+into the saved model.
+
+Online updates live in memory and are written back to the model file
+every FASTPATH_SAVE_EVERY labels; those applied since the last save are
+lost on restart (they are still in the training log). The log is rotated
+to `<log>.1` once it passes FASTPATH_TRAINING_LOG_MAX_MB, so at most two
+files are kept; pass both to `train`.
+
+Pure Python on purpose: prediction takes well under a millisecond per
+ticket and needs no extra dependency.
+
+Offline training (labeled JSON/JSONL tickets with a "category" field):
+
+    python -m src.classifier train labeled.jsonl --out .cache/fastpath_model.json
+
+Configuration:
+- FASTPATH_ENABLED: set to "false" to always call the LLM (default true)
+- FASTPATH_MODEL_PATH: trained model (default ".cache/fastpath_model.json");
+  the fast path stays off until this file exists
+- FASTPATH_CONFIDENCE: minimum confidence to skip the LLM (default 0.9)
+- FASTPATH_TRAINING_LOG: where LLM labels are appended
+  (default ".cache/fastpath_labels.jsonl")
+- FASTPATH_TRAINING_LOG_MAX_MB: size at which the log is rotated (default 50)
+- FASTPATH_SAVE_EVERY: online labels between model saves, 0 = never (default 200)
+"""
+import os
+import re
+import sys
+import json
+import math
+import random
+import argparse
+import threading
+import unicodedata
+from collections import Counter
+
+from src.prompts import CATEGORIES
+
+
+LABELS = CATEGORIES
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text) -> str:
+    """Minuscules, accents retirés, ponctuation réduite à des espaces."""
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def ticket_text(ticket) -> str:
+    return f"{ticket.get('subject', '')} {ticket.get('body', '')}"
+
+
+def extract_features(text, ngram_range=(2, 4)):
+    """Counts of words and character n-grams (n-grams stay within words)."""
+    counts = Counter()
+    lo, hi = ngram_range
+    for word in normalize_text(text).split():
+        counts["w:" + word] += 1
+        padded = f" {word} "
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                counts[padded[i:i + n]] += 1
+    return counts
+
+
+class FastPathClassifier:
+    """Régression logistique multinomiale sur n-grammes TF-IDF."""
+
+    def __init__(self, labels=LABELS, ngram_range=(2, 4), learning_rate=0.5, l2=1e-5):
+        self.labels = tuple(labels)
+        self.ngram_range = tuple(ngram_range)
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.idf = {}
+        self.default_idf = 1.0
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+        self.n_examples = 0
+        # partial_fit updates the weights in place while predictions read them
+        self._lock = threading.Lock()
+
+    # --- features ---
+    def vectorize(self, text):
+        counts = extract_features(text, self.ngram_range)
+        vec = {}
+        for feat, tf in counts.items():
+            vec[feat] = (1.0 + math.log(tf)) * self.idf.get(feat, self.default_idf)
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {f: v / norm for f, v in vec.items()}
+
+    # --- model ---
+    def _scores(self, vec):
+        scores = {}
+        for label in self.labels:
+            w = self.weights[label]
+            scores[label] = self.bias[label] + sum(x * w.get(f, 0.0) for f, x in vec.items())
+        return scores
+
+    @staticmethod
+    def _softmax(scores):
+        top = max(scores.values())
+        exp = {k: math.exp(v - top) for k, v in scores.items()}
+        total = sum(exp.values())
+        return {k: v / total for k, v in exp.items()}
+
+    def _sgd_step(self, vec, label, lr):
+        probs = self._softmax(self._scores(vec))
+        for cls in self.labels:
+            grad = probs[cls] - (1.0 if cls == label else 0.0)
+            if grad == 0.0:
+                continue
+            w = self.weights[cls]
+            for f, x in vec.items():
+                w[f] = w.get(f, 0.0) * (1.0 - lr * self.l2) - lr * grad * x
+            self.bias[cls] -= lr * grad
+
+    def fit(self, examples, epochs=15, seed=13):
+        """Entraîne depuis zéro sur des paires `(text, label)`."""
+        examples = [(t, l) for t, l in examples if l in self.labels]
+        if not examples:
+            raise ValueError("no labeled examples with a known category")
+
+        df = Counter()
+        for text, _ in examples:
+            df.update(set(extract_features(text, self.ngram_range)))
+        n = len(examples)
+        self.idf = {f: math.log((1 + n) / (1 + c)) + 1.0 for f, c in df.items()}
+        self.default_idf = math.log(1 + n) + 1.0
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+
+        vectors = [(self.vectorize(t), l) for t, l in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(vectors)
+            lr = self.learning_rate / (1.0 + epoch)
+            for vec, label in vectors:
+                self._sgd_step(vec, label, lr)
+        self.n_examples = n
+        return self
+
+    def partial_fit(self, examples):
+        """Online update with new labels (e.g. from the LLM); idf stays frozen."""
+        vectors = [(self.vectorize(text), label) for text, label in examples if label in self.labels]
+        lr = self.learning_rate / 10.0
+        with self._lock:
+            for vec, label in vectors:
+                self._sgd_step(vec, label, lr)
+                self.n_examples += 1
+
+    def predict(self, text):
+        """Retourne `(label, confidence)`."""
+        vec = self.vectorize(text)
+        with self._lock:
+            scores = self._scores(vec)
+        probs = self._softmax(scores)
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+    def predict_ticket(self, ticket):
+        return self.predict(ticket_text(ticket))
+
+    # --- persistence ---
+    def to_dict(self):
+        return {
+            "labels": list(self.labels),
+            "ngram_range": list(self.ngram_range),
+            "learning_rate": self.learning_rate,
+            "l2": self.l2,
+            "idf": self.idf,
+            "default_idf": self.default_idf,
+            # Drop near-zero weights to keep the file small
+            "weights": {l: {f: round(v, 6) for f, v in w.items() if abs(v) > 1e-6} for l, w in self.weights.items()},
+            "bias": self.bias,
+            "n_examples": self.n_examples,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(data["labels"], data["ngram_range"], data["learning_rate"], data["l2"])
+        model.idf = data["idf"]
+        model.default_idf = data["default_idf"]
+        model.weights = {l: dict(w) for l, w in data["weights"].items()}
+        model.bias = dict(data["bias"])
+        model.n_examples = data.get("n_examples", 0)
+        return model
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            data = self.to_dict()
+        # One temporary file per writer: concurrent saves must not share it
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+# --------------------------
+# Fast path partagé (utilisé par CategorizationEngine)
+# --------------------------
+_classifier = None
+_classifier_loaded = False
+_classifier_lock = threading.Lock()
+_log_lock = threading.Lock()
+_unsaved = 0
+
+
+def fastpath_enabled() -> bool:
+    return os.getenv("FASTPATH_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def fastpath_threshold() -> float:
+    return float(os.getenv("FASTPATH_CONFIDENCE", "0.9"))
+
+
+def _model_path():
+    return os.getenv("FASTPATH_MODEL_PATH", ".cache/fastpath_model.json")
+
+
+def get_fastpath_classifier():
+    """Modèle entraîné partagé, ou None si absent/désactivé."""
+    global _classifier, _classifier_loaded
+    if not fastpath_enabled():
+        return None
+    if not _classifier_loaded:
+        with _classifier_lock:
+            if not _classifier_loaded:
+                path = _model_path()
+                if os.path.exists(path):
+                    try:
+                        _classifier = FastPathClassifier.load(path)
+                    except Exception as e:
+                        import warnings
+
+                        warnings.warn(f"Fast-path model unusable ({path}): {e}. Using the LLM only.", RuntimeWarning)
+                _classifier_loaded = True
+    return _classifier
+
+
+def _append_training_log(rows):
+    path = os.getenv("FASTPATH_TRAINING_LOG", ".cache/fastpath_labels.jsonl")
+    max_bytes = float(os.getenv("FASTPATH_TRAINING_LOG_MAX_MB", "50")) * 1024 * 1024
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _log_lock:
+            if max_bytes > 0 and os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                # Keep one previous generation; older labels are dropped
+                os.replace(path, f"{path}.1")
+            with open(path, "a", encoding="utf-8") as f:
+                for ticket, label in rows:
+                    f.write(json.dumps({
+                        "subject": ticket.get("subject", ""),
+                        "body": ticket.get("body", ""),
+                        "category": label,
+                        "source": "llm",
+                    }, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ Impossible d'écrire le journal d'entraînement fast path : {e}")
+
+
+def record_llm_labels(tickets_and_labels):
+    """Append LLM labels to the training log and apply them online.
+
+    Blocking (file writes, model updates and saves): call it from a thread
+    in async code. Does nothing while the fast path is disabled.
+    """
+    global _unsaved
+    if not fastpath_enabled():
+        return
+    rows = [(t, l) for t, l in tickets_and_labels if l in LABELS]
+    if not rows:
+        return
+    _append_training_log(rows)
+    model = get_fastpath_classifier()
+    if model is None:
+        return
+    model.partial_fit([(ticket_text(t), l) for t, l in rows])
+    save_every = int(os.getenv("FASTPATH_SAVE_EVERY", "200"))
+    with _classifier_lock:
+        _unsaved += len(rows)
+        due = save_every > 0 and _unsaved >= save_every
+        if due:
+            _unsaved = 0
+    if due:
+        try:
+            model.save(_model_path())
+        except OSError as e:
+            print(f"⚠️ Impossible d'enregistrer le modèle fast path : {e}")
+
+
+def _read_labeled(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = json.load(f)
+    return [(ticket_text(r), r.get("category")) for r in records if r.get("category")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the local fast-path ticket classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="train from labeled tickets (JSON array or JSONL)")
+    train.add_argument("data", nargs="+", help="labeled ticket files; the LLM label log can be passed too")
+    train.add_argument("--out", default=os.getenv("FASTPATH_MODEL_PATH", ".cache/fastpath_model.json"))
+    train.add_argument("--epochs", type=int, default=15)
+    train.add_argument("--holdout", type=float, default=0.2, help="fraction kept aside to report accuracy")
+    args = parser.parse_args(argv)
+
+    examples = []
+    for path in args.data:
+        examples.extend(_read_labeled(path))
+    random.Random(7).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout)) if len(examples) > 10 else len(examples)
+    train_set, test_set = examples[:split], examples[split:]
+
+    model = FastPathClassifier().fit(train_set, epochs=args.epochs)
+    if test_set:
+        threshold = fastpath_threshold()
+        correct = confident = confident_correct = 0
+        for text, label in test_set:
+            pred, conf = model.predict(text)
+            correct += pred == label
+            if conf >= threshold:
+                confident += 1
+                confident_correct += pred == label
+        print(f"holdout accuracy: {correct / len(test_set):.3f} on {len(test_set)} tickets")
+        if confident:
+            print(f"fast-path coverage at {threshold}: {confident / len(test_set):.1%}, "
+                  f"accuracy {confident_correct / confident:.3f}")
+    # Final model uses every example
+    model = FastPathClassifier().fit(examples, epochs=args.epochs)
+    model.save(args.out)
+    print(f"model saved to {args.out} ({len(examples)} examples)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+# embeddings.py
+"""Cache persistant d'embeddings, adressé par contenu, avec calcul par lots.
+
+`TicketRAGAgent` hands `GoogleGenerativeAIEmbeddings` to Chroma, so every
+re-index and every query embedded its text again, even when it had been
+embedded before: re-indexing a growing knowledge base cost time and quota
+in proportion to its whole size. `CachedEmbeddings` wraps the embedding
+function:
+
+- vectors are stored in SQLite under a SHA-256 of (model, kind, text),
+  as compact float32 blobs; "document" and "query" vectors are kept apart
+  because the API embeds them for different tasks;
+- only texts missing from the store are sent, deduplicated, in bulk
+  requests of EMBEDDING_BATCH_SIZE texts;
+- `embedding_stats()` reports lookups, hit rate, texts embedded, bulk
+  requests sent and vectors stored (`/embeddings` in the service).
+
+Configuration:
+- EMBEDDING_CACHE_ENABLED: "false" to use the embedding function as is (default true)
+- EMBEDDING_CACHE_PATH: SQLite file (default ".cache/embeddings.sqlite3")
+- EMBEDDING_BATCH_SIZE: texts per embedding request (default 100)
+"""
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from array import array
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:  # optional dependency: the service image runs without langchain
+    Embeddings = object
+
+from src.cache import content_hash
+from src.metrics import record_embedding_lookups
+
+
+def embedding_cache_enabled():
+    return os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _pack(vector):
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob):
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+# Process-wide counters, shared by every wrapped embedding function
+_stats = {"hits": 0, "misses": 0, "embedded": 0, "requests": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(**increments):
+    with _stats_lock:
+        for name, n in increments.items():
+            _stats[name] += n
+
+
+def embedding_stats(store=None):
+    """Lookups, hit rate, texts embedded, requests sent and vectors stored."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats.update((store or get_embedding_store()).stats())
+    return stats
+
+
+class EmbeddingStore:
+    """Vecteurs float32 persistants, indexés par hash de contenu."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get_many(self, keys):
+        """`{key: vector}` for the keys present in the store."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update((key, _unpack(blob)) for key, blob in rows)
+        return found
+
+    def set_many(self, model, vectors):
+        now = time.time()
+        rows = [(key, model, len(v), _pack(v), now) for key, v in vectors.items()]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM vectors").fetchone()
+        return {"vectors": count, "vector_bytes": size}
+
+
+class CachedEmbeddings(Embeddings):
+    """Fonction d'embedding avec cache persistant et calcul par lots."""
+
+    def __init__(self, inner, model, store=None, batch_size=None):
+        self.inner = inner
+        self.model = model
+        self.store = store if store is not None else get_embedding_store()
+        self.batch_size = max(1, int(batch_size or os.getenv("EMBEDDING_BATCH_SIZE", "100")))
+
+    def _key(self, kind, text):
+        return content_hash("embedding", self.model, kind, text)
+
+    def _lookup(self, kind, texts):
+        """Cached vectors aligned with `texts` (None when missing) and the missing texts."""
+        keys = [self._key(kind, t) for t in texts]
+        found = self.store.get_many(set(keys))
+        vectors = [found.get(k) for k in keys]
+        # Each distinct missing text is embedded once
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        hits = sum(v is not None for v in vectors)
+        _count(hits=hits, misses=len(texts) - hits)
+        record_embedding_lookups(hits, len(texts) - hits)
+        return keys, vectors, missing
+
+    def _fill(self, kind, texts, keys, vectors, missing, fresh):
+        """Store `fresh` (vectors of `missing`) and complete `vectors`."""
+        # Rounded to float32 now, so a text gets the same vector whether
+        # it was just embedded or read back from the store
+        computed = {t: _unpack(_pack(v)) for t, v in zip(missing, fresh)}
+        self.store.set_many(self.model, {self._key(kind, t): v for t, v in computed.items()})
+        _count(embedded=len(missing))
+        return [v if v is not None else computed[t] for t, v in zip(texts, vectors)]
+
+    def _batches(self, texts):
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    # --- interface langchain ---
+    def embed_documents(self, texts):
+        texts = list(texts)
+        keys, vectors, missing = self._lookup("document", texts)
+        fresh = []
+        for batch in self._batches(missing):
+            _count(requests=1)
+            fresh.extend(self.inner.embed_documents(batch))
+        return self._fill("document", texts, keys, vectors, missing, fresh)
+
+    def embed_query(self, text):
+        keys, vectors, missing = self._lookup("query", [text])
+        if not missing:
+            return vectors[0]
+        _count(requests=1)
+        return self._fill("query", [text], keys, vectors, missing, [self.inner.embed_query(text)])[0]
+
+    async def aembed_documents(self, texts):
+        texts = list(texts)
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, "document", texts)
+        fresh = []
+        for batch in self._batches(missing):
+            _count(requests=1)
+            fresh.extend(await self.inner.aembed_documents(batch))
+        return await asyncio.to_thread(self._fill, "document", texts, keys, vectors, missing, fresh)
+
+    async def aembed_query(self, text):
+        keys, vectors, missing = await asyncio.to_thread(self._lookup, "query", [text])
+        if not missing:
+            return vectors[0]
+        _count(requests=1)
+        fresh = [await self.inner.aembed_query(text)]
+        return (await asyncio.to_thread(self._fill, "query", [text], keys, vectors, missing, fresh))[0]
+
+    def stats(self):
+        return embedding_stats(self.store)
+
+
+def with_embedding_cache(embeddings, model):
+    """Enveloppe `embeddings` dans le cache, sauf si EMBEDDING_CACHE_ENABLED=false."""
+    if embeddings is None or not embedding_cache_enabled():
+        return embeddings
+    return CachedEmbeddings(embeddings, model)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """Stock de vecteurs partagé du process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EmbeddingStore()
+    return _store
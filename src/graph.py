@@ -1,3 +1,6 @@
+import os
+import threading
+
 from langgraph.graph import StateGraph, END
 from src.nodes import (
     load_tickets,
@@ -12,41 +15,84 @@ from src.nodes import (
     send_ticket_email,
     call_gmail_tool,
     handle_product_complaint,
+    fan_out_tickets,
+    rag_ticket,
+    feedback_ticket,
+    product_ticket,
 )
+from src.checkpoint import get_checkpointer
+from src.metrics import instrument_node
 from src.state import GraphState
 
 
-def create_graph():
+# Every node is wrapped by `instrument_node`, which records its duration
+# in the `graph_node_duration_seconds` histogram (see src.metrics).
+def create_per_ticket_graph(checkpointer=None):
+    """Variante où chaque ticket traverse sa branche indépendamment (Send)."""
+    graph = StateGraph(GraphState)
+
+    graph.add_node("load_tickets", instrument_node("load_tickets", load_tickets))
+    graph.add_node("process_ticket", instrument_node("process_ticket", process_ticket))
+    graph.add_node("route_ticket", instrument_node("route_ticket", route_ticket))
+    graph.add_node("rag_ticket", instrument_node("rag_ticket", rag_ticket))
+    graph.add_node("feedback_ticket", instrument_node("feedback_ticket", feedback_ticket))
+    graph.add_node("product_ticket", instrument_node("product_ticket", product_ticket))
+
+    graph.set_entry_point("load_tickets")
+    graph.add_edge("load_tickets", "process_ticket")
+    graph.add_edge("process_ticket", "route_ticket")
+    # One task per ticket; results are merged by the GraphState reducers
+    graph.add_conditional_edges("route_ticket", fan_out_tickets, ["rag_ticket", "feedback_ticket", "product_ticket"])
+    graph.add_edge("rag_ticket", END)
+    graph.add_edge("feedback_ticket", END)
+    graph.add_edge("product_ticket", END)
+
+    return graph.compile(checkpointer=checkpointer)
+
+
+def create_graph(mode=None, checkpointer=None):
+    # GRAPH_MODE=per_ticket: Send fan-out, one task per ticket
+    mode = (mode or os.getenv("GRAPH_MODE", "batch")).lower()
+    if mode == "per_ticket":
+        return create_per_ticket_graph(checkpointer)
+
     graph = StateGraph(GraphState)
 
     # --- Nœuds principaux ---
-    graph.add_node("load_tickets", load_tickets)
-    graph.add_node("process_ticket", process_ticket)
-    graph.add_node("route_ticket", route_ticket)
+    graph.add_node("load_tickets", instrument_node("load_tickets", load_tickets))
+    graph.add_node("process_ticket", instrument_node("process_ticket", process_ticket))
+    graph.add_node("route_ticket", instrument_node("route_ticket", route_ticket))
 
     # --- Branche RAG ---
-    graph.add_node("filter_information_search", filter_information_search)
-    graph.add_node("construct_rag_queries", construct_rag_queries)
-    graph.add_node("retrieve_from_rag", retrieve_from_rag)
+    graph.add_node("filter_information_search", instrument_node("filter_information_search", filter_information_search))
+    graph.add_node("construct_rag_queries", instrument_node("construct_rag_queries", construct_rag_queries))
+    graph.add_node("retrieve_from_rag", instrument_node("retrieve_from_rag", retrieve_from_rag))
 
     # --- Branche Feedback ---
-    graph.add_node("analyze_ticket_sentiment", analyze_ticket_sentiment)
-    graph.add_node("classify_feedback_type", classify_feedback_type)
-    graph.add_node("human_validation_loop", human_validation_loop)
+    graph.add_node("analyze_ticket_sentiment", instrument_node("analyze_ticket_sentiment", analyze_ticket_sentiment))
+    graph.add_node("classify_feedback_type", instrument_node("classify_feedback_type", classify_feedback_type))
+    # Routed only by the Command(goto=...) the node returns: the tool step
+    # runs after an interrupt-mode review, never after the queue mode or
+    # a run with nothing to review. `destinations` lets Studio draw both.
+    graph.add_node(
+        "human_validation_loop",
+        instrument_node("human_validation_loop", human_validation_loop),
+        destinations=("call_gmail_tool", "send_ticket_email"),
+    )
     # The `call_gmail_tool` node represents a tools-style step. Provide
     # `destinations` mapping so LangGraph Studio can render labeled edges
     # (for example: 'done' -> send_ticket_email). This helps Studio show the
     # node as a tools step with a named outgoing path.
     graph.add_node(
         "call_gmail_tool",
-        call_gmail_tool,
+        instrument_node("call_gmail_tool", call_gmail_tool),
         destinations={"send_ticket_email": "done"},
     )
 
-    graph.add_node("send_ticket_email", send_ticket_email, destinations={END: "done"})
+    graph.add_node("send_ticket_email", instrument_node("send_ticket_email", send_ticket_email), destinations={END: "done"})
 
     # --- Branche Product Complaint ---
-    graph.add_node("handle_product_complaint", handle_product_complaint, destinations={END: "done"})
+    graph.add_node("handle_product_complaint", instrument_node("handle_product_complaint", handle_product_complaint), destinations={END: "done"})
 
     # --- Point d'entrée ---
     graph.set_entry_point("load_tickets")
@@ -68,11 +114,9 @@ def create_graph():
     # --- Suite Feedback ---
     graph.add_edge("analyze_ticket_sentiment", "classify_feedback_type")
     graph.add_edge("classify_feedback_type", "human_validation_loop")
-    # Add a static edge so Studio renders the possible tool step.
-    # Navigation is still controlled by Command(goto=...) returned from
-    # `human_validation_loop`, but adding this edge makes the node visible
-    # in the static graph and shows the tools path.
-    graph.add_edge("human_validation_loop", "call_gmail_tool")
+    # No static edge out of `human_validation_loop`: with one, the demo
+    # tool step (and its interrupt) ran on every run, which pauses the
+    # run for good once a checkpointer is attached.
     # La tool `call_gmail_tool` est appelée conditionnellement depuis le nœud
     graph.add_edge("call_gmail_tool", "send_ticket_email")
     graph.add_edge("send_ticket_email", END)
@@ -80,8 +124,30 @@ def create_graph():
     # --- Product Complaint ---
     graph.add_edge("handle_product_complaint", END)
 
-    return graph.compile()
+    # With a checkpointer, interrupt() really pauses the run and it resumes
+    # from the saved state (src.checkpoint: CHECKPOINTER=sqlite).
+    return graph.compile(checkpointer=checkpointer)
 
 
 # --- Initialisation ---
-app = create_graph()
+# The graph is compiled once per process, on first use, and shared by
+# every entry point (src/main.py for Studio, the FastAPI service, ...).
+_compiled = None
+_compiled_lock = threading.Lock()
+
+
+def get_graph():
+    """Retourne le graphe compilé partagé du process."""
+    global _compiled
+    if _compiled is None:
+        with _compiled_lock:
+            if _compiled is None:
+                _compiled = create_graph(checkpointer=get_checkpointer())
+    return _compiled
+
+
+def __getattr__(name):
+    # `from src.graph import app` keeps working without compiling at import.
+    if name == "app":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
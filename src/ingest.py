@@ -0,0 +1,198 @@
+# ingest.py
+"""Lecture en flux des tickets depuis un export JSON ou JSONL.
+
+`load_tickets` used to expect the whole `tickets` list in the input state,
+so an export such as `ticket.json` was parsed in one go, held in memory
+and copied through every state update. The readers below parse tickets
+one at a time and hand them out in fixed-size micro-batches:
+
+- JSONL files are scanned line by line over a memory map;
+- JSON arrays are decoded object by object from a small rolling buffer
+  (`json.JSONDecoder.raw_decode`), never materialising the whole array.
+
+Reading is bounded by the batch size and the read-ahead, not by the
+size of the export. `astream_batches` runs the reader in a thread and
+keeps at most `prefetch` batches ready, so categorisation of one batch
+overlaps with reading the next.
+
+Limit: this bounds parsing only. `process_ticket` keeps one compact
+record per ticket (`compact_ticket`) in `ticket_table`, which is graph
+state: the whole export ends up in memory and in every checkpoint, so
+state grows linearly with the number of tickets. What is saved is the
+raw input (no `json.load` of the file, no `tickets` list copied through
+the state), not the per-ticket records; very large exports should be
+split into several runs or jobs.
+
+Configuration (read by `src.nodes`):
+- TICKETS_PATH: export read when the input state carries no tickets
+- INGEST_BATCH_SIZE: tickets per micro-batch (default 64)
+- INGEST_PREFETCH: batches read ahead of categorisation (default 2)
+"""
+import os
+import json
+import mmap
+import asyncio
+import threading
+
+
+_READ_SIZE = 1 << 16
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_NUMBER_START = "-0123456789"
+
+
+def iter_jsonl(path):
+    """Un ticket par ligne non vide ; les lignes invalides sont signalées et ignorées."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for lineno, line in enumerate(iter(mm.readline, b""), 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    print(f"⚠️ Ligne {lineno} ignorée ({path}) : {e}")
+
+
+def iter_json_array(f, read_size=_READ_SIZE):
+    """Décode les éléments d'un tableau JSON au fil de la lecture de `f` (texte)."""
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+        # Drop what was already consumed before growing the buffer
+        buf, pos = buf[pos:] + chunk, 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip(_WHITESPACE)
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("expected a JSON array")
+    pos += 1
+    while True:
+        skip(_WHITESPACE + ",")
+        if pos >= len(buf):
+            raise ValueError("unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        while True:
+            try:
+                item, end = _DECODER.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A number cut by the end of the buffer may decode as a shorter
+            # one ("1.5" of "1.5e10"): it must be followed by a delimiter
+            cut = end == len(buf) or (buf[pos] in _NUMBER_START and buf[end] not in _WHITESPACE + ",]")
+            if cut and not eof:
+                fill()
+                continue
+            break
+        pos = end
+        yield item
+
+
+def _sniff_format(path):
+    with open(path, "rb") as f:
+        head = f.read(4096).lstrip(b"\xef\xbb\xbf" + _WHITESPACE.encode())
+    return "json" if head.startswith(b"[") else "jsonl"
+
+
+def iter_tickets(path):
+    """Tickets d'un fichier `.json` (tableau) ou `.jsonl`, lus en flux."""
+    if _sniff_format(path) == "json":
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for item in iter_json_array(f):
+                if isinstance(item, dict):
+                    yield item
+    else:
+        for item in iter_jsonl(path):
+            if isinstance(item, dict):
+                yield item
+
+
+def iter_batches(items, size):
+    """Regroupe un itérable en listes d'au plus `size` éléments."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_batch_size():
+    return max(1, int(os.getenv("INGEST_BATCH_SIZE", "64")))
+
+
+async def astream_batches(source, size=None, prefetch=None):
+    """Itère de façon asynchrone sur des micro-lots de tickets.
+
+    `source` is a file path or an in-memory list. File reading happens in
+    a background thread which stays at most `prefetch` batches ahead, so
+    the event loop is never blocked by parsing and memory stays bounded.
+    """
+    size = size or ingest_batch_size()
+    if not isinstance(source, (str, os.PathLike)):
+        for batch in iter_batches(source, size):
+            yield batch
+        return
+
+    prefetch = max(1, int(prefetch or os.getenv("INGEST_PREFETCH", "2")))
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.BoundedSemaphore(prefetch)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop closed: the consumer is gone
+            stop.set()
+
+    def reader():
+        try:
+            for batch in iter_batches(iter_tickets(source), size):
+                # Back-pressure: wait until the consumer took a batch
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                put(batch)
+            put(done)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=reader, name="ticket-ingest", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            slots.release()
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,321 @@
+# jobs.py
+"""Traitement asynchrone de lots de tickets pour le service FastAPI.
+
+The graph could only be driven from LangGraph Studio. `JobManager` runs
+the compiled graph (`src.graph.get_graph`) on batches submitted over HTTP:
+
+- `submit()` admits a job into a bounded queue and returns at once; when
+  the queue is full it raises `JobQueueFull` (the service answers 429), so
+  load is pushed back to the caller instead of piling up in memory;
+- a fixed pool of asyncio workers pulls jobs from the queue, so several
+  jobs run concurrently in the same event loop (one uvicorn process),
+  each with its own graph state;
+- every job records its progress as a list of events (one per graph node
+  update) that clients can poll or stream, and keeps a per-ticket summary
+  of the final state as its result.
+
+Finished and interrupted jobs are kept in memory, oldest evicted first.
+When the graph is compiled with a checkpointer (`src.checkpoint`), each
+job runs on its own checkpoint thread (the job id): a human-review
+`interrupt()` leaves the job "interrupted" with the pending interrupts
+(`{"id", "value"}`), and `resume()` queues it again with the reviewer's
+answer: one value for a single interrupt, or `{interrupt_id: value}`
+when several are pending at once (per-ticket mode). Nodes finished
+before the pause are not run again.
+
+Configuration:
+- JOBS_WORKERS: jobs processed concurrently (default 4)
+- JOBS_QUEUE_SIZE: jobs waiting for a worker before submit is refused (default 16)
+- JOBS_MAX_TICKETS: largest accepted batch (default 1000)
+- JOBS_KEEP: finished or interrupted jobs kept for status/result queries (default 200)
+- JOBS_TIMEOUT: per-job timeout in seconds, 0 = none (default 0)
+"""
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+
+
+QUEUED, RUNNING, INTERRUPTED, DONE, FAILED = "queued", "running", "interrupted", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    """La file d'admission est pleine ; le client doit réessayer plus tard."""
+
+
+class Job:
+    def __init__(self, tickets, thread_scope=None):
+        self.id = uuid.uuid4().hex
+        self.tickets = tickets
+        # The list is dropped once the job finishes; the count stays
+        self.ticket_count = len(tickets)
+        # Jobs with the same scope share thread classifications (src.threads)
+        self.thread_scope = thread_scope
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = None
+        self.interrupts = []
+        # `Command(resume=...)` carrying the reviewer's answer, once resumed
+        self.resume_command = None
+        self.events = []
+        # Set (and replaced) whenever an event is appended, so streaming
+        # clients wake up without polling.
+        self._changed = asyncio.Event()
+
+    def add_event(self, kind, **data):
+        self.events.append({"seq": len(self.events), "at": time.time(), "event": kind, **data})
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def settled(self):
+        """Nothing in progress: finished, or waiting for a review."""
+        return self.finished or self.status == INTERRUPTED
+
+    def describe(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "tickets": self.ticket_count,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_s": elapsed,
+            "events": len(self.events),
+            "interrupts": self.interrupts,
+            "error": self.error,
+        }
+
+
+def summarize_state(state):
+    """Résultat par ticket : record de `ticket_table` + réponses des branches."""
+    state = state or {}
+    per_field = {
+        "rag_answer": state.get("rag_answers") or {},
+        "sentiment": state.get("ticket_sentiments") or {},
+        "feedback_type": state.get("ticket_feedback_types") or {},
+    }
+    tickets = []
+    for tid, record in (state.get("ticket_table") or {}).items():
+        entry = dict(record)
+        for field, values in per_field.items():
+            if tid in values:
+                entry[field] = values[tid]
+        tickets.append(entry)
+    return {
+        "tickets": tickets,
+        "sent_ids": list(state.get("sent_ids") or []),
+        "product_sent_ids": list(state.get("product_sent_ids") or []),
+    }
+
+
+def _node_ids(update):
+    """Ticket ids a node update reports results for (for progress events)."""
+    ids = set()
+    for field in ("ticket_table", "rag_answers", "ticket_sentiments", "ticket_feedback_types"):
+        value = update.get(field)
+        if isinstance(value, dict):
+            ids.update(value)
+    for field in ("sent_ids", "product_sent_ids", "human_validated_ids"):
+        ids.update(update.get(field) or [])
+    return sorted(ids, key=str)
+
+
+class JobManager:
+    """Pool borné de workers asyncio exécutant le graphe, avec file d'admission."""
+
+    def __init__(self, workers=None, queue_size=None, max_tickets=None, keep=None, timeout=None, graph_factory=None):
+        self.workers = max(1, int(workers or os.getenv("JOBS_WORKERS", "4")))
+        self.queue_size = max(1, int(queue_size or os.getenv("JOBS_QUEUE_SIZE", "16")))
+        self.max_tickets = max(1, int(max_tickets or os.getenv("JOBS_MAX_TICKETS", "1000")))
+        self.keep = max(1, int(keep or os.getenv("JOBS_KEEP", "200")))
+        self.timeout = float(timeout if timeout is not None else os.getenv("JOBS_TIMEOUT", "0")) or None
+        # `graph_factory() -> compiled graph`; defaults to the shared graph
+        self._graph_factory = graph_factory
+        self._jobs = OrderedDict()
+        self._queue = None
+        self._tasks = []
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    # --- cycle de vie ---
+    def start(self):
+        """Démarre les workers sur la boucle courante (sans effet s'ils tournent)."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- soumission ---
+    def submit(self, tickets, thread_scope=None):
+        """Admet un lot de tickets ; lève `JobQueueFull` si la file est pleine."""
+        if not tickets:
+            raise ValueError("a job needs at least one ticket")
+        if len(tickets) > self.max_tickets:
+            raise ValueError(f"too many tickets in one job ({len(tickets)} > {self.max_tickets})")
+        self.start()
+        job = Job(list(tickets), thread_scope)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"{self._queue.qsize()} job(s) already waiting") from None
+        self._jobs[job.id] = job
+        job.add_event(QUEUED, position=self._queue.qsize())
+        self._evict()
+        return job
+
+    def resume(self, job_id, value=None, by_interrupt=None):
+        """Queue an interrupted job again with the reviewer's answer.
+
+        `value` answers the only pending interrupt; `by_interrupt` maps
+        interrupt ids to answers when several are pending. Interrupts left
+        unanswered pause the job again.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.status != INTERRUPTED:
+            raise ValueError(f"job {job_id} is not waiting for a review")
+        pending = {i["id"] for i in job.interrupts}
+        if by_interrupt:
+            unknown = set(by_interrupt) - pending
+            if unknown:
+                raise ValueError(f"unknown interrupt id(s): {', '.join(sorted(unknown))}")
+            resume = dict(by_interrupt)
+        elif len(pending) > 1:
+            raise ValueError(f"{len(pending)} interrupts pending: answer each by interrupt id")
+        else:
+            resume = value
+        from langgraph.types import Command
+
+        job.resume_command, job.interrupts = Command(resume=resume), []
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"{self._queue.qsize()} job(s) already waiting") from None
+        job.status = QUEUED
+        job.add_event(QUEUED, position=self._queue.qsize(), resumed=True)
+        return job
+
+    def _evict(self):
+        # Interrupted jobs count too: a review that never comes must not
+        # keep them forever
+        settled = [jid for jid, job in self._jobs.items() if job.settled]
+        for jid in settled[: max(0, len(settled) - self.keep)]:
+            del self._jobs[jid]
+
+    # --- exécution ---
+    async def _graph(self):
+        if self._graph_factory is not None:
+            return self._graph_factory()
+        from src.graph import get_graph
+
+        # The first call compiles the graph; keep that off the event loop
+        return await asyncio.to_thread(get_graph)
+
+    async def _run(self, job):
+        graph = await self._graph()
+        # One checkpoint thread per job; ignored when there is no checkpointer
+        config = {"configurable": {"thread_id": job.id}}
+        initial = {"tickets": job.tickets}
+        if job.thread_scope:
+            initial["thread_scope"] = job.thread_scope
+        payload, job.resume_command = job.resume_command or initial, None
+        final = None
+        async for mode, chunk in graph.astream(payload, config, stream_mode=["updates", "values"]):
+            if mode == "values":
+                final = chunk
+                continue
+            for node, update in chunk.items():
+                if node == "__interrupt__":
+                    job.interrupts.extend({"id": getattr(i, "id", None), "value": getattr(i, "value", i)}
+                                          for i in update)
+                    continue
+                ids = _node_ids(update) if isinstance(update, dict) else []
+                job.add_event("node", node=node, ticket_ids=ids)
+        return summarize_state(final)
+
+    async def _worker(self, index):
+        while True:
+            job = await self._queue.get()
+            self._running += 1
+            job.status, job.started_at = RUNNING, time.time()
+            job.add_event(RUNNING, worker=index)
+            try:
+                job.result = await asyncio.wait_for(self._run(job), self.timeout)
+                if job.interrupts:
+                    job.status = INTERRUPTED
+                else:
+                    job.status = DONE
+                    self._completed += 1
+            except asyncio.CancelledError:
+                job.status, job.error = FAILED, "cancelled"
+                raise
+            except asyncio.TimeoutError:
+                job.status, job.error = FAILED, f"timed out after {self.timeout:g}s"
+                self._failed += 1
+            except Exception as e:
+                job.status, job.error = FAILED, repr(e)
+                self._failed += 1
+                print(f"❌ Job {job.id} en échec : {e!r}")
+            finally:
+                job.finished_at = time.time()
+                if job.finished:
+                    job.tickets = []
+                job.add_event(job.status, error=job.error)
+                self._running -= 1
+                self._queue.task_done()
+                self._evict()
+
+    # --- suivi ---
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    async def stream_events(self, job, since=0):
+        """Yield the job's events from `since` on, until it finishes."""
+        while True:
+            changed = job._changed
+            while since < len(job.events):
+                yield job.events[since]
+                since += 1
+            if job.settled:
+                return
+            await changed.wait()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "completed": self._completed,
+            "failed": self._failed,
+            "kept": len(self._jobs),
+        }
+
+
+_manager = None
+
+
+def get_job_manager() -> JobManager:
+    """Gestionnaire de jobs partagé du process (workers démarrés au premier submit)."""
+    global _manager
+    if _manager is None:
+        _manager = JobManager()
+    return _manager
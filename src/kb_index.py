@@ -0,0 +1,261 @@
+# kb_index.py
+"""Indexation incrémentale de la base de connaissances, rechargée à chaud.
+
+The KB used to be one file (`agentia.txt`), read and indexed once per
+process: an edit meant restarting every worker, and any index was rebuilt
+from scratch. `KnowledgeBaseIndexer` keeps the KB up to date instead:
+
+- KB_PATH may be a file or a directory of `.txt` / `.md` files;
+- a file whose (mtime, size) did not change is not re-read; a changed file
+  is re-chunked (`src.retrieval.chunk_text`) and each chunk gets a stable
+  id, the hash of its file name and text. Chunk boundaries are decided by
+  paragraph content, not position, so an edit changes the id of the chunk
+  it touches and at most of the next ones up to a boundary, not of every
+  later chunk of the section (about 1.3 chunks re-embedded per edited
+  section in `benchmarks/bench_kb_index.py`);
+- chunks are diffed by id against the live index: only added chunks are
+  tokenized for BM25 (term counts of the others are reused) and, when the
+  vector retriever is on (RAG_HYBRID), only added chunks are embedded into
+  the vector store and removed ones deleted from it. The ids already in
+  the vector store are kept in a manifest, so a restart re-embeds nothing;
+- every build produces a new `KnowledgeBaseRetriever` that replaces the
+  live one in a single assignment. A query keeps the snapshot it started
+  with, so a reload never changes the index under it; new vectors are
+  added before the swap and stale ones deleted after it.
+
+`refresh()` runs on first use, then every KB_RELOAD_SECONDS in a
+background thread, or on `POST /kb/reload`. `benchmarks/bench_kb_index.py`
+compares a 1% edit with a full rebuild.
+
+Configuration:
+- KB_PATH: KB file or directory (default "agentia.txt")
+- KB_RELOAD_SECONDS: interval between change checks, 0 = no watcher (default 0)
+- KB_MANIFEST_PATH: chunk ids present in the vector store (default "db/kb_manifest.json")
+- RAG_CHUNK_SIZE, RAG_TOP_K, RAG_HYBRID: see `src.retrieval`
+"""
+import os
+import json
+import time
+import threading
+from collections import Counter
+
+from src.cache import content_hash
+from src.retrieval import KnowledgeBaseRetriever, chunk_text
+
+KB_EXTENSIONS = (".txt", ".md")
+# Between files in the "full" context (RAG_CONTEXT_MODE=full)
+_FILE_SEPARATOR = "\n\n---\n\n"
+
+
+def kb_sources(path):
+    """`{name: path}` of the KB files, sorted by name (relative to a directory)."""
+    if not os.path.isdir(path):
+        return {os.path.basename(path): path}
+    found = {}
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.endswith(KB_EXTENSIONS) and not name.startswith("."):
+                full = os.path.join(root, name)
+                found[os.path.relpath(full, path).replace(os.sep, "/")] = full
+    return dict(sorted(found.items()))
+
+
+def chunk_ids(source, chunks):
+    """Ids stables des passages : hash du fichier et du texte (+ rang des doublons)."""
+    seen = Counter()
+    ids = []
+    for chunk in chunks:
+        ids.append(content_hash("kb-chunk", source, chunk, str(seen[chunk])))
+        seen[chunk] += 1
+    return ids
+
+
+def _signature(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class KnowledgeBaseIndexer:
+    """Construit et remplace à chaud l'index de la base de connaissances."""
+
+    def __init__(self, path, vector_retriever=None, vectorstore=None, chunk_size=800, k=4, manifest_path=None):
+        self.path = path
+        self.vector_retriever = vector_retriever
+        self.vectorstore = vectorstore
+        self.chunk_size = chunk_size
+        self.k = k
+        self.manifest_path = manifest_path or os.getenv("KB_MANIFEST_PATH", "db/kb_manifest.json")
+        self.version = 0
+        self.last_refresh = None
+        # Live snapshot; replaced, never mutated
+        self._current = None
+        self._ids = []
+        # name -> {"signature", "hash", "text", "chunks", "ids"} of the live snapshot
+        self._files = {}
+        self._lock = threading.Lock()
+        self._stop = None
+
+    @property
+    def current(self) -> KnowledgeBaseRetriever:
+        """Index en service (construit au premier appel)."""
+        if self._current is None:
+            self.refresh()
+        return self._current
+
+    # --- construction ---
+    def _read_sources(self, force):
+        """Per-file state, re-reading only files whose signature changed."""
+        files, changed = {}, []
+        for name, full in kb_sources(self.path).items():
+            signature = _signature(full)
+            previous = self._files.get(name)
+            if not force and previous is not None and previous["signature"] == signature:
+                files[name] = previous
+                continue
+            with open(full, "r", encoding="utf-8") as f:
+                text = f.read()
+            digest = content_hash(text)
+            if previous is not None and previous["hash"] == digest:
+                # Touched but identical
+                files[name] = dict(previous, signature=signature)
+                continue
+            chunks = chunk_text(text, self.chunk_size)
+            files[name] = {"signature": signature, "hash": digest, "text": text,
+                           "chunks": chunks, "ids": chunk_ids(name, chunks)}
+            changed.append(name)
+        return files, changed
+
+    def refresh(self, force=False):
+        """Apply the changes of the KB sources; returns a summary of the build.
+
+        Concurrent calls wait for the running build. `force` re-reads every
+        file, even those whose (mtime, size) did not change.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            files, changed = self._read_sources(force)
+            removed_files = [name for name in self._files if name not in files]
+            if self._current is not None and not changed and not removed_files:
+                self._files = files
+                return {"changed": False, "version": self.version}
+
+            ids, chunks, sources = [], [], []
+            for name, state in files.items():
+                ids.extend(state["ids"])
+                chunks.extend(state["chunks"])
+                sources.extend([name] * len(state["ids"]))
+            previous = dict(zip(self._ids, self._current.index.counts)) if self._current is not None else {}
+            counts = [previous.get(i) for i in ids]
+            retriever = KnowledgeBaseRetriever(
+                _FILE_SEPARATOR.join(state["text"] for state in files.values()),
+                vector_retriever=self.vector_retriever,
+                k=self.k,
+                chunks=chunks,
+                counts=counts,
+            )
+            kept = set(ids)
+            summary = {
+                "changed": True,
+                "files_changed": len(changed),
+                "files_removed": len(removed_files),
+                "chunks": len(ids),
+                "chunks_added": sum(c is None for c in counts),
+                "chunks_removed": sum(i not in kept for i in self._ids),
+            }
+            stale = self._add_vectors(ids, chunks, sources, summary)
+
+            self._current, self._ids, self._files = retriever, ids, files
+            self.version += 1
+            self._delete_vectors(stale, summary)
+            summary["version"] = self.version
+            summary["seconds"] = round(time.perf_counter() - started, 4)
+            self.last_refresh = summary
+            print(f"📚 Base de connaissances v{self.version} : {summary['chunks']} passages, "
+                  f"+{summary['chunks_added']} / -{summary['chunks_removed']} ({summary['seconds']:.3f}s)")
+            return summary
+
+    # --- base vectorielle ---
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("chunks", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, synced):
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"chunks": synced}, f)
+        os.replace(tmp, self.manifest_path)
+
+    def _add_vectors(self, ids, chunks, sources, summary):
+        """Embed the chunks missing from the vector store; returns ids to delete."""
+        if self.vectorstore is None:
+            return []
+        synced = self._load_manifest()
+        new = [(i, c, s) for i, c, s in zip(ids, chunks, sources) if i not in synced]
+        summary["vectors_added"] = 0
+        if new:
+            try:
+                self.vectorstore.add_texts(
+                    [c for _, c, _ in new],
+                    metadatas=[{"source": s, "chunk_id": i} for i, _, s in new],
+                    ids=[i for i, _, _ in new],
+                )
+            except Exception as e:
+                print(f"⚠️ Indexation vectorielle de {len(new)} passages échouée : {e}")
+                return []
+            synced.update((i, s) for i, _, s in new)
+            self._save_manifest(synced)
+            summary["vectors_added"] = len(new)
+        kept = set(ids)
+        return [i for i in synced if i not in kept]
+
+    def _delete_vectors(self, stale, summary):
+        if self.vectorstore is None:
+            return
+        summary["vectors_removed"] = 0
+        if not stale:
+            return
+        try:
+            self.vectorstore.delete(ids=stale)
+        except Exception as e:
+            print(f"⚠️ Suppression de {len(stale)} vecteurs périmés échouée : {e}")
+            return
+        synced = self._load_manifest()
+        for i in stale:
+            synced.pop(i, None)
+        self._save_manifest(synced)
+        summary["vectors_removed"] = len(stale)
+
+    # --- rechargement ---
+    def start_watcher(self, interval):
+        """Check the sources every `interval` seconds in a daemon thread."""
+        if interval <= 0 or self._stop is not None:
+            return
+        self._stop = threading.Event()
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"⚠️ Rechargement de la base de connaissances échoué : {e}")
+
+        threading.Thread(target=watch, name="kb-watcher", daemon=True).start()
+
+    def stop_watcher(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "version": self.version,
+            "files": len(self._files),
+            "chunks": len(self._ids),
+            "last_refresh": self.last_refresh,
+        }
@@ -0,0 +1,264 @@
+# llm.py
+"""Registre partagé des clients LLM.
+
+Building a `ChatGoogleGenerativeAI` is not free: it resolves credentials,
+creates the transport (gRPC channel or HTTP session) and opens fresh
+TCP/TLS connections on first use. Agents used to build one client per call
+(`categorize_ticket`) or per agent instance. `get_llm()` returns one client
+per `(model, settings)` key for the whole process, so every caller shares
+the same transport and its keep-alive connections.
+
+Clients are closed by `close_all()`, which is registered with `atexit`.
+Async transports (`async_client_running`) close with a coroutine that
+only a running event loop can await: application shutdown hooks call
+`aclose_all()` instead, which awaits them.
+
+`ainvoke()` is the async call path every node goes through. It awaits the
+client's native `ainvoke` instead of pushing blocking `.invoke` calls onto
+the default thread executor (capped at min(32, cpu+4) workers and shared
+by every graph run in the process). Every call goes through the model's
+`AdaptiveRateLimiter` (`src.ratelimit`), which bounds concurrency, backs
+off on 429s and retries without blocking the event loop; the clients' own
+sleeping retries are reduced accordingly (LLM_CLIENT_MAX_RETRIES).
+
+Configuration:
+- GEMINI_TRANSPORT: optional transport passed to new clients
+  ("grpc", "rest", ...). Both keep their connections open between calls.
+- LLM_CALL_TIMEOUT: per-call timeout in seconds (default 60)
+- LLM_MAX_ATTEMPTS: attempts per call when throttled (default 5)
+- LLM_CLIENT_MAX_RETRIES: retries left to the langchain client itself (default 1)
+- rate and concurrency budgets: see `src.ratelimit`
+"""
+import os
+import time
+import atexit
+import asyncio
+import threading
+
+from src.metrics import record_llm_call
+from src.ratelimit import get_rate_limiter, is_throttle_error
+
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+_lock = threading.Lock()
+_client_factory = None
+_clients = {}
+_embeddings = {}
+_stats = {
+    "clients_created": 0,
+    "client_reuses": 0,
+    "clients_closed": 0,
+}
+
+
+def _registry_key(model, settings):
+    return (model, tuple(sorted((k, repr(v)) for k, v in settings.items())))
+
+
+def _client_settings(settings):
+    settings = dict(settings)
+    transport = os.getenv("GEMINI_TRANSPORT")
+    if transport and "transport" not in settings:
+        settings["transport"] = transport
+    return settings
+
+
+def set_client_factory(factory):
+    """Replace how chat clients are built (e.g. a local fake in benchmarks).
+
+    `factory(model, **settings)` must return an object with `invoke` and
+    `ainvoke`. Passing None restores `ChatGoogleGenerativeAI`. Cached chat
+    clients are closed and dropped so the next `get_llm()` uses the new
+    factory.
+    """
+    global _client_factory
+    with _lock:
+        _client_factory = factory
+        clients = list(_clients.values())
+        _clients.clear()
+        for client in clients:
+            _discard(_close_client(client))
+            _stats["clients_closed"] += 1
+
+
+def get_llm(model=DEFAULT_MODEL, **settings):
+    """Retourne le client chat partagé pour `model` et `settings`.
+
+    `settings` are forwarded to `ChatGoogleGenerativeAI` (temperature, ...)
+    and are part of the registry key, so callers asking for the same model
+    with the same settings get the very same client object.
+    """
+    settings = _client_settings(settings)
+    # Throttling is handled by `ainvoke`/`invoke`; the client's own retries
+    # sleep inside the call, so keep them to a minimum.
+    settings.setdefault("max_retries", int(os.getenv("LLM_CLIENT_MAX_RETRIES", "1")))
+    key = _registry_key(model, settings)
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _stats["client_reuses"] += 1
+            return client
+
+        if _client_factory is not None:
+            client = _client_factory(model, **settings)
+        else:
+            # Imported lazily so modules using the registry stay cheap to import.
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            client = ChatGoogleGenerativeAI(model=model, **settings)
+        _clients[key] = client
+        _stats["clients_created"] += 1
+        return client
+
+
+def get_embeddings(model="models/text-embedding-004", **settings):
+    """Retourne le client d'embeddings partagé pour `model` et `settings`."""
+    settings = _client_settings(settings)
+    key = _registry_key(model, settings)
+    with _lock:
+        client = _embeddings.get(key)
+        if client is not None:
+            _stats["client_reuses"] += 1
+            return client
+
+        from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+
+        client = GoogleGenerativeAIEmbeddings(model=model, **settings)
+        _embeddings[key] = client
+        _stats["clients_created"] += 1
+        return client
+
+
+def _close_client(client):
+    """Best-effort close of the transports held by a langchain client.
+
+    Returns the coroutines of async transports, still to be awaited.
+    """
+    pending = []
+    for attr in ("client", "async_client_running"):
+        inner = getattr(client, attr, None)
+        if inner is None:
+            continue
+        transport = getattr(inner, "transport", None)
+        close = getattr(transport, "close", None) or getattr(inner, "close", None)
+        if close is None:
+            continue
+        try:
+            result = close()
+            if asyncio.iscoroutine(result):
+                pending.append(result)
+        except Exception:
+            pass
+    return pending
+
+
+def _discard(pending):
+    # No loop to await them on (atexit, sync callers): close the coroutines
+    # so Python doesn't warn about them never being awaited.
+    for coro in pending:
+        coro.close()
+
+
+def _take_all():
+    with _lock:
+        clients = list(_clients.values()) + list(_embeddings.values())
+        _clients.clear()
+        _embeddings.clear()
+        _stats["clients_closed"] += len(clients)
+    return clients
+
+
+def close_all():
+    """Ferme tous les clients du registre (appelé à l'arrêt du process)."""
+    for client in _take_all():
+        _discard(_close_client(client))
+
+
+async def aclose_all():
+    """Ferme tous les clients du registre en attendant leurs transports async."""
+    for client in _take_all():
+        for coro in _close_client(client):
+            try:
+                await coro
+            except Exception:
+                pass
+
+
+def registry_stats():
+    """Compteurs du registre : clients créés, fermés, vivants et réutilisés.
+
+    These count client objects, not sockets: each client owns a transport
+    whose connection pool is managed by the underlying library. A steady
+    `clients_alive` while `client_reuses` grows under load confirms that
+    callers share clients, and therefore their keep-alive connections.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["clients_alive"] = len(_clients) + len(_embeddings)
+    return stats
+
+
+atexit.register(close_all)
+
+
+# --------------------------
+# Appels bornés et adaptatifs
+# --------------------------
+def _limiter_for(llm):
+    model = getattr(llm, "model", None) or DEFAULT_MODEL
+    return get_rate_limiter(model)
+
+
+def _max_attempts():
+    return max(1, int(os.getenv("LLM_MAX_ATTEMPTS", "5")))
+
+
+def _outcome(exc):
+    if isinstance(exc, asyncio.TimeoutError):
+        return "timeout"
+    return "throttled" if is_throttle_error(exc) else "error"
+
+
+async def ainvoke(llm, prompt, timeout=None, agent="other"):
+    """Appelle `llm.ainvoke(prompt)` sous le limiteur adaptatif du modèle.
+
+    Throttled calls (429) shrink the model's concurrency limit, pause every
+    caller until the retry-after hint expires and are retried up to
+    LLM_MAX_ATTEMPTS times. Raises `asyncio.TimeoutError` when a call
+    exceeds `timeout` seconds (LLM_CALL_TIMEOUT by default). Count, latency
+    and token usage are recorded under `agent` (see `src.metrics`).
+    """
+    if timeout is None:
+        timeout = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+    limiter = _limiter_for(llm)
+    attempts = _max_attempts()
+    started = time.perf_counter()
+    for attempt in range(attempts):
+        try:
+            async with limiter.slot():
+                response = await asyncio.wait_for(llm.ainvoke(prompt), timeout)
+            record_llm_call(agent, time.perf_counter() - started, response=response)
+            return response
+        except Exception as e:
+            if not is_throttle_error(e) or attempt + 1 >= attempts:
+                record_llm_call(agent, time.perf_counter() - started, _outcome(e))
+                raise
+            # The limiter already paused new acquisitions; loop back and wait.
+
+
+def invoke(llm, prompt, agent="other"):
+    """Équivalent synchrone de `ainvoke` pour les appelants hors event loop."""
+    limiter = _limiter_for(llm)
+    attempts = _max_attempts()
+    started = time.perf_counter()
+    for attempt in range(attempts):
+        try:
+            with limiter.slot_sync():
+                response = llm.invoke(prompt)
+            record_llm_call(agent, time.perf_counter() - started, response=response)
+            return response
+        except Exception as e:
+            if not is_throttle_error(e) or attempt + 1 >= attempts:
+                record_llm_call(agent, time.perf_counter() - started, _outcome(e))
+                raise
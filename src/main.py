@@ -1,5 +1,5 @@
 # main.py
-from src.graph import create_graph
+from src.graph import get_graph
 
 # ✅ le Studio cherche une variable nommée "graph"
-graph = create_graph()
+graph = get_graph()
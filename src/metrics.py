@@ -0,0 +1,141 @@
+# metrics.py
+"""Métriques Prometheus du pipeline (exposées par `/metrics` du service).
+
+Nodes only printed status lines, so latency, LLM usage and delivery
+failures could not be measured. This module owns every metric and offers
+small `record_*` helpers that the graph, `src.llm`, the sentiment agent
+and the SMTP pool call at the points that matter:
+
+- `graph_node_duration_seconds{node}`: wall time of each graph node
+  (nodes are wrapped by `instrument_node` in `src.graph`);
+- `llm_calls_total{agent,outcome}` / `llm_call_duration_seconds{agent}`
+  and `llm_tokens_total{agent,kind}` when the answer carries
+  `usage_metadata`;
+- `smtp_send_duration_seconds` and `smtp_send_failures_total`;
+- `sentiment_backend_total{backend}`: labels produced by the HF pipeline,
+  the LLM fallback or the keyword heuristic;
+- `tickets_routed_total{category}` out of `route_ticket`;
+- `embedding_lookups_total{outcome}`: texts found in (hit) or missing
+  from (miss) the embedding cache of `src.embeddings`;
+- `queue_depth{queue}`: job queue and email outbox, refreshed on scrape.
+
+Every helper is a dictionary lookup plus a lock-protected increment in
+`prometheus_client`, a few microseconds per call, so the instrumentation
+stays on in production. When `prometheus_client` is not installed, or
+METRICS_ENABLED is "false", the helpers do nothing.
+
+Configuration:
+- METRICS_ENABLED: "false" to disable collection and `/metrics` (default true)
+"""
+import os
+import time
+import functools
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+except ImportError:  # optional dependency
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+    Counter = Gauge = Histogram = generate_latest = None
+
+
+ENABLED = Counter is not None and os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Node and LLM latencies go from milliseconds (cache hits) to a minute
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class _NoopMetric:
+    """Stand-in used when metrics are disabled."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _metric(kind, name, doc, labels=(), **kwargs):
+    if not ENABLED:
+        return _NoopMetric()
+    return kind(name, doc, labels, **kwargs)
+
+
+NODE_DURATION = _metric(Histogram, "graph_node_duration_seconds", "Graph node execution time", ("node",), buckets=_LATENCY_BUCKETS)
+LLM_CALLS = _metric(Counter, "llm_calls_total", "LLM calls by agent and outcome", ("agent", "outcome"))
+LLM_DURATION = _metric(Histogram, "llm_call_duration_seconds", "LLM call latency, retries included", ("agent",), buckets=_LATENCY_BUCKETS)
+LLM_TOKENS = _metric(Counter, "llm_tokens_total", "LLM tokens reported by the API", ("agent", "kind"))
+SMTP_DURATION = _metric(Histogram, "smtp_send_duration_seconds", "Time to send one message on an SMTP session", buckets=_LATENCY_BUCKETS)
+SMTP_FAILURES = _metric(Counter, "smtp_send_failures_total", "Messages the SMTP pool failed to send")
+SENTIMENT_BACKEND = _metric(Counter, "sentiment_backend_total", "Sentiment labels by backend", ("backend",))
+TICKETS_ROUTED = _metric(Counter, "tickets_routed_total", "Tickets routed, by category", ("category",))
+EMBEDDING_LOOKUPS = _metric(Counter, "embedding_lookups_total", "Embedding cache lookups by outcome", ("outcome",))
+QUEUE_DEPTH = _metric(Gauge, "queue_depth", "Items waiting in a queue", ("queue",))
+
+
+def instrument_node(name, fn):
+    """Enveloppe un nœud async pour mesurer sa durée sous le label `name`."""
+    if not ENABLED:
+        return fn
+    histogram = NODE_DURATION.labels(name)
+
+    @functools.wraps(fn)
+    async def node(state):
+        started = time.perf_counter()
+        try:
+            return await fn(state)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return node
+
+
+def record_llm_call(agent, seconds, outcome="ok", response=None):
+    LLM_CALLS.labels(agent, outcome).inc()
+    LLM_DURATION.labels(agent).observe(seconds)
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict):
+        for kind in ("input_tokens", "output_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.labels(agent, kind.split("_")[0]).inc(usage[kind])
+
+
+def record_smtp_send(seconds):
+    SMTP_DURATION.observe(seconds)
+
+
+def record_smtp_failure(n=1):
+    SMTP_FAILURES.inc(n)
+
+
+def record_sentiment(backend, n=1):
+    if n:
+        SENTIMENT_BACKEND.labels(backend).inc(n)
+
+
+def record_routed(category, n=1):
+    if n:
+        TICKETS_ROUTED.labels(category or "unknown").inc(n)
+
+
+def record_embedding_lookups(hits, misses):
+    if hits:
+        EMBEDDING_LOOKUPS.labels("hit").inc(hits)
+    if misses:
+        EMBEDDING_LOOKUPS.labels("miss").inc(misses)
+
+
+def set_queue_depth(queue, depth):
+    QUEUE_DEPTH.labels(queue).set(depth)
+
+
+def render():
+    """Retourne `(corps, content_type)` au format texte Prometheus."""
+    if not ENABLED:
+        return b"", CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,28 +1,86 @@
 import os
+import time
 import asyncio
 import json
+import uuid
 # email/smtp handled by tools.gmail_tool
 from langchain_core.messages import HumanMessage
-from langgraph.types import interrupt, Command
-from src.agents import categorize_ticket, TicketRAGAgent, FeedbackSentimentAgent
-from src.state import GraphState
+from langgraph.types import interrupt, Command, Send
+from langgraph.config import get_config
+from langgraph.errors import GraphInterrupt
+from src.agents import get_rag_agent, get_sentiment_agent, lazy_singleton
+from src.analysis import MultiTaskAnalyzer, analysis_mode
+from src.cache import content_hash, get_result_cache
+from src.categorizer import CategorizationEngine
+from src.ingest import astream_batches
+from src.llm import DEFAULT_MODEL, ainvoke
+from src.metrics import record_routed
+from src.kb_index import KnowledgeBaseIndexer
+from src.retrieval import KnowledgeBaseRetriever
+from src.review import get_review_queue, review_mode
+from src.state import GraphState, TicketTask, compact_ticket
+from src.threads import ThreadGrouper, remember_thread_sentiments, threads_enabled
 from src.prompts import GENERATE_RAG_ANSWER_PROMPT
-from tool.toolgmail import send_email
+from tool.outbox import get_outbox
+from tool.toolgmail import send_many
 
-# --- Charger la base de connaissances ---
-with open("agentia.txt", "r", encoding="utf-8") as f:
-    AGENTIA_CONTENT = f.read()
+categorization_engine = CategorizationEngine()
 
-rag_agent = TicketRAGAgent()
-sentiment_agent = FeedbackSentimentAgent()
+# Retrieval over KB chunks; RAG_CONTEXT_MODE=full restores the previous
+# "whole knowledge base in every prompt" behaviour for comparison.
+RAG_CONTEXT_MODE = os.getenv("RAG_CONTEXT_MODE", "retrieval").lower()
+
+
+def _build_kb_indexer():
+    # --- Charger et indexer la base de connaissances (fichier ou dossier) ---
+    hybrid = os.getenv("RAG_HYBRID", "false").lower() in ("1", "true", "yes")
+    rag_agent = get_rag_agent() if hybrid else None
+    indexer = KnowledgeBaseIndexer(
+        os.getenv("KB_PATH", "agentia.txt"),
+        vector_retriever=rag_agent.retriever if rag_agent else None,
+        vectorstore=rag_agent.vectorstore if rag_agent else None,
+        chunk_size=int(os.getenv("RAG_CHUNK_SIZE", "800")),
+        k=int(os.getenv("RAG_TOP_K", "4")),
+    )
+    indexer.refresh()
+    indexer.start_watcher(float(os.getenv("KB_RELOAD_SECONDS", "0")))
+    return indexer
+
+
+def get_kb_indexer() -> KnowledgeBaseIndexer:
+    """Indexeur de la base de connaissances, construit au premier usage."""
+    return lazy_singleton("kb_indexer", _build_kb_indexer)
+
+
+def get_kb_retriever() -> KnowledgeBaseRetriever:
+    """Index en service de la base de connaissances.
+
+    Reloads replace it rather than modify it: callers keep the snapshot
+    they got for the whole query.
+    """
+    return get_kb_indexer().current
+
+
+def _checkpointed():
+    """True when the run has a checkpointer, i.e. an interrupt can be resumed."""
+    try:
+        return get_config().get("configurable", {}).get("__pregel_checkpointer") is not None
+    except RuntimeError:  # outside a graph run
+        return False
 
 
 # Helper to call interrupt() robustly. Some runtimes raise an exception
 # that contains an Interrupt object; this helper will try to extract a
 # usable resume payload from exception args so nodes can continue in dev.
+# With a checkpointer (`src.checkpoint`) the interrupt really pauses the
+# run: it is left to propagate and the run resumes with `Command(resume=...)`.
 def _call_interrupt(payload):
     try:
         return interrupt(payload)
+    except GraphInterrupt:
+        if _checkpointed():
+            raise
+        return payload
     except Exception as e:
         for a in getattr(e, "args", ()):  # iterate possible payloads
             if isinstance(a, dict) or isinstance(a, str):
@@ -39,13 +97,56 @@ def _call_interrupt(payload):
 # --------------------------
 # 1️⃣ Charger les tickets
 # --------------------------
+def _ticket_source(state):
+    """Liste `tickets` de l'état, sinon chemin d'un export JSON/JSONL lu en flux."""
+    if state.get("tickets"):
+        return state["tickets"]
+    return state.get("tickets_path") or os.getenv("TICKETS_PATH") or []
+
+
+def _tickets_for(state, ids_key):
+    """Records of the ids listed under `ids_key` (O(1) lookups in ticket_table)."""
+    table = state.get("ticket_table", {})
+    return [table[tid] for tid in state.get(ids_key, []) if tid in table]
+
+
+def _run_id(state):
+    """Identité de l'exécution : celle de l'état, sinon le thread du checkpointer (id du job)."""
+    if state.get("run_id"):
+        return state["run_id"]
+    try:
+        thread = get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:  # outside a graph run
+        thread = None
+    return str(thread) if thread else uuid.uuid4().hex
+
+
+def _thread_scope(state, source, run_id):
+    """Runs sharing this scope reuse each other's thread classifications (src.threads)."""
+    scope = state.get("thread_scope") or os.getenv("THREAD_SCOPE")
+    if scope:
+        return scope
+    if isinstance(source, str):
+        return f"export:{os.path.abspath(source)}"
+    return f"run:{run_id}"
+
+
 async def load_tickets(state: GraphState) -> GraphState:
     print("📥 Chargement des tickets...")
+    source = _ticket_source(state)
+    if isinstance(source, str):
+        # Only the path travels in the state; tickets are streamed by process_ticket
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"tickets export not found: {source}")
+        print(f"📂 Lecture en flux depuis {source}")
+    run_id = _run_id(state)
     return {
-        "categorized_tickets": [],
-        "information_search_tickets": [],
-        "sentiment_tickets": [],
-        "product_complaint_tickets": [],
+        "run_id": run_id,
+        "thread_scope": _thread_scope(state, source, run_id),
+        "categorized_ids": [],
+        "information_search_ids": [],
+        "sentiment_ids": [],
+        "product_complaint_ids": [],
         "rag_queries": {},
         "rag_answers": {},
     }
@@ -56,20 +157,76 @@ async def load_tickets(state: GraphState) -> GraphState:
 # --------------------------
 async def process_ticket(state: GraphState) -> GraphState:
     print("🔄 Début de la catégorisation des tickets...")
-    categorized_tickets = []
-    tickets = state.get("tickets", [])
-    for ticket in tickets:
-        try:
-            # categorize_ticket may call an LLM synchronously; run it in a thread
-            category = (await asyncio.to_thread(categorize_ticket, ticket)).strip().lower()
-            new_ticket = dict(ticket)
-            new_ticket["category"] = category
-            categorized_tickets.append(new_ticket)
-            print(f"✅ Ticket {ticket.get('id', '?')} catégorisé comme : {category}")
-        except Exception as e:
-            print(f"❌ Erreur ticket {ticket.get('id', '?')}: {e}")
-    # Return only the categorized tickets; routing is handled by a dedicated node.
-    return {"categorized_tickets": categorized_tickets}
+    table = {}
+    categorized_ids = []
+    position = 0
+    # Tickets arrive in micro-batches (INGEST_BATCH_SIZE); when reading an
+    # export, the next batch is parsed while this one is being categorized.
+    # Within a batch, calls run concurrently (CATEGORIZATION_CONCURRENCY) and
+    # may be packed into batch requests (CATEGORIZATION_BATCH_SIZE); results
+    # come back aligned with the input order.
+    # Thread grouping (src.threads) drops internal replies, merges a
+    # thread's customer messages into one record and reuses the category
+    # of threads classified before.
+    grouper = ThreadGrouper(scope=state.get("thread_scope")) if threads_enabled() else None
+    # ANALYSIS_MODE=combined (src.analysis): one request returns category,
+    # sentiment and RAG queries; tickets it could not analyze are
+    # categorized the usual way.
+    analyzer = MultiTaskAnalyzer() if analysis_mode() == "combined" else None
+    async for tickets in astream_batches(_ticket_source(state)):
+        records = []
+        for ticket in tickets:
+            position += 1
+            record = compact_ticket(ticket)
+            record.setdefault("id", position)
+            records.append(record)
+        reused = []
+        if grouper is not None:
+            # Thread memory lives in the SQLite result cache: off the loop
+            records, reused = await asyncio.to_thread(lambda: grouper.plan(grouper.add(records)))
+        classified = []
+        if analyzer is not None:
+            remaining = []
+            for record, analysis in zip(records, await analyzer.analyze(records)):
+                if analysis is None:
+                    remaining.append(record)
+                    continue
+                record.update(category=analysis["category"], sentiment=analysis["sentiment"])
+                if analysis["queries"]:
+                    record["rag_queries"] = analysis["queries"]
+                classified.append(record)
+                print(f"✅ Ticket {record['id']} analysé : {analysis['category']}, {analysis['sentiment']}")
+            records = remaining
+        categories = await categorization_engine.categorize(records)
+        for record, category in zip(records, categories):
+            if category is None:
+                continue
+            record["category"] = category
+            classified.append(record)
+            print(f"✅ Ticket {record['id']} catégorisé comme : {category}")
+        for record in reused:
+            print(f"♻️ Ticket {record['id']} : catégorie du fil {record['thread_id']} reprise ({record['category']})")
+        for record in classified + reused:
+            # A thread completed by a later batch is already in the table
+            if record["id"] not in table:
+                categorized_ids.append(record["id"])
+            table[record["id"]] = record
+        if grouper is not None:
+            await asyncio.to_thread(grouper.remember, classified + reused)
+    if grouper is not None:
+        st = grouper.stats
+        print(f"🧵 Fils : {st['internal']} message(s) interne(s) ignoré(s), {st['merged']} fusionné(s), "
+              f"{st['reused']} catégorie(s) reprise(s), {st['reclassified']} recatégorisé(s)")
+    cache = get_result_cache()
+    if cache is not None:
+        st = cache.stats("category")
+        print(f"📦 Cache catégories : {st['hits']} hits / {st['misses']} misses")
+    # One compact record per ticket, keyed by id; routing is handled by a
+    # dedicated node. The raw input list is dropped from the state so it is
+    # not serialized into every later checkpoint. The table itself holds
+    # every ticket of the export: state and checkpoints grow with its size
+    # (see src.ingest).
+    return {"ticket_table": table, "categorized_ids": categorized_ids, "tickets": []}
 
 
 # --------------------------
@@ -78,17 +235,18 @@ async def process_ticket(state: GraphState) -> GraphState:
 async def filter_information_search(state: GraphState) -> GraphState:
     # Read the list produced by the router so only tickets routed to the
     # information-search branch are processed here.
-    info_tickets = state.get("information_search_tickets", [])
-    print(f"🔎 {len(info_tickets)} tickets d'information retenus.")
-    return {"information_search_tickets": info_tickets}
+    info_ids = state.get("information_search_ids", [])
+    print(f"🔎 {len(info_ids)} tickets d'information retenus.")
+    return {"information_search_ids": info_ids}
 
 
 # --------------------------
 # 4️⃣ Construire requêtes RAG
 # --------------------------
 async def construct_rag_queries(state: GraphState) -> GraphState:
-    info_tickets = state.get("information_search_tickets", [])
-    rag_queries = {t["id"]: [t["body"]] for t in info_tickets}
+    info_tickets = _tickets_for(state, "information_search_ids")
+    # Queries from the combined analysis when there are some, else the body
+    rag_queries = {t["id"]: t.get("rag_queries") or [t["body"]] for t in info_tickets}
     for t in info_tickets:
         print(f"🧠 Requête RAG construite pour Ticket {t['id']}")
     return {"rag_queries": rag_queries}
@@ -97,22 +255,70 @@ async def construct_rag_queries(state: GraphState) -> GraphState:
 # --------------------------
 # 5️⃣ Récupérer réponse RAG
 # --------------------------
+async def _answer_rag_query(q, kb, llm, cache, search=None):
+    """Answer question `q`; context is retrieved for each of `search` (default `[q]`)."""
+    started = time.perf_counter()
+    if RAG_CONTEXT_MODE == "full":
+        context, context_hash = kb.text, kb.content_hash
+    else:
+        found = await asyncio.gather(*(kb.aretrieve(s) for s in (search or [q])))
+        # Chunks found by several queries are kept once, in rank order
+        context = kb.format_context(list(dict.fromkeys(c for chunks in found for c in chunks)))
+        context_hash = content_hash(context)
+    retrieval_ms = (time.perf_counter() - started) * 1000
+
+    # The context hash changes whenever the relevant KB content does,
+    # so cached answers never outlive a knowledge-base edit.
+    key = content_hash(GENERATE_RAG_ANSWER_PROMPT, DEFAULT_MODEL, q, context_hash)
+    cached = await cache.aget("rag", key) if cache is not None else None
+    if isinstance(cached, str):
+        return cached
+    prompt = GENERATE_RAG_ANSWER_PROMPT.format(context=context, question=q)
+    response = await ainvoke(llm, [HumanMessage(content=prompt)], agent="rag")
+    answer = response.content.strip()
+    if cache is not None:
+        await cache.aset("rag", key, answer)
+    print(
+        f"🧾 Prompt RAG ({RAG_CONTEXT_MODE}) : {len(prompt)} caractères, "
+        f"récupération {retrieval_ms:.1f} ms, total {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    return answer
+
+
+async def _answer_rag_ticket(ticket_id, queries, kb, llm, cache, record=None):
+    try:
+        if record and record.get("rag_queries") and record.get("body"):
+            # Queries of the combined analysis only drive retrieval: the
+            # ticket gets one answer to its own text.
+            parts = [await _answer_rag_query(record["body"], kb, llm, cache, search=queries)]
+        else:
+            parts = await asyncio.gather(*(_answer_rag_query(q, kb, llm, cache) for q in queries))
+    except Exception as e:
+        print(f"❌ Erreur RAG ticket {ticket_id}: {e!r}")
+        return None
+    print(f"✅ Réponse RAG générée pour Ticket {ticket_id}")
+    return "\n\n".join(parts).strip()
+
+
 async def retrieve_from_rag(state: GraphState) -> GraphState:
-    answers = {}
-    for ticket_id, queries in state.get("rag_queries", {}).items():
-        final_answer = ""
-        for q in queries:
-            message = HumanMessage(
-                content=GENERATE_RAG_ANSWER_PROMPT.format(
-                    context=AGENTIA_CONTENT, question=q
-                )
-            )
-            # The underlying LLM client may block (time.sleep in retries).
-            # Call it in a thread to avoid blocking the event loop.
-            response = await asyncio.to_thread(rag_agent.llm.invoke, [message])
-            final_answer += response.content.strip() + "\n\n"
-        answers[ticket_id] = final_answer.strip()
-        print(f"✅ Réponse RAG générée pour Ticket {ticket_id}")
+    cache = get_result_cache()
+    rag_queries = state.get("rag_queries", {})
+    if not rag_queries:
+        return {"rag_answers": {}}
+    # The first call builds the KB index and the RAG agent; keep that off
+    # the event loop (later calls return the cached instances).
+    kb, rag_agent = await asyncio.to_thread(lambda: (get_kb_retriever(), get_rag_agent()))
+    # Fan out across tickets and queries; concurrency is bounded by the
+    # adaptive limiter in src.llm, not by the thread pool.
+    table = state.get("ticket_table", {})
+    results = await asyncio.gather(*(
+        _answer_rag_ticket(ticket_id, queries, kb, rag_agent.llm, cache, table.get(ticket_id))
+        for ticket_id, queries in rag_queries.items()
+    ))
+    answers = {tid: a for tid, a in zip(rag_queries, results) if a is not None}
+    if cache is not None:
+        st = cache.stats("rag")
+        print(f"📦 Cache RAG : {st['hits']} hits / {st['misses']} misses")
     return {"rag_answers": answers}
 
 
@@ -121,18 +327,34 @@ async def retrieve_from_rag(state: GraphState) -> GraphState:
 # --------------------------
 async def analyze_ticket_sentiment(state: GraphState) -> GraphState:
     # Only analyze sentiments for tickets routed to the feedback branch.
-    tickets = state.get("sentiment_tickets", [])
+    tickets = _tickets_for(state, "sentiment_ids")
     print(f"[debug] analyze_ticket_sentiment called with {len(tickets)} tickets")
     if tickets:
         print(f"[debug] sentiment ticket ids: {[t.get('id') for t in tickets]}")
     sentiments = {}
-    for i, ticket in enumerate(tickets):
-        text = ticket.get("body", "") if isinstance(ticket, dict) else str(ticket)
-        # sentiment_agent may perform blocking work; run in thread
-        sentiment = await asyncio.to_thread(sentiment_agent.analyze_sentiment, text)
+    # A sentiment already on the record (thread reuse in src.threads, or
+    # the combined analysis of src.analysis) is kept
+    for ticket in tickets:
+        if ticket.get("sentiment") in ("positive", "negative", "neutral"):
+            sentiments[ticket["id"]] = ticket["sentiment"]
+            print(f"♻️ Ticket {ticket['id']} sentiment déjà connu : {ticket['sentiment']}")
+    tickets = [t for t in tickets if t.get("id") not in sentiments]
+    if not tickets:
+        # Nothing to analyze: don't load the sentiment model for nothing
+        return {"ticket_sentiments": sentiments}
+    texts = [ticket.get("body", "") if isinstance(ticket, dict) else str(ticket) for ticket in tickets]
+    # First use loads the sentiment model; build it off the event loop.
+    sentiment_agent = await asyncio.to_thread(get_sentiment_agent)
+    # One batched call for the whole branch (pipeline batches or multi-item LLM prompts)
+    labels = await sentiment_agent.aanalyze_batch(texts)
+    fresh = {}
+    for i, (ticket, sentiment) in enumerate(zip(tickets, labels)):
         tid = ticket.get("id") if isinstance(ticket, dict) else str(i)
-        sentiments[tid] = sentiment
+        fresh[tid] = sentiment
         print(f"🧩 Ticket {tid} sentiment: {sentiment}")
+    if threads_enabled():
+        await asyncio.to_thread(remember_thread_sentiments, tickets, fresh, state.get("thread_scope"))
+    sentiments.update(fresh)
     return {"ticket_sentiments": sentiments}
 
 
@@ -141,7 +363,7 @@ async def analyze_ticket_sentiment(state: GraphState) -> GraphState:
 # --------------------------
 async def classify_feedback_type(state: GraphState) -> GraphState:
     # Work only on tickets routed to the feedback branch
-    tickets = state.get("sentiment_tickets", [])
+    tickets = _tickets_for(state, "sentiment_ids")
     sent_map = state.get("ticket_sentiments", {})
     print(f"[debug] classify_feedback_type called with {len(tickets)} tickets and sentiments: {sent_map}")
     fb_map = {}
@@ -158,25 +380,8 @@ async def classify_feedback_type(state: GraphState) -> GraphState:
 ## --------------------------
 # 8️⃣ Human-in-the-loop
 # --------------------------
-async def human_validation_loop(state: GraphState) -> GraphState:
-    # Validate only tickets from the feedback branch
-    tickets = state.get("sentiment_tickets", [])
-    sent_map = state.get("ticket_sentiments", {})
-    print(f"[debug] human_validation_loop called with {len(tickets)} tickets and sentiments: {sent_map}")
-    negative_tickets = [t for t in tickets if sent_map.get(t.get("id")) == "negative"]
-
-    if not negative_tickets:
-        print("✅ Aucun ticket nécessitant validation humaine. Bypass outils.")
-        # No negative tickets: skip the tool call and continue to send_ticket_email
-        return Command(goto="send_ticket_email")
-
-    # Use LangGraph interrupt to request human validation via the Studio UI
-    print("🧍 Interruption du graphe : validation humaine requise...")
-    validation_data = _call_interrupt({
-        "action": "review_required",
-        "tickets_to_validate": negative_tickets,
-    })
-
+def _parse_validation(validation_data, negative_tickets):
+    """Normalise la réponse de l'interrupt en `(validated_copies, validated_ids)`."""
     # interrupt() may return a dict or a raw string (if user pasted JSON).
     validation_data_parsed = None
     if isinstance(validation_data, str):
@@ -216,7 +421,7 @@ async def human_validation_loop(state: GraphState) -> GraphState:
         validation_data_parsed = {"validated_tickets": []}
 
     validated_tickets = validation_data_parsed.get("validated_tickets", []) if isinstance(validation_data_parsed, dict) else []
-    # Ensure we return a list of ticket dicts and remove them from sentiment_tickets
+    # Ensure we return a list of ticket dicts
     validated_copies = []
     validated_ids = set()
     for t in validated_tickets:
@@ -231,66 +436,123 @@ async def human_validation_loop(state: GraphState) -> GraphState:
             # skip invalid entries
             continue
 
-    # Remove validated tickets from the sentiment_tickets collection so they are not re-reviewed
-    remaining_sentiment = []
-    for t in state.get("sentiment_tickets", []):
-        try:
-            if t.get("id") not in validated_ids:
-                remaining_sentiment.append(t)
-        except Exception:
-            remaining_sentiment.append(t)
+    return validated_copies, validated_ids
 
-    print(f"[human-validation] Validated ids: {validated_ids}; remaining sentiment tickets: {[t.get('id') for t in remaining_sentiment]}")
+
+async def _queue_for_review(tickets, state):
+    """Enqueue negative tickets for review; returns their `ticket_table` update."""
+    sentiments = state.get("ticket_sentiments", {})
+    feedback_types = state.get("ticket_feedback_types", {})
+    # The run id travels with the record: the review is scoped to this run
+    # and, once approved, its email gets this run's outbox key
+    records = [
+        {**t, "sentiment": sentiments.get(t.get("id")), "feedback_type": feedback_types.get(t.get("id")),
+         "run_id": state.get("run_id")}
+        for t in tickets
+    ]
+    added = await asyncio.to_thread(get_review_queue().enqueue_many, records)
+    print(f"📋 {added} ticket(s) ajouté(s) à la file de revue ({len(records) - added} déjà présent(s)).")
+    return {t["id"]: {"review": "queued"} for t in tickets if t.get("id") is not None}
+
+
+async def human_validation_loop(state: GraphState) -> GraphState:
+    # Validate only tickets from the feedback branch
+    tickets = _tickets_for(state, "sentiment_ids")
+    sent_map = state.get("ticket_sentiments", {})
+    print(f"[debug] human_validation_loop called with {len(tickets)} tickets and sentiments: {sent_map}")
+    negative_tickets = [t for t in tickets if sent_map.get(t.get("id")) == "negative"]
+
+    if not negative_tickets:
+        print("✅ Aucun ticket nécessitant validation humaine. Bypass outils.")
+        # No negative tickets: skip the tool call and continue to send_ticket_email
+        return Command(goto="send_ticket_email")
+
+    if review_mode() == "queue":
+        # Reviewers work from the review queue; the branch does not wait
+        decisions = await _queue_for_review(negative_tickets, state)
+        return Command(goto="send_ticket_email", update={"ticket_table": decisions})
+
+    # Use LangGraph interrupt to request human validation via the Studio UI
+    print("🧍 Interruption du graphe : validation humaine requise...")
+    validation_data = _call_interrupt({
+        "action": "review_required",
+        "tickets_to_validate": negative_tickets,
+    })
+
+    validated_copies, validated_ids = _parse_validation(validation_data, negative_tickets)
+
+    # Remove validated tickets from the feedback branch so they are not re-reviewed
+    remaining_sentiment = [tid for tid in state.get("sentiment_ids", []) if tid not in validated_ids]
+    # The reviewer's decision is recorded on the ticket records themselves
+    table = state.get("ticket_table", {})
+    decisions = {
+        tc["id"]: {"validated": bool(tc["validated"])}
+        for tc in validated_copies
+        if tc.get("id") in validated_ids and tc["id"] in table
+    }
+    update = {
+        "human_validated_ids": [tid for tid in decisions],
+        "ticket_table": decisions,
+        "sentiment_ids": remaining_sentiment,
+    }
+
+    print(f"[human-validation] Validated ids: {validated_ids}; remaining sentiment tickets: {remaining_sentiment}")
 
     # Return validated tickets and route to the tool node to perform sending.
     # Use a Command so the runtime will navigate to `call_gmail_tool` only when
     # there are validated tickets (preventing the tool node from running
     # unconditionally).
     if validated_copies:
-        return Command(goto="call_gmail_tool", update={"human_validated_tickets": validated_copies, "sentiment_tickets": remaining_sentiment})
-    return Command(goto="send_ticket_email", update={"human_validated_tickets": validated_copies, "sentiment_tickets": remaining_sentiment})
+        return Command(goto="call_gmail_tool", update=update)
+    return Command(goto="send_ticket_email", update=update)
 
 
 # --------------------------
 # 9️⃣ Envoi email
 # --------------------------
-async def send_ticket_email(state: GraphState) -> GraphState:
-    """
-    Nœud LangGraph qui construit le mail à partir du ticket
-    et appelle la tool générique `send_email`.
+def _delivery_mode():
+    # "outbox" (default): enqueue and return, background workers send.
+    # "inline": send from the node, the graph waits for SMTP.
+    return os.getenv("EMAIL_DELIVERY_MODE", "outbox").lower()
+
+
+async def _deliver(messages):
+    """Remet des emails `{"subject", "body", "to", "ticket_id", "scope"}`.
+
+    Returns one status per message: "queued" or "duplicate" (already in
+    the outbox) in outbox mode, "sent" or "failed" when sending inline.
     """
-    sent_tickets = []
+    if _delivery_mode() == "inline":
+        results = await send_many(messages)
+        return ["sent" if ok else "failed" for ok in results]
+    # SQLite insert plus the first-call worker start stay off the event loop
+    submitted = await asyncio.to_thread(lambda: get_outbox().submit_many(messages))
+    statuses = [status for _, status in submitted]
+    print(f"📮 {statuses.count('queued')} email(s) placé(s) dans l'outbox, {statuses.count('duplicate')} déjà présent(s).")
+    return statuses
 
-    # The gmail tool exposes an async send_email(subject, body, to) function
-    # which reads sender credentials from environment variables itself.
-    support_team_email = os.getenv("SUPPORT_TEAM_EMAIL", "tixaf71837@wivstore.com")
 
-    show_as_tool = os.getenv("SHOW_EMAIL_AS_TOOL", "false").lower() in ("1", "true", "yes")
+def _delivery_outcome(status):
+    """Champs du record pour un statut de `_deliver`."""
+    return {"sent": status == "sent", "queued": status in ("queued", "duplicate"), "delivery": status}
 
-    for ticket in state.get("human_validated_tickets", []):
-        if not ticket.get("validated", False):
-            continue
 
-        tid = ticket.get("id", "?")
+def _render_ticket_email(ticket, state):
+    """Construit (sujet, corps HTML) du mail support pour un ticket validé."""
+    tid = ticket.get("id", "?")
+    record = state.get("ticket_table", {}).get(tid, {})
+
+    # Resolve fields: tickets passed to human validation may be minimal (id only)
+    def _resolve(field, default="(unknown)"):
+        return ticket.get(field) or record.get(field) or default
+
+    subject_val = _resolve("subject", "(no subject)")
+    category_val = _resolve("category", "(unknown)")
+    body_text = _resolve("body", "(no message body)")
+    sentiment_val = state.get("ticket_sentiments", {}).get(tid, "Inconnu")
+    feedback_val = state.get("ticket_feedback_types", {}).get(tid, "N/A")
 
-        # Resolve fields: tickets passed to human validation may be minimal (id only)
-        def _resolve(field, default="(unknown)"):
-            v = ticket.get(field)
-            if v:
-                return v
-            for coll in (state.get("categorized_tickets", []), state.get("tickets", [])):
-                for t0 in coll:
-                    if t0.get("id") == tid:
-                        return t0.get(field) or default
-            return default
-
-        subject_val = _resolve("subject", "(no subject)")
-        category_val = _resolve("category", "(unknown)")
-        body_text = _resolve("body", "(no message body)")
-        sentiment_val = state.get("ticket_sentiments", {}).get(tid, "Inconnu")
-        feedback_val = state.get("ticket_feedback_types", {}).get(tid, "N/A")
-
-        html_body = f"""
+    html_body = f"""
 <html>
     <body>
         <p>Bonjour équipe support,</p>
@@ -310,50 +572,115 @@ async def send_ticket_email(state: GraphState) -> GraphState:
 </html>
 """
 
-        subject = f"[Ticket #{tid}] {subject_val}"
+    subject = f"[Ticket #{tid}] {subject_val}"
+    return subject, html_body
+
+
+async def send_ticket_email(state: GraphState) -> GraphState:
+    """
+    Nœud LangGraph qui construit le mail à partir du ticket
+    et appelle la tool générique `send_many` (sessions SMTP partagées).
+    """
+    sent_ids = []
+    outcomes = {}
+    outgoing = []
+
+    # The gmail tool exposes async send_email / send_many functions which
+    # read sender credentials from environment variables themselves.
+    support_team_email = os.getenv("SUPPORT_TEAM_EMAIL", "tixaf71837@wivstore.com")
+
+    show_as_tool = os.getenv("SHOW_EMAIL_AS_TOOL", "false").lower() in ("1", "true", "yes")
+
+    for ticket in _tickets_for(state, "human_validated_ids"):
+        if not ticket.get("validated", False):
+            continue
+
+        tid = ticket.get("id", "?")
+        subject, html_body = _render_ticket_email(ticket, state)
+
+        if not show_as_tool:
+            # Sent together after the loop over a few pooled SMTP sessions
+            # Tickets from the review queue keep the run they came from
+            scope = ticket.get("run_id") or state.get("run_id")
+            outgoing.append((ticket, {"subject": subject, "body": html_body, "to": support_team_email,
+                                      "ticket_id": tid, "scope": scope}))
+            continue
 
         try:
-            if show_as_tool:
-                # Render the email send as a Studio tools call via interrupt()
-                payload = {
-                    "type": "tool_call",
-                    "tool": "gmail.send_email",
-                    "args": {"subject": subject, "body": html_body, "to": support_team_email},
-                    "description": f"Send ticket #{tid} via Gmail tool (studio view)"
-                }
-
-                resume = _call_interrupt(payload)
-                # Normalize resume value
+            # Render the email send as a Studio tools call via interrupt()
+            payload = {
+                "type": "tool_call",
+                "tool": "gmail.send_email",
+                "args": {"subject": subject, "body": html_body, "to": support_team_email},
+                "description": f"Send ticket #{tid} via Gmail tool (studio view)"
+            }
+
+            resume = _call_interrupt(payload)
+            # Normalize resume value
+            ok = False
+            if isinstance(resume, dict):
+                ok = bool(resume.get("ok", False))
+            elif isinstance(resume, str):
+                raw = resume.strip().lower()
+                ok = raw in ("ok", "true", "success")
+            else:
                 ok = False
-                if isinstance(resume, dict):
-                    ok = bool(resume.get("ok", False))
-                elif isinstance(resume, str):
-                    raw = resume.strip().lower()
-                    ok = raw in ("ok", "true", "success")
-                else:
-                    ok = False
 
-                sent_ticket = dict(ticket)
-                sent_ticket["sent"] = bool(ok)
-                sent_tickets.append(sent_ticket)
-                if ok:
-                    print(f"✅ (tool) Email envoyé à {support_team_email} avec sujet '{subject}'.")
-                else:
-                    print(f"❌ (tool) Envoi échoué pour ticket {tid} (resume: {resume})")
+            sent_ids.append(tid)
+            outcomes[tid] = {"sent": bool(ok)}
+            if ok:
+                print(f"✅ (tool) Email envoyé à {support_team_email} avec sujet '{subject}'.")
             else:
-                # The tool provides an async API; call it directly
-                ok = await send_email(subject, html_body, to=support_team_email)
-                sent_ticket = dict(ticket)
-                sent_ticket["sent"] = bool(ok)
-                sent_tickets.append(sent_ticket)
-                if ok:
-                    print(f"✅ Email envoyé à {support_team_email} avec sujet '{subject}'.")
-                else:
-                    print(f"❌ Envoi échoué pour ticket {tid} (outil renvoyé False)")
+                print(f"❌ (tool) Envoi échoué pour ticket {tid} (resume: {resume})")
         except Exception as e:
             print(f"❌ Erreur envoi email pour ticket {tid}: {e}")
 
-    return {"sent_tickets": sent_tickets}
+    if outgoing:
+        try:
+            results = await _deliver([m for _, m in outgoing])
+        except Exception as e:
+            print(f"❌ Erreur envoi email pour {len(outgoing)} ticket(s): {e}")
+            results = ["failed"] * len(outgoing)
+        for (ticket, message), status in zip(outgoing, results):
+            # In outbox mode the email is only queued ("queued" / "duplicate");
+            # the final outcome is tracked per ticket by the outbox.
+            sent_ids.append(ticket["id"])
+            outcomes[ticket["id"]] = _delivery_outcome(status)
+            if status in ("queued", "duplicate"):
+                print(f"📮 Email pour ticket {ticket.get('id', '?')} en file vers {support_team_email} ({status}).")
+            elif status == "sent":
+                print(f"✅ Email envoyé à {support_team_email} avec sujet '{message['subject']}'.")
+            else:
+                print(f"❌ Envoi échoué pour ticket {ticket.get('id', '?')} (outil renvoyé False)")
+
+    return {"sent_ids": sent_ids, "ticket_table": outcomes}
+
+
+async def send_reviewed_tickets(tickets):
+    """Send approved review-queue tickets through `send_ticket_email`.
+
+    `tickets` are the records stored by `_queue_for_review`; returns one
+    outcome (the record fields set by the node) per ticket, in order.
+    Tickets are sent run by run: ticket ids are only unique within a run.
+    """
+    by_run = {}
+    for i, t in enumerate(tickets):
+        if t.get("id") is not None:
+            by_run.setdefault(t.get("run_id"), []).append((i, t))
+    outcomes = [{"sent": False}] * len(tickets)
+    for run_id, group in by_run.items():
+        table = {t["id"]: {**t, "validated": True} for _, t in group}
+        state = {
+            "run_id": run_id,
+            "ticket_table": table,
+            "human_validated_ids": list(table),
+            "ticket_sentiments": {tid: t.get("sentiment") for tid, t in table.items() if t.get("sentiment")},
+            "ticket_feedback_types": {tid: t.get("feedback_type") for tid, t in table.items() if t.get("feedback_type")},
+        }
+        sent = await send_ticket_email(state)
+        for i, t in group:
+            outcomes[i] = sent["ticket_table"].get(t["id"], {"sent": False})
+    return outcomes
 
 
 # --------------------------
@@ -366,6 +693,11 @@ async def call_gmail_tool(state: GraphState) -> GraphState:
 
     Retourne un petit état contenant le résultat (ok/error) pour inspection.
     """
+    # Only an interrupt-mode review with validated tickets leads here; any
+    # other path must not pause the run on this demo step.
+    if review_mode() != "interrupt" or not state.get("human_validated_ids"):
+        return Command(goto="send_ticket_email")
+
     support_team_email = os.getenv("SUPPORT_TEAM_EMAIL", "tixaf71837@wivstore.com")
     subject = "[LangGraph Test] Vérification outil Gmail"
     html_body = "<p>Ceci est un test envoyé depuis le nœud `call_gmail_tool`.</p>"
@@ -433,15 +765,19 @@ async def handle_product_complaint(state: GraphState) -> GraphState:
 
     For each product complaint ticket, surface a tool call via interrupt so the
     Studio/tool-runner can send the email (visible as a tools node). We collect
-    results in `product_sent_tickets` to track outcomes.
+    results on the ticket records (`ticket_table`) and list the ids in
+    `product_sent_ids`.
     """
-    product_tickets = state.get("product_complaint_tickets", [])
+    product_tickets = _tickets_for(state, "product_complaint_ids")
     if not product_tickets:
         print("✅ Aucun ticket product complaint à traiter.")
-        return {"product_sent_tickets": []}
+        return {"product_sent_ids": []}
 
     support_email = os.getenv("SUPPORT_PRODUCT_TEAM_EMAIL", "tixaf71837@wivstore.com")
     results = []
+    outgoing = []
+    # Optionally render the call as a Studio-visible tool (interrupt)
+    show_as_tool = os.getenv("SHOW_EMAIL_AS_TOOL", "false").lower() in ("1", "true", "yes")
 
     for ticket in product_tickets:
         tid = ticket.get("id", "?")
@@ -449,59 +785,150 @@ async def handle_product_complaint(state: GraphState) -> GraphState:
         body = ticket.get("body", "(no body)")
         html_body = f"<p>Ticket #{tid}</p><blockquote>{body}</blockquote>"
 
+        if not show_as_tool:
+            # Sent together after the loop over a few pooled SMTP sessions
+            outgoing.append((tid, {"subject": subject, "body": html_body, "to": support_email,
+                                   "ticket_id": tid, "scope": state.get("run_id")}))
+            continue
+
         try:
-            # Optionally render the call as a Studio-visible tool (interrupt)
-            show_as_tool = os.getenv("SHOW_EMAIL_AS_TOOL", "false").lower() in ("1", "true", "yes")
-            if show_as_tool:
-                payload = {
-                    "type": "tool_call",
-                    "tool": "gmail.send_email",
-                    "args": {"subject": subject, "body": html_body, "to": support_email},
-                    "description": f"Product complaint #{tid} - send via Gmail tool (studio view)"
-                }
-                resume = _call_interrupt(payload)
-                ok = False
-                if isinstance(resume, dict):
-                    ok = bool(resume.get("ok", False))
-                elif isinstance(resume, str):
-                    raw = resume.strip().lower()
-                    ok = raw in ("ok", "true", "success")
-                results.append({"id": tid, "sent": bool(ok)})
-                if ok:
-                    print(f"✅ Product complaint email envoyé pour ticket {tid} à {support_email} (tool)")
-                else:
-                    print(f"❌ Échec envoi product complaint pour ticket {tid} (tool)")
+            payload = {
+                "type": "tool_call",
+                "tool": "gmail.send_email",
+                "args": {"subject": subject, "body": html_body, "to": support_email},
+                "description": f"Product complaint #{tid} - send via Gmail tool (studio view)"
+            }
+            resume = _call_interrupt(payload)
+            ok = False
+            if isinstance(resume, dict):
+                ok = bool(resume.get("ok", False))
+            elif isinstance(resume, str):
+                raw = resume.strip().lower()
+                ok = raw in ("ok", "true", "success")
+            results.append({"id": tid, "sent": bool(ok)})
+            if ok:
+                print(f"✅ Product complaint email envoyé pour ticket {tid} à {support_email} (tool)")
             else:
-                # Call the gmail tool directly (async). The tool reads credentials from env vars.
-                ok = await send_email(subject, html_body, to=support_email)
-                results.append({"id": tid, "sent": bool(ok)})
-                if ok:
-                    print(f"✅ Product complaint email envoyé pour ticket {tid} à {support_email}")
-                else:
-                    print(f"❌ Échec envoi product complaint pour ticket {tid}")
+                print(f"❌ Échec envoi product complaint pour ticket {tid} (tool)")
         except Exception as e:
             results.append({"id": tid, "error": str(e)})
             print(f"❌ Erreur envoi product complaint pour ticket {tid}: {e}")
 
-    return {"product_sent_tickets": results}
+    if outgoing:
+        # Outbox (default) or direct send; both read credentials from env vars.
+        try:
+            delivered = await _deliver([m for _, m in outgoing])
+        except Exception as e:
+            print(f"❌ Erreur envoi product complaint pour {len(outgoing)} ticket(s): {e}")
+            delivered = None
+        for i, (tid, _) in enumerate(outgoing):
+            if delivered is None:
+                results.append({"id": tid, "error": "delivery failed"})
+                continue
+            status = delivered[i]
+            results.append({"id": tid, **_delivery_outcome(status)})
+            if status in ("queued", "duplicate"):
+                print(f"📮 Product complaint email en file pour ticket {tid} vers {support_email} ({status})")
+            elif status == "sent":
+                print(f"✅ Product complaint email envoyé pour ticket {tid} à {support_email}")
+            else:
+                print(f"❌ Échec envoi product complaint pour ticket {tid}")
+
+    # Outcomes live on the ticket records; the branch only lists the ids
+    outcomes = {r["id"]: {k: v for k, v in r.items() if k != "id"} for r in results}
+    return {"product_sent_ids": [r["id"] for r in results], "ticket_table": outcomes}
 
 # --------------------------
 # 🔀 Routage (node séparé)
 # --------------------------
 async def route_ticket(state: GraphState) -> GraphState:
-    categorized = state.get("categorized_tickets", [])
-    feedback_tickets = [t for t in categorized if t.get("category") == "feedback"]
-    product_tickets = [t for t in categorized if t.get("category") == "product_complaint"]
-    info_tickets = [t for t in categorized if t.get("category") == "information_search"]
+    categorized = _tickets_for(state, "categorized_ids")
+    feedback_ids = [t["id"] for t in categorized if t.get("category") == "feedback"]
+    product_ids = [t["id"] for t in categorized if t.get("category") == "product_complaint"]
+    info_ids = [t["id"] for t in categorized if t.get("category") == "information_search"]
+    counts = {}
+    for t in categorized:
+        counts[t.get("category")] = counts.get(t.get("category"), 0) + 1
+    for category, n in counts.items():
+        record_routed(category, n)
 
     print("🔀 Routage effectué :")
-    print(f"   📚 {len(info_tickets)} tickets 'information_search'")
-    print(f"   ids info: {[t.get('id') for t in info_tickets]}")
-    print(f"   💬 {len(feedback_tickets)} tickets 'feedback'")
-    print(f"   ids feedback: {[t.get('id') for t in feedback_tickets]}")
+    print(f"   📚 {len(info_ids)} tickets 'information_search'")
+    print(f"   ids info: {info_ids}")
+    print(f"   💬 {len(feedback_ids)} tickets 'feedback'")
+    print(f"   ids feedback: {feedback_ids}")
 
+    # Branch membership is stored as id lists; records stay in ticket_table
     return {
-        "information_search_tickets": info_tickets,
-        "sentiment_tickets": feedback_tickets,
-        "product_complaint_tickets": product_tickets,
+        "information_search_ids": info_ids,
+        "sentiment_ids": feedback_ids,
+        "product_complaint_ids": product_ids,
+    }
+
+
+# --------------------------
+# 🎯 Mode par ticket (GRAPH_MODE=per_ticket)
+# --------------------------
+# route_ticket fans out one `Send` per ticket; each ticket then runs its
+# whole branch as an independent task, so a slow LLM call or a pending
+# review only holds up its own ticket. The task nodes reuse the batch
+# nodes above on a one-ticket state; GraphState reducers merge the results.
+def fan_out_tickets(state: GraphState):
+    run = {"run_id": state.get("run_id"), "thread_scope": state.get("thread_scope")}
+    sends = [Send("rag_ticket", {"ticket": t, **run}) for t in _tickets_for(state, "information_search_ids")]
+    sends += [Send("feedback_ticket", {"ticket": t, **run}) for t in _tickets_for(state, "sentiment_ids")]
+    sends += [Send("product_ticket", {"ticket": t, **run}) for t in _tickets_for(state, "product_complaint_ids")]
+    print(f"🎯 {len(sends)} tâche(s) par ticket lancée(s).")
+    return sends
+
+
+def _ticket_state(task, ids_key):
+    """État minimal d'un seul ticket pour réutiliser les nœuds par lots."""
+    ticket = task["ticket"]
+    return {"ticket_table": {ticket["id"]: ticket}, ids_key: [ticket["id"]],
+            "run_id": task.get("run_id"), "thread_scope": task.get("thread_scope")}
+
+
+async def rag_ticket(task: TicketTask) -> GraphState:
+    ticket_state = _ticket_state(task, "information_search_ids")
+    queries = await construct_rag_queries(ticket_state)
+    answers = await retrieve_from_rag({**ticket_state, **queries})
+    return {**queries, **answers}
+
+
+async def feedback_ticket(task: TicketTask) -> GraphState:
+    ticket = task["ticket"]
+    tid = ticket.get("id")
+    ticket_state = _ticket_state(task, "sentiment_ids")
+    ticket_state.update(await analyze_ticket_sentiment(ticket_state))
+    ticket_state.update(await classify_feedback_type(ticket_state))
+    update = {
+        "ticket_sentiments": ticket_state["ticket_sentiments"],
+        "ticket_feedback_types": ticket_state["ticket_feedback_types"],
     }
+    if ticket_state["ticket_sentiments"].get(tid) != "negative":
+        return update
+
+    if review_mode() == "queue":
+        update["ticket_table"] = await _queue_for_review([ticket], ticket_state)
+        return update
+
+    # Only this ticket waits for the reviewer; the other tasks carry on.
+    print(f"🧍 Validation humaine requise pour le ticket {tid}...")
+    validation_data = _call_interrupt({"action": "review_required", "tickets_to_validate": [ticket]})
+    validated, _ = _parse_validation(validation_data, [ticket])
+    validated = [t for t in validated if t.get("id") == tid]
+    if not validated:
+        return update
+    decision = {"validated": bool(validated[0]["validated"])}
+    ticket_state["ticket_table"][tid] = {**ticket, **decision}
+    ticket_state["human_validated_ids"] = [tid]
+    sent = await send_ticket_email(ticket_state)
+    update["human_validated_ids"] = [tid]
+    update["sent_ids"] = sent["sent_ids"]
+    update["ticket_table"] = {tid: {**decision, **sent["ticket_table"].get(tid, {})}}
+    return update
+
+
+async def product_ticket(task: TicketTask) -> GraphState:
+    return await handle_product_complaint(_ticket_state(task, "product_complaint_ids"))
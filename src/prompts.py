@@ -1,22 +1,29 @@
 # prompts.py
 
 # --- Prompt pour catégoriser les tickets ---
-# --- Prompt pour catégoriser les tickets ---
-CATEGORIZATION_PROMPT = """
-You are a helpful customer support agent.
-
-Task: read the ticket (subject and body) and choose the single most appropriate category from the list below.
-
-Categories (choose exactly one and return only the category name):
+# Labels the categorization prompts may return.
+CATEGORIES = ("information_search", "feedback", "product_complaint")
+
+# Category definitions shared by the single-ticket, batch and analysis
+# prompts. No answer format here: each prompt states its own (a bare name
+# for one ticket, a JSON object for several).
+CATEGORY_GUIDE = """
+Categories (choose exactly one per ticket):
 - "information_search" → The user is asking for information, clarification, instructions, or how-to guidance (no opinions or complaints).
-- "feedback" → The user is expressing an opinion, appreciation, suggestion, or general comment about the product or service. This includes both positive and negative opinions. IMPORTANT: if the message expresses negative sentiment about the product or service (e.g., "I am unhappy", "I dislike", "very disappointed"), still return "feedback" unless the content explicitly reports a product defect, return request, broken item, or quality/functional problem.
+- "feedback" → The user is expressing an opinion, appreciation, suggestion, or general comment about the product or service. This includes both positive and negative opinions. IMPORTANT: if the message expresses negative sentiment about the product or service (e.g., "I am unhappy", "I dislike", "very disappointed"), the category is still "feedback" unless the content explicitly reports a product defect, return request, broken item, or quality/functional problem.
 - "product_complaint" → The user reports a concrete problem or defect with a product or order: broken item, missing parts, wrong item shipped, product not working as described, return/exchange request, damaged-on-arrival, manufacturing defect, or other issue that requires involvement of the product/support operations team.
 
 Rules / guidance:
-1. If the ticket reports an actual product defect, return "product_complaint" (even if the tone is negative).
-2. If the ticket is mainly an opinion, praise, request for improvement, or general user experience comment, return "feedback". If that feedback expresses negative sentiment, it is still "feedback" — the sentiment analysis step will classify it as positive/neutral/negative.
-3. If the user asks a factual or procedural question (how to, where is, how do I), return "information_search".
-4. Return only the category name exactly as one of: information_search, feedback, product_complaint.
+1. If the ticket reports an actual product defect, choose "product_complaint" (even if the tone is negative).
+2. If the ticket is mainly an opinion, praise, request for improvement, or general user experience comment, choose "feedback". If that feedback expresses negative sentiment, it is still "feedback" — the sentiment analysis step will classify it as positive/neutral/negative.
+3. If the user asks a factual or procedural question (how to, where is, how do I), choose "information_search".
+"""
+
+CATEGORIZATION_PROMPT = """
+You are a helpful customer support agent.
+
+Task: read the ticket (subject and body) and choose the single most appropriate category from the list below.
+""" + CATEGORY_GUIDE + """4. Return only the category name exactly as one of: information_search, feedback, product_complaint.
 
 Ticket:
 Subject: {subject}
@@ -24,6 +31,40 @@ Body: {body}
 """
 
 
+# --- Prompt pour catégoriser plusieurs tickets en un seul appel ---
+# `{tickets}` is a JSON array of {"id", "subject", "body"} objects. Literal
+# braces are doubled because the template goes through str.format().
+BATCH_CATEGORIZATION_PROMPT = """
+You are a helpful customer support agent.
+
+Task: read each ticket below (subject and body) and choose the single most appropriate category for every one of them.
+""" + CATEGORY_GUIDE + """4. Answer with a single JSON object and nothing else. Each key is a ticket id (as a string) and each value is exactly one of: information_search, feedback, product_complaint.
+   Example: {{"12": "feedback", "13": "information_search"}}
+5. Include every ticket id exactly once.
+
+Tickets (JSON):
+{tickets}
+"""
+
+
+# --- Prompt d'analyse combinée : catégorie, sentiment et requêtes RAG ---
+# One request per batch of tickets (ANALYSIS_MODE=combined, src.analysis).
+# `{tickets}` is a JSON array of {"id", "subject", "body"} objects.
+ANALYSIS_PROMPT = """
+You are a helpful customer support agent.
+
+Task: for each ticket below (subject and body), return its category, its sentiment and the queries to search the internal knowledge base with.
+""" + CATEGORY_GUIDE + """4. Sentiment is the customer's tone: exactly one of positive, neutral, negative.
+5. Queries: up to three concise queries to retrieve the internal documentation that answers the ticket (an empty list if there is nothing to look up).
+6. Answer with a single JSON object and nothing else. Each key is a ticket id (as a string) and each value is an object with the keys "category", "sentiment" and "queries".
+   Example: {{"12": {{"category": "information_search", "sentiment": "neutral", "queries": ["delivery tracking", "change delivery address"]}}}}
+7. Include every ticket id exactly once.
+
+Tickets to analyze (JSON):
+{tickets}
+"""
+
+
 # --- Prompt pour générer des requêtes RAG depuis un ticket ---
 GENERATE_RAG_QUERIES_PROMPT = """
 # **Role:**
@@ -62,3 +103,17 @@ Return only one word: positive, neutral, or negative.
 
 Text: {text}
 """
+
+# --- Prompt pour classer le sentiment de plusieurs textes en un seul appel ---
+# `{texts}` is a JSON object mapping an index (as a string) to a text.
+BATCH_SENTIMENT_PROMPT = """
+You are an expert in analyzing customer feedback related to products.
+
+Classify the sentiment of each text below as one of: positive, neutral, or negative.
+Answer with a single JSON object and nothing else. Each key is the index of a text (as a string) and each value is exactly one of: positive, neutral, negative.
+Example: {{"0": "positive", "1": "neutral"}}
+Include every index exactly once.
+
+Texts (JSON):
+{texts}
+"""
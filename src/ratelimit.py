@@ -0,0 +1,262 @@
+# ratelimit.py
+"""Limiteur adaptatif (token bucket + contrôle de concurrence AIMD).
+
+Raising concurrency makes Gemini answer 429. The langchain client then
+retries on its own, sleeping inside the call and silently stalling whole
+nodes. `AdaptiveRateLimiter` sits in front of every LLM call made through
+`src.llm` (categorizer, RAG answers, sentiment fallback) and:
+
+- spaces requests with a token bucket (`rate` requests/s, `burst` tokens);
+- caps calls in flight with a limit that grows by one after a full window
+  of successes (additive increase) and is multiplied by `decrease_factor`
+  on throttling (multiplicative decrease);
+- pauses all callers until the server's retry-after hint expires.
+
+State is guarded by a `threading.Lock` and waiters poll, so one limiter
+safely serves several event loops and plain threads in the same process.
+
+Configuration (per model, read when the limiter is created):
+- LLM_RATE_LIMIT: requests per second, 0 = unlimited (default 0)
+- LLM_BURST: token bucket size (default 10)
+- LLM_INITIAL_CONCURRENCY: starting in-flight limit (default 4)
+- LLM_MIN_CONCURRENCY / LLM_MAX_CONCURRENCY: bounds (default 1 / 16)
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+
+# Longest single wait between two acquisition attempts; keeps waiters
+# responsive when another caller releases a slot.
+_POLL_INTERVAL = 0.02
+
+_RETRY_PATTERNS = (
+    re.compile(r"retry[ _-]?(?:in|after|delay)\D{0,20}?(\d+(?:\.\d+)?)\s*(ms|s)?", re.IGNORECASE),
+    re.compile(r"seconds\s*[:=]\s*(\d+(?:\.\d+)?)()", re.IGNORECASE),
+)
+# A 429 status at the start of the message or next to an HTTP/status/code
+# word, or the wording of a quota answer; not any "429" in the text
+_THROTTLE_TEXT = re.compile(
+    r"^\W*429\b|\b(?:http|status|code|error)\W{0,3}429\b|\bresource[_ ]exhausted\b"
+    r"|\btoo many requests\b|\brate[ _-]?limit(?:ed|s? exceeded)\b",
+    re.IGNORECASE,
+)
+
+
+def is_throttle_error(exc) -> bool:
+    """True when `exc` is an HTTP 429 / RESOURCE_EXHAUSTED answer.
+
+    Structured fields (status code, exception type) are trusted first; the
+    message only counts when it reads like a throttling answer, so an error
+    that merely mentions 429 (an id, a port, a token count) is not one.
+    Explicit causes (`raise ... from e`) are followed, since langchain
+    wraps the client error.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if _is_throttle(exc):
+            return True
+        exc = exc.__cause__
+    return False
+
+
+def _is_throttle(exc):
+    for attr in ("code", "status_code", "status"):
+        value = getattr(exc, attr, None)
+        try:
+            if int(value) == 429:
+                return True
+        except (TypeError, ValueError):
+            pass
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    if type(exc).__name__ in ("ResourceExhausted", "RateLimitError", "TooManyRequests"):
+        return True
+    return bool(_THROTTLE_TEXT.search(str(exc)))
+
+
+def retry_after_hint(exc):
+    """Seconds the server asked us to wait, or None when it gave no hint."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+    text = str(exc)
+    for pattern in _RETRY_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            seconds = float(match.group(1))
+            return seconds / 1000.0 if match.group(2) == "ms" else seconds
+    return None
+
+
+class AdaptiveRateLimiter:
+    """Token bucket + limite de concurrence AIMD, partagé entre threads."""
+
+    def __init__(self, rate=None, burst=None, initial_concurrency=None, min_concurrency=None,
+                 max_concurrency=None, decrease_factor=0.5, base_backoff=1.0, max_backoff=30.0):
+        self.rate = float(rate if rate is not None else os.getenv("LLM_RATE_LIMIT", "0"))
+        self.burst = float(burst if burst is not None else os.getenv("LLM_BURST", "10"))
+        self.min_concurrency = max(1, int(min_concurrency or os.getenv("LLM_MIN_CONCURRENCY", "1")))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency or os.getenv("LLM_MAX_CONCURRENCY", "16")))
+        initial = int(initial_concurrency or os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+        self.limit = float(min(self.max_concurrency, max(self.min_concurrency, initial)))
+        self.decrease_factor = decrease_factor
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._consecutive_throttles = 0
+        self._window_successes = 0
+        self.in_flight = 0
+        self._stats = {"acquired": 0, "successes": 0, "throttled": 0, "errors": 0,
+                       "increases": 0, "decreases": 0, "wait_seconds": 0.0}
+
+    # --- acquisition ---
+    def _try_acquire(self):
+        """Take a slot and a token if possible; otherwise return the wait in seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.in_flight >= int(self.limit):
+                return _POLL_INTERVAL
+            if self.rate > 0:
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens < 1.0:
+                    return (1.0 - self._tokens) / self.rate
+                self._tokens -= 1.0
+            self.in_flight += 1
+            self._stats["acquired"] += 1
+            return 0.0
+
+    async def acquire(self):
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, _POLL_INTERVAL * 5))
+        self._add_wait(time.monotonic() - started)
+
+    def acquire_sync(self):
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                break
+            time.sleep(min(wait, _POLL_INTERVAL * 5))
+        self._add_wait(time.monotonic() - started)
+
+    def _add_wait(self, seconds):
+        with self._lock:
+            self._stats["wait_seconds"] += seconds
+
+    # --- feedback ---
+    def release(self, outcome="success", retry_after=None):
+        """Free the slot and adapt the limit.
+
+        `outcome` is "success", "throttled" (429) or "error" (any other
+        failure, which does not change the limit).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if outcome == "success":
+                self._stats["successes"] += 1
+                self._consecutive_throttles = 0
+                self._window_successes += 1
+                # Additive increase: +1 once per window of `limit` successes
+                if self._window_successes >= int(self.limit):
+                    self._window_successes = 0
+                    if self.limit < self.max_concurrency:
+                        self.limit = min(self.max_concurrency, self.limit + 1)
+                        self._stats["increases"] += 1
+            elif outcome == "throttled":
+                self._stats["throttled"] += 1
+                self._consecutive_throttles += 1
+                self._window_successes = 0
+                # Multiplicative decrease, at most once per backoff period so a
+                # burst of 429s from the same wave counts as one signal.
+                if now - self._last_decrease >= self.base_backoff:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self._stats["decreases"] += 1
+                if retry_after is None:
+                    backoff = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_throttles - 1))
+                    retry_after = backoff * random.uniform(0.5, 1.0)
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self._tokens = 0.0
+            else:
+                self._stats["errors"] += 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """`async with limiter.slot():` — releases as success unless an error escapes."""
+        await self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            if is_throttle_error(e):
+                self.release("throttled", retry_after_hint(e))
+            else:
+                self.release("error")
+            raise
+        else:
+            self.release("success")
+
+    @contextmanager
+    def slot_sync(self):
+        self.acquire_sync()
+        try:
+            yield
+        except BaseException as e:
+            if is_throttle_error(e):
+                self.release("throttled", retry_after_hint(e))
+            else:
+                self.release("error")
+            raise
+        else:
+            self.release("success")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"limit": self.limit, "in_flight": self.in_flight,
+                          "paused_for": max(0.0, self._paused_until - time.monotonic())})
+        return stats
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model):
+    """Limiteur partagé du process pour `model`."""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = _limiters[model] = AdaptiveRateLimiter()
+        return limiter
+
+
+def limiter_stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {model: limiter.stats() for model, limiter in limiters.items()}
@@ -0,0 +1,187 @@
+# retrieval.py
+"""Récupération locale de passages de la base de connaissances (BM25).
+
+`retrieve_from_rag` used to paste the whole of `agentia.txt` into every
+prompt, so token cost and latency grew with the size of the knowledge
+base. `KnowledgeBaseRetriever` splits the KB into chunks, indexes them with
+BM25 (pure Python, a few milliseconds per query) and returns only the top-k
+chunks for a question. When a vector retriever is supplied (e.g.
+`TicketRAGAgent.retriever`, backed by Chroma) its results are merged with
+the BM25 ranking using reciprocal rank fusion. Only vector hits that are
+chunks of the same KB snapshot are fused: `src.kb_index` keeps the vector
+store in sync with the chunks, and anything else the store may hold
+(older documents, chunks of a superseded KB version) is ignored.
+
+Configuration (read by `src.nodes`):
+- RAG_CONTEXT_MODE: "retrieval" (top-k chunks, default) or "full" (whole KB,
+  previous behaviour) to compare prompt size and latency
+- RAG_TOP_K: number of chunks put in the prompt (default 4)
+- RAG_CHUNK_SIZE: target chunk size in characters (default 800)
+- RAG_HYBRID: "true" to also query the vector retriever (default false)
+"""
+import re
+import math
+from collections import Counter
+
+from src.cache import content_hash
+from src.classifier import normalize_text
+
+
+# Very frequent French/English words carry no retrieval signal.
+STOPWORDS = frozenset("""
+a an and are as at be by de des du do does est et for from how i in is it je
+la le les me mon my of on or ou pour que qui sur the to un une vous what
+with you your
+""".split())
+
+_SECTION_BREAK = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# About one paragraph in N closes its chunk, whatever precedes it
+_BOUNDARY_EVERY = 4
+
+
+def tokenize(text):
+    return [t for t in normalize_text(text).split() if t not in STOPWORDS]
+
+
+def _split_long(paragraph, max_chars):
+    """Split an oversized paragraph on sentence boundaries (then hard-wrap)."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(paragraph):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _ends_chunk(paragraph):
+    """Content-defined boundary: decided by the paragraph's own text only."""
+    return int(content_hash("kb-boundary", paragraph)[:8], 16) % _BOUNDARY_EVERY == 0
+
+
+def chunk_text(text, max_chars=800):
+    """Découpe le texte en passages d'au plus ~`max_chars` caractères.
+
+    Sections separated by `---` lines are never merged together; inside a
+    section, consecutive paragraphs are packed into a chunk, which closes
+    before it would exceed `max_chars` or after a paragraph that is a
+    content-defined boundary. Boundaries depend on the paragraph text, not
+    on its position, so editing, adding or removing a paragraph changes
+    its own chunk (and at most the chunks up to the next boundary), not
+    every later chunk of the section: `src.kb_index` re-embeds only those.
+    """
+    chunks = []
+    for section in _SECTION_BREAK.split(text):
+        current = ""
+        for paragraph in re.split(r"\n\s*\n", section):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            parts = _split_long(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph]
+            for part in parts:
+                if current and len(current) + 2 + len(part) > max_chars:
+                    chunks.append(current)
+                    current = part
+                else:
+                    current = f"{current}\n\n{part}" if current else part
+                if _ends_chunk(part):
+                    chunks.append(current)
+                    current = ""
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """Index inversé BM25 (Okapi) en mémoire."""
+
+    def __init__(self, documents, k1=1.5, b=0.75, counts=None):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = []
+        # Term counts per document; `counts` (aligned with `documents`, None
+        # for documents to tokenize) lets a rebuild reuse them
+        self.counts = []
+        for doc_id, doc in enumerate(documents):
+            counts_of = counts[doc_id] if counts is not None else None
+            counts_of = counts_of if counts_of is not None else Counter(tokenize(doc))
+            self.counts.append(counts_of)
+            self.doc_lengths.append(sum(counts_of.values()))
+            for term, tf in counts_of.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        n = len(self.doc_lengths)
+        self.avg_length = (sum(self.doc_lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self.postings.items()
+        }
+
+    def search(self, query, k=4):
+        """Retourne `[(doc_id, score)]` triés par score décroissant."""
+        scores = {}
+        avg = self.avg_length or 1.0
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fusionne plusieurs classements de clés (liste de listes) par RRF."""
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return [key for key, _ in sorted(fused.items(), key=lambda item: item[1], reverse=True)]
+
+
+class KnowledgeBaseRetriever:
+    """Sélectionne les passages pertinents de la base de connaissances."""
+
+    def __init__(self, text, vector_retriever=None, chunk_size=800, k=4, chunks=None, counts=None):
+        self.text = text
+        # Part of every RAG cache key: editing the knowledge base invalidates answers.
+        self.content_hash = content_hash(text)
+        # `chunks` / `counts`: already split and tokenized by an incremental
+        # build (src.kb_index)
+        self.chunks = chunks if chunks is not None else chunk_text(text, chunk_size)
+        self.index = BM25Index(self.chunks, counts=counts)
+        self._chunk_set = frozenset(self.chunks)
+        self.vector_retriever = vector_retriever
+        self.k = k
+
+    def retrieve(self, query, k=None):
+        """Top-k chunks by BM25 only (synchronous, local)."""
+        k = k or self.k
+        return [self.chunks[doc_id] for doc_id, _ in self.index.search(query, k)]
+
+    async def aretrieve(self, query, k=None):
+        """Top-k chunks, fused with the vector retriever when one is set."""
+        k = k or self.k
+        lexical = self.retrieve(query, k)
+        if self.vector_retriever is None:
+            return lexical
+        try:
+            docs = await self.vector_retriever.ainvoke(query)
+        except Exception as e:
+            print(f"⚠️ Recherche vectorielle indisponible, BM25 seul : {e}")
+            return lexical
+        texts = (getattr(d, "page_content", str(d)) for d in docs)
+        vector = [t for t in texts if t in self._chunk_set]
+        return reciprocal_rank_fusion([lexical, vector])[:k]
+
+    @staticmethod
+    def format_context(chunks):
+        return "\n\n---\n\n".join(chunks)
@@ -0,0 +1,224 @@
+# review.py
+"""File de revue humaine persistante (SQLite/WAL) pour les tickets négatifs.
+
+`human_validation_loop` used to `interrupt()` the whole run as soon as one
+feedback ticket was negative: positive and neutral tickets, and every
+email behind them, waited for someone to paste JSON into Studio. Negative
+tickets are now enqueued here and the feedback branch carries on:
+
+- `enqueue_many` stores the ticket record (with its sentiment and feedback
+  type) once per run and ticket content, so a replayed or resumed run
+  does not add it twice, while a later run (ticket ids restart at 1 in
+  every export) gets its own review; many runs, jobs and processes share
+  the same backlog;
+- reviewers `claim` a batch for a while (REVIEW_CLAIM_SECONDS), so two
+  people do not work on the same tickets, then `decide` approve or reject
+  in bulk. An expired claim goes back to the pool;
+- approved tickets are emailed through `send_ticket_email`
+  (`src.nodes.send_reviewed_tickets`) and the delivery outcome is kept on
+  the review.
+
+Configuration:
+- REVIEW_MODE: "queue" (default) or "interrupt" (pause the run, previous
+  behaviour); read by `src.nodes`
+- REVIEW_PATH: SQLite file (default ".cache/reviews.sqlite3")
+- REVIEW_CLAIM_SECONDS: how long a claim holds tickets (default 900)
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from src.cache import content_hash
+
+
+PENDING, CLAIMED, APPROVED, REJECTED = "pending", "claimed", "approved", "rejected"
+
+
+def review_mode():
+    return os.getenv("REVIEW_MODE", "queue").lower()
+
+
+def review_key(ticket, scope=None):
+    """Clé stable d'une revue : même exécution, même ticket et même contenu => même clé.
+
+    `scope` identifies the run (or job) that produced the ticket; defaults
+    to the record's `run_id`.
+    """
+    scope = scope or ticket.get("run_id") or ""
+    return content_hash("review", scope, ticket.get("id"), ticket.get("subject", ""), ticket.get("body", ""))
+
+
+class ReviewQueue:
+    """Tickets en attente de validation humaine, partagés entre exécutions."""
+
+    _COLUMNS = "id, ticket_id, status, reviewer, claimed_until, ticket, delivery, created_at, decided_at"
+
+    def __init__(self, path=None, claim_seconds=None):
+        self.path = path or os.getenv("REVIEW_PATH", ".cache/reviews.sqlite3")
+        self.claim_seconds = float(claim_seconds or os.getenv("REVIEW_CLAIM_SECONDS", "900"))
+        self._lock = threading.Lock()
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS reviews ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " review_key TEXT NOT NULL UNIQUE,"
+                " ticket_id TEXT,"
+                " status TEXT NOT NULL,"
+                " reviewer TEXT,"
+                " claimed_until REAL,"
+                " ticket TEXT NOT NULL,"
+                " delivery TEXT,"
+                " created_at REAL NOT NULL,"
+                " decided_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reviews_status ON reviews (status, id)")
+            self._conn.commit()
+
+    @staticmethod
+    def _item(row):
+        rid, tid, status, reviewer, claimed_until, ticket, delivery, created_at, decided_at = row
+        return {
+            "review_id": rid,
+            "ticket_id": tid,
+            "status": status,
+            "reviewer": reviewer,
+            "claimed_until": claimed_until,
+            "ticket": json.loads(ticket),
+            "delivery": json.loads(delivery) if delivery else None,
+            "created_at": created_at,
+            "decided_at": decided_at,
+        }
+
+    def _release_expired(self, now):
+        self._conn.execute(
+            "UPDATE reviews SET status = ?, reviewer = NULL, claimed_until = NULL WHERE status = ? AND claimed_until <= ?",
+            (PENDING, CLAIMED, now),
+        )
+
+    # --- producteurs ---
+    def enqueue_many(self, tickets, scope=None):
+        """Ajoute des records de tickets ; retourne le nombre de revues créées.
+
+        `scope` is the run the tickets come from (see `review_key`).
+        """
+        now = time.time()
+        rows = [
+            (review_key(t, scope), None if t.get("id") is None else str(t["id"]), PENDING, json.dumps(t, default=str), now)
+            for t in tickets
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO reviews (review_key, ticket_id, status, ticket, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    # --- relecteurs ---
+    def list(self, status=None, limit=100, offset=0):
+        query, params = f"SELECT {self._COLUMNS} FROM reviews", []
+        if status:
+            query, params = query + " WHERE status = ?", [status]
+        with self._lock:
+            self._release_expired(time.time())
+            self._conn.commit()
+            rows = self._conn.execute(query + " ORDER BY id LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        return [self._item(r) for r in rows]
+
+    def claim(self, reviewer, limit=50, review_ids=None):
+        """Réserve jusqu'à `limit` revues libres (ou celles de `review_ids`) pour `reviewer`."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: reviewers in other processes never claim the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._release_expired(now)
+            query, params = "SELECT id FROM reviews WHERE status = ?", [PENDING]
+            if review_ids is not None:
+                review_ids = [int(r) for r in review_ids]
+                query += f" AND id IN ({','.join('?' * len(review_ids))})" if review_ids else " AND 0"
+                params += review_ids
+            ids = [r[0] for r in self._conn.execute(query + " ORDER BY id LIMIT ?", params + [limit]).fetchall()]
+            self._conn.executemany(
+                "UPDATE reviews SET status = ?, reviewer = ?, claimed_until = ? WHERE id = ?",
+                [(CLAIMED, reviewer, now + self.claim_seconds, rid) for rid in ids],
+            )
+            self._conn.commit()
+            rows = self._rows(ids)
+        return [self._item(r) for r in rows]
+
+    def decide(self, review_ids, approved, reviewer=None):
+        """Approuve ou rejette en bloc ; retourne les revues effectivement décidées.
+
+        Pending reviews, and reviews claimed by `reviewer` (or whose claim
+        expired), can be decided; the others are left untouched.
+        """
+        review_ids = [int(r) for r in review_ids]
+        if not review_ids:
+            return []
+        now = time.time()
+        status = APPROVED if approved else REJECTED
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._release_expired(now)
+            marks = ",".join("?" * len(review_ids))
+            ids = [r[0] for r in self._conn.execute(
+                f"SELECT id FROM reviews WHERE id IN ({marks}) AND (status = ? OR (status = ? AND reviewer IS ?))",
+                review_ids + [PENDING, CLAIMED, reviewer],
+            ).fetchall()]
+            self._conn.executemany(
+                "UPDATE reviews SET status = ?, reviewer = ?, claimed_until = NULL, decided_at = ? WHERE id = ?",
+                [(status, reviewer, now, rid) for rid in ids],
+            )
+            self._conn.commit()
+            rows = self._rows(ids)
+        return [self._item(r) for r in rows]
+
+    def record_delivery(self, outcomes):
+        """Store `{review_id: outcome}` returned by the email path."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE reviews SET delivery = ? WHERE id = ?",
+                [(json.dumps(outcome, default=str), int(rid)) for rid, outcome in outcomes.items()],
+            )
+            self._conn.commit()
+
+    def _rows(self, ids):
+        if not ids:
+            return []
+        return self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM reviews WHERE id IN ({','.join('?' * len(ids))}) ORDER BY id", ids
+        ).fetchall()
+
+    # --- suivi ---
+    def stats(self):
+        with self._lock:
+            self._release_expired(time.time())
+            self._conn.commit()
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM reviews GROUP BY status").fetchall()
+        stats = {PENDING: 0, CLAIMED: 0, APPROVED: 0, REJECTED: 0}
+        stats.update(dict(rows))
+        return stats
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_review_queue() -> ReviewQueue:
+    """File de revue partagée du process."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ReviewQueue()
+    return _queue
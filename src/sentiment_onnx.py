@@ -0,0 +1,149 @@
+# sentiment_onnx.py
+"""Moteur ONNX Runtime (int8 optionnel) pour le modèle de sentiment.
+
+The transformers pipeline runs distilbert in full precision on torch:
+hundreds of MB of RSS per process and several seconds to load. This
+engine runs the same model exported to ONNX, optionally with dynamic
+int8 quantization of its weights, on ONNX Runtime with the Rust fast
+tokenizer (`tokenizers`). At runtime it needs only `onnxruntime`,
+`tokenizers` and `numpy`, not torch.
+
+Export once (needs torch and transformers, e.g. in the image build):
+
+    python -m src.sentiment_onnx --out .cache/sentiment-onnx
+
+It writes `model.onnx`, `model.int8.onnx` (unless `--no-int8`),
+`tokenizer.json` and `labels.json`. `OnnxSentimentPipeline` is called
+like the HF pipeline, so `FeedbackSentimentAgent` and the worker pool
+use it unchanged (`src.sentiment_pool.load_pipeline`).
+`benchmarks/bench_sentiment_engine.py` checks label parity against the
+transformers pipeline and compares load time, RSS and throughput.
+
+Configuration:
+- SENTIMENT_ENGINE: "onnx" to use this engine; read by `src.sentiment_pool`
+- SENTIMENT_ONNX_DIR: exported model directory (default ".cache/sentiment-onnx")
+- SENTIMENT_ONNX_INT8: "false" to run the fp32 model even when the int8
+  one exists (default true)
+- SENTIMENT_MAX_LENGTH: tokens kept per text (default 512)
+"""
+import os
+import sys
+import json
+import argparse
+
+from src.sentiment_pool import SENTIMENT_MODEL
+
+_FP32, _INT8 = "model.onnx", "model.int8.onnx"
+
+
+def _model_dir():
+    return os.getenv("SENTIMENT_ONNX_DIR", ".cache/sentiment-onnx")
+
+
+class OnnxSentimentPipeline:
+    """Classifieur de sentiment ONNX Runtime, interface du pipeline HF."""
+
+    def __init__(self, model_dir=None, int8=None, max_length=None, threads=None):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self._np = np
+        model_dir = model_dir or _model_dir()
+        if int8 is None:
+            int8 = os.getenv("SENTIMENT_ONNX_INT8", "true").lower() in ("1", "true", "yes")
+        path = os.path.join(model_dir, _INT8)
+        if not int8 or not os.path.exists(path):
+            path = os.path.join(model_dir, _FP32)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"no ONNX sentiment model in {model_dir}; run `python -m src.sentiment_onnx`")
+        self.path = path
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(int(max_length or os.getenv("SENTIMENT_MAX_LENGTH", "512")))
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        # Pads each batch to its longest text, like the HF pipeline
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+        with open(os.path.join(model_dir, "labels.json"), "r", encoding="utf-8") as f:
+            self.labels = {int(k): v for k, v in json.load(f).items()}
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _run(self, texts):
+        np = self._np
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(["logits"], feeds)[0]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        return [{"label": self.labels[int(i)], "score": float(p[i])} for i, p in zip(best, probs)]
+
+    def __call__(self, texts, batch_size=32, truncation=True):
+        if isinstance(texts, str):
+            texts = [texts]
+        batch_size = max(1, int(batch_size or 1))
+        results = []
+        for start in range(0, len(texts), batch_size):
+            results.extend(self._run(list(texts[start:start + batch_size])))
+        return results
+
+
+def export(out_dir, model_name=SENTIMENT_MODEL, int8=True, opset=17):
+    """Exporte `model_name` en ONNX (et en int8) dans `out_dir`."""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, "tokenizer.json"))
+    with open(os.path.join(out_dir, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump({str(k): v for k, v in model.config.id2label.items()}, f)
+
+    sample = tokenizer(["an example ticket"], return_tensors="pt")
+    fp32 = os.path.join(out_dir, _FP32)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+    written = [fp32]
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # Weights to int8, activations quantized on the fly
+        quantize_dynamic(fp32, os.path.join(out_dir, _INT8), weight_type=QuantType.QInt8)
+        written.append(os.path.join(out_dir, _INT8))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the sentiment model to ONNX for SENTIMENT_ENGINE=onnx")
+    parser.add_argument("--out", default=_model_dir())
+    parser.add_argument("--model", default=SENTIMENT_MODEL)
+    parser.add_argument("--no-int8", action="store_true", help="skip dynamic int8 quantization")
+    args = parser.parse_args(argv)
+    for path in export(args.out, args.model, int8=not args.no_int8):
+        print(f"✅ {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# sentiment_pool.py
+"""Inférence de sentiment dans un pool de processus (une copie du modèle par worker).
+
+The HF pipeline used to run through `asyncio.to_thread`: inference is
+CPU-bound, so it fought the event loop and the other nodes for the GIL
+and used about one core. With SENTIMENT_BACKEND=process,
+`FeedbackSentimentAgent` hands its texts to `SentimentProcessPool`
+instead:
+
+- SENTIMENT_WORKERS processes (spawned, not forked, so torch starts
+  clean) each load the model once in their initializer and cap the
+  engine's intra-op threads to SENTIMENT_WORKER_THREADS, so workers don't
+  oversubscribe the cores between them;
+- texts are sorted by length and cut into batches of SENTIMENT_BATCH_SIZE
+  that go to the workers over the executor's call queue; labels come back
+  in the original order.
+
+A worker that dies (OOM kill, crash in the engine) breaks the whole
+executor: the call raises, the agent labels those texts with its
+fallback, and the next call starts a fresh set of workers.
+
+Nothing heavy is imported here: the worker processes import this module
+only, not the graph or langchain.
+
+Configuration:
+- SENTIMENT_BACKEND: "thread" (in-process pipeline, default) or "process"
+- SENTIMENT_WORKERS: worker processes (default: CPU count)
+- SENTIMENT_WORKER_THREADS: inference threads per worker (default: CPU count / workers, at least 1)
+- SENTIMENT_BATCH_SIZE: texts per pipeline batch (default 32)
+- SENTIMENT_ENGINE: "transformers" (torch pipeline, default) or "onnx"
+  (`src.sentiment_onnx`, ONNX Runtime, int8 when exported); applies to
+  both backends
+"""
+import os
+import atexit
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+
+
+def sentiment_backend():
+    return os.getenv("SENTIMENT_BACKEND", "thread").lower()
+
+
+def sentiment_engine():
+    return os.getenv("SENTIMENT_ENGINE", "transformers").lower()
+
+
+def normalize_label(result) -> str:
+    """Label du pipeline HF ramené à positive / negative / neutral."""
+    label = result.get("label", "NEUTRAL").lower()
+    if "positive" in label:
+        return "positive"
+    if "negative" in label:
+        return "negative"
+    return "neutral"
+
+
+def load_pipeline(threads=None):
+    """Pipeline de sentiment du moteur SENTIMENT_ENGINE.
+
+    Whatever the engine, the result is called like the HF pipeline:
+    `model(texts, batch_size=..., truncation=True) -> [{"label", "score"}]`.
+    `threads` caps the engine's intra-op threads.
+    """
+    if sentiment_engine() == "onnx":
+        from src.sentiment_onnx import OnnxSentimentPipeline
+
+        return OnnxSentimentPipeline(threads=threads)
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    from transformers import pipeline
+
+    return pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
+
+
+# --- côté worker ---
+_model = None
+
+
+def _init_worker(factory, threads):
+    global _model
+    _model = factory(threads=threads)
+
+
+def _classify(texts, batch_size):
+    results = _model(texts, batch_size=batch_size, truncation=True)
+    return [normalize_label(r) for r in results]
+
+
+# --- côté parent ---
+class SentimentProcessPool:
+    """Pool de processus qui chargent chacun le modèle une fois."""
+
+    def __init__(self, workers=None, batch_size=None, threads=None, factory=load_pipeline):
+        cpus = os.cpu_count() or 1
+        self.workers = max(1, int(workers or os.getenv("SENTIMENT_WORKERS", str(cpus))))
+        self.batch_size = max(1, int(batch_size or os.getenv("SENTIMENT_BATCH_SIZE", "32")))
+        self.threads = max(1, int(threads or os.getenv("SENTIMENT_WORKER_THREADS", str(max(1, cpus // self.workers)))))
+        # `factory(threads=n) -> pipeline`; must be picklable (module-level
+        # function): workers call it to load the model
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the workers and wait until each has loaded the model.
+
+        Raises when the model cannot be loaded (e.g. transformers missing),
+        so the caller can fall back to another backend.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._factory, self.threads),
+            )
+            try:
+                # Spawned workers load the model before running the probes,
+                # so no request pays for it
+                for future in [executor.submit(_classify, ["ok"], 1) for _ in range(self.workers)]:
+                    future.result()
+            except Exception:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            self._executor = executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _drop(self, executor):
+        # Only the broken executor: another call may have replaced it already
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _batches(self, texts):
+        # Sorted by length so each batch pads to similar lengths
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            yield idx, [texts[i] for i in idx]
+
+    def classify(self, texts):
+        """Labels alignés sur `texts`."""
+        self.start()
+        executor = self._executor
+        labels = [None] * len(texts)
+        try:
+            batches = [(idx, executor.submit(_classify, chunk, self.batch_size)) for idx, chunk in self._batches(texts)]
+            for idx, future in batches:
+                for i, label in zip(idx, future.result()):
+                    labels[i] = label
+        except BrokenExecutor:
+            self._drop(executor)
+            raise
+        return labels
+
+    async def aclassify(self, texts):
+        """Version asynchrone : l'event loop attend les workers sans bloquer."""
+        await asyncio.to_thread(self.start)
+        executor = self._executor
+        labels = [None] * len(texts)
+        try:
+            batches = [(idx, asyncio.wrap_future(executor.submit(_classify, chunk, self.batch_size)))
+                       for idx, chunk in self._batches(texts)]
+            for idx, future in batches:
+                for i, label in zip(idx, await future):
+                    labels[i] = label
+        except BrokenExecutor:
+            await asyncio.to_thread(self._drop, executor)
+            raise
+        return labels
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_sentiment_pool() -> SentimentProcessPool:
+    """Pool partagé du process (workers démarrés au premier usage)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SentimentProcessPool()
+                atexit.register(_pool.shutdown)
+    return _pool
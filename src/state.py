@@ -1,44 +1,107 @@
-from typing import List, Dict, TypedDict, Optional
+import operator
+from typing import Annotated, List, Dict, TypedDict, Optional
 # ❌ Ne pas importer add_messages, inutile ici pour des objets de type Ticket
 
+
+def merge_dicts(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Reducer: per-ticket results written by parallel branches are merged by id."""
+    merged = dict(left or {})
+    merged.update(right or {})
+    return merged
+
+
+def merge_records(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Reducer for `ticket_table`: partial records are merged field by field."""
+    merged = dict(left or {})
+    for tid, fields in (right or {}).items():
+        merged[tid] = {**merged.get(tid, {}), **fields}
+    return merged
+
+
 class Ticket(TypedDict):
     id: int
+    thread_id: Optional[str]
+    source: Optional[str]
+    sender: Optional[str]
     subject: str
     body: str
     category: Optional[str]
     sentiment: Optional[str]
     feedback_type: Optional[str]
     validated: Optional[bool]
+    # `sent`: delivered by SMTP; `queued`: accepted by the outbox, which
+    # tracks the final outcome (see /outbox/{ticket_id})
     sent: Optional[bool]
+    queued: Optional[bool]
+    # "queued" or "duplicate" (outbox), "sent" or "failed" (inline)
+    delivery: Optional[str]
+    error: Optional[str]
+    # Thread units (src.threads): ids of the merged customer messages
+    message_ids: Optional[List[int]]
+    # Queries from the combined analysis (src.analysis), used by the RAG branch
+    rag_queries: Optional[List[str]]
+
+
+TICKET_FIELDS = tuple(Ticket.__annotations__)
+
+
+def compact_ticket(ticket) -> Ticket:
+    """Copie réduite aux champs connus d'un Ticket (les champs vides sont omis)."""
+    return {k: ticket[k] for k in TICKET_FIELDS if ticket.get(k) is not None}
 
 
 class GraphState(TypedDict):
+    # Identity of this run (set by load_tickets, kept across resumes): scopes
+    # the idempotency keys of the outbox and of the review queue
+    run_id: Optional[str]
+    # Runs with the same scope share thread classifications (src.threads)
+    thread_scope: Optional[str]
     # --- Données principales ---
+    # Input only: process_ticket moves the tickets into `ticket_table` and
+    # empties this list so it is not carried through every checkpoint.
     tickets: List[Ticket]                      # ✅ liste simple, pas add_messages
+    # Alternative to `tickets`: JSON/JSONL export streamed in micro-batches
+    tickets_path: Optional[str]
     current_ticket: Optional[Ticket]
     ticket_category: Optional[str]
 
+    # One compact record per ticket, keyed by id. Every other field refers
+    # to tickets by id; nodes update records with partial dicts. Holds the
+    # whole run, so it grows with the export and is in every checkpoint.
+    ticket_table: Annotated[Dict[int, Ticket], merge_records]
+
     # --- Catégorisation ---
-    categorized_tickets: List[Ticket]
+    categorized_ids: List[int]
 
     # --- RAG ---
-    information_search_tickets: List[Ticket]
+    information_search_ids: List[int]
     # Tickets routed to the feedback/sentiment branch
-    sentiment_tickets: List[Ticket]
+    sentiment_ids: List[int]
     # Tickets routed to the product complaint branch
-    product_complaint_tickets: List[Ticket]
-    rag_queries: Dict[int, List[str]]
-    rag_answers: Dict[int, str]
+    product_complaint_ids: List[int]
+    # Result fields carry reducers so that, in per-ticket mode (`Send`
+    # fan-out), the updates of concurrent ticket tasks are merged.
+    rag_queries: Annotated[Dict[int, List[str]], merge_dicts]
+    rag_answers: Annotated[Dict[int, str], merge_dicts]
 
     # --- Analyse avancée ---
-    ticket_sentiments: Dict[int, str]
-    ticket_feedback_types: Dict[int, str]
+    ticket_sentiments: Annotated[Dict[int, str], merge_dicts]
+    ticket_feedback_types: Annotated[Dict[int, str], merge_dicts]
 
     # --- Human-in-the-loop ---
-    tickets_for_review: List[Ticket]
-    human_validated_tickets: List[Ticket]
+    tickets_for_review: List[int]
+    # Reviewed ids; the decision is the record's `validated` field
+    human_validated_ids: Annotated[List[int], operator.add]
 
     # --- Mail tracking ---
-    sent_tickets: List[Ticket]
+    # Outcomes (`sent`, `delivery`, `error`) are stored on the records
+    sent_ids: Annotated[List[int], operator.add]
     # product branch sent tracking
-    product_sent_tickets: List[Ticket]
+    product_sent_ids: Annotated[List[int], operator.add]
+
+
+class TicketTask(TypedDict):
+    """Payload d'un `Send` en mode par ticket : un seul ticket catégorisé."""
+    ticket: Ticket
+    run_id: Optional[str]
+    thread_scope: Optional[str]
@@ -0,0 +1,220 @@
+# threads.py
+"""Regroupement des tickets par fil de discussion (`thread_id`).
+
+Every message used to be categorized on its own: support and sales
+replies went through the LLM (and could be emailed) like customer
+messages, and each new message of a thread was classified from scratch.
+`ThreadGrouper` sits in front of the categorizer in `process_ticket`:
+
+- messages from internal senders are dropped: senders whose domain is in
+  INTERNAL_SENDER_DOMAINS (subdomains included) or whose full address is
+  in INTERNAL_SENDERS. A local part alone ("support@") never matches, so
+  a customer writing from support@clientcorp.com is kept;
+- the customer messages of a thread become one unit of work: the record
+  of the thread's first message, whose body holds every customer message
+  and `message_ids` lists the merged ids;
+- a thread already classified (earlier in the run, or in a previous run
+  through the persistent result cache, namespace "thread") keeps its
+  category and sentiment while it has no new customer message. When new
+  messages arrive, the category is kept only if the local fast-path
+  classifier confidently confirms it; otherwise (no fast-path model, low
+  confidence or another label) the thread goes back to the categorizer.
+  Its sentiment is computed again in both cases.
+
+Thread memory is keyed by scope, `source` and `thread_id`: thread ids
+are only unique within one export and one channel. The scope is the
+run's `thread_scope` (see `src.nodes.load_tickets`): THREAD_SCOPE, the
+export path, or the run id, in which case nothing is shared across runs.
+
+Messages without `thread_id` are processed individually, as before.
+
+Configuration:
+- THREADS_ENABLED: "false" to categorize every message on its own (default true)
+- INTERNAL_SENDER_DOMAINS: domains whose senders are internal, e.g.
+  "example.com,mail.example.com" (default none)
+- INTERNAL_SENDERS: full internal addresses, for shared domains, e.g.
+  "support@example.com,sales@example.com" (default none)
+- THREAD_SCOPE: identity shared by the runs that may reuse each other's
+  thread classifications, e.g. a mailbox name (default: export path or run)
+"""
+import os
+
+from src.cache import content_hash, get_result_cache
+from src.classifier import fastpath_threshold, get_fastpath_classifier
+
+
+def threads_enabled():
+    return os.getenv("THREADS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _csv(value):
+    return [v.strip().lower() for v in (value or "").split(",") if v.strip()]
+
+
+def _message_hash(record):
+    return content_hash(record.get("subject", ""), record.get("body", ""))
+
+
+def _thread_key(record):
+    """Thread identity within a run: channel and thread id."""
+    return str(record.get("source") or ""), str(record["thread_id"])
+
+
+def memory_key(scope, record):
+    """Clé du fil dans le cache persistant (namespace "thread")."""
+    return content_hash("thread", scope or "", *_thread_key(record))
+
+
+class ThreadGrouper:
+    """Fusionne les messages clients d'un fil et réutilise son classement."""
+
+    def __init__(self, internal_senders=None, internal_domains=None, cache=None, scope=None):
+        if internal_senders is None:
+            internal_senders = _csv(os.getenv("INTERNAL_SENDERS", ""))
+        if internal_domains is None:
+            internal_domains = _csv(os.getenv("INTERNAL_SENDER_DOMAINS", ""))
+        ignored = [s for s in internal_senders if "@" not in s.strip("@")]
+        if ignored:
+            print(f"⚠️ INTERNAL_SENDERS : adresses incomplètes ignorées {ignored} (utiliser INTERNAL_SENDER_DOMAINS)")
+        self.internal_senders = {s.lower() for s in internal_senders if s not in ignored}
+        self.internal_domains = [d.lower().lstrip("@.") for d in internal_domains]
+        self.scope = scope
+        self._cache = cache if cache is not None else get_result_cache()
+        # Units of the current run and what is known about their thread,
+        # by (source, thread_id)
+        self._units = {}
+        self._memory = {}
+        self._seen = {}
+        self.stats = {"internal": 0, "merged": 0, "reused": 0, "reclassified": 0}
+
+    def is_internal(self, record):
+        sender = record.get("sender")
+        if not sender and "@" in str(record.get("source") or ""):
+            # Some exports put the address in `source` (see ticket.json)
+            sender = record["source"]
+        sender = (sender or "").strip().lower()
+        local, _, domain = sender.rpartition("@")
+        if not local or not domain:
+            return False
+        if sender in self.internal_senders:
+            return True
+        return any(domain == d or domain.endswith("." + d) for d in self.internal_domains)
+
+    # --- regroupement ---
+    def add(self, records):
+        """Intègre un micro-lot ; retourne les unités créées ou complétées, dans l'ordre."""
+        touched = {}
+        for record in records:
+            if self.is_internal(record):
+                self.stats["internal"] += 1
+                continue
+            if not record.get("thread_id"):
+                touched[("ticket", record["id"])] = record
+                continue
+            thread = _thread_key(record)
+            unit = self._units.get(thread)
+            if unit is None:
+                unit = dict(record, message_ids=[record["id"]])
+                self._units[thread] = unit
+                self._seen[thread] = [_message_hash(record)]
+            else:
+                unit["body"] = f"{unit.get('body', '')}\n\n{record.get('body', '')}".strip()
+                unit["message_ids"].append(record["id"])
+                self._seen[thread].append(_message_hash(record))
+                self.stats["merged"] += 1
+            touched[("thread", thread)] = unit
+        return list(touched.values())
+
+    # --- réutilisation ---
+    def _recall(self, units):
+        missing = {}
+        for unit in units:
+            thread = _thread_key(unit)
+            if thread not in self._memory:
+                missing[memory_key(self.scope, unit)] = thread
+        if missing and self._cache is not None:
+            found = self._cache.get_many("thread", list(missing))
+            self._memory.update({missing[k]: v for k, v in found.items() if isinstance(v, dict)})
+        return {t: self._memory[t] for t in map(_thread_key, units) if t in self._memory}
+
+    def _has_new_messages(self, thread, known):
+        seen = known.get("messages", [])
+        return any(h not in seen for h in self._seen.get(thread, []))
+
+    def _confirms_category(self, unit, known):
+        """True when the fast path confidently gives the updated thread its known category."""
+        fastpath = get_fastpath_classifier()
+        if fastpath is None:
+            return False
+        label, confidence = fastpath.predict_ticket(unit)
+        return confidence >= fastpath_threshold() and label == known["category"]
+
+    def plan(self, units):
+        """Split units into `(to_categorize, reused)`.
+
+        Reused units get the thread's stored `category`, and its
+        `sentiment` when the thread has no new customer message; they need
+        no categorization call.
+        """
+        threaded = [u for u in units if u.get("thread_id")]
+        memory = self._recall(threaded)
+        to_categorize, reused = [], []
+        for unit in units:
+            thread = _thread_key(unit) if unit.get("thread_id") else None
+            known = memory.get(thread)
+            if not known or not known.get("category"):
+                to_categorize.append(unit)
+                continue
+            changed = self._has_new_messages(thread, known)
+            if changed and not self._confirms_category(unit, known):
+                self.stats["reclassified"] += 1
+                unit.pop("sentiment", None)
+                to_categorize.append(unit)
+                continue
+            unit["category"] = known["category"]
+            if changed:
+                # New customer messages: the sentiment is checked again
+                unit.pop("sentiment", None)
+            elif known.get("sentiment"):
+                unit["sentiment"] = known["sentiment"]
+            self.stats["reused"] += 1
+            reused.append(unit)
+        return to_categorize, reused
+
+    def remember(self, units):
+        """Store what is known of the thread units (run memory + cache)."""
+        items = {}
+        for unit in units:
+            if not unit.get("thread_id") or not unit.get("category"):
+                continue
+            thread = _thread_key(unit)
+            known = self._memory.get(thread, {})
+            # A sentiment only carries over while the category is unchanged
+            # and no new customer message arrived
+            carry = unit["category"] == known.get("category") and not self._has_new_messages(thread, known)
+            entry = {
+                "category": unit["category"],
+                "sentiment": unit.get("sentiment") or (known.get("sentiment") if carry else None),
+                "messages": list(self._seen.get(thread, [])),
+            }
+            if entry == known:
+                continue
+            self._memory[thread] = entry
+            items[memory_key(self.scope, unit)] = entry
+        if items and self._cache is not None:
+            self._cache.set_many("thread", items)
+
+
+def remember_thread_sentiments(records, sentiments, scope=None):
+    """Attach freshly computed sentiments to the stored thread entries."""
+    cache = get_result_cache()
+    by_key = {
+        memory_key(scope, r): sentiments[r["id"]]
+        for r in records
+        if r.get("thread_id") and r.get("id") in sentiments
+    }
+    if cache is None or not by_key:
+        return
+    known = cache.get_many("thread", list(by_key))
+    updates = {k: {**entry, "sentiment": by_key[k]} for k, entry in known.items() if isinstance(entry, dict)}
+    cache.set_many("thread", updates)
@@ -0,0 +1,74 @@
+# warmup.py
+"""Préchauffage explicite du graphe et des agents.
+
+Agents, the knowledge-base index and the compiled graph are all built
+lazily on first use, which keeps imports and container cold starts fast.
+`warm_up()` builds them ahead of traffic and records what it did;
+`warmup_status()` is what the FastAPI `/ready` endpoint reports.
+
+This module only imports the heavy pieces inside `warm_up()`, so importing
+it (e.g. from service.py) stays cheap.
+
+Configuration:
+- WARMUP_ON_STARTUP: "true" to warm up in a background thread when the
+  service starts; `/ready` then waits for it (default false)
+- WARMUP_SENTIMENT: "false" to skip loading the sentiment model (default true)
+"""
+import os
+import time
+import threading
+
+
+_status = {"state": "idle", "started_at": None, "finished_at": None, "steps": {}, "error": None}
+_status_lock = threading.Lock()
+_thread = None
+
+
+def _step(name, fn):
+    started = time.perf_counter()
+    fn()
+    with _status_lock:
+        _status["steps"][name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def warm_up():
+    """Construit graphe, index KB et agents ; retourne le statut final."""
+    with _status_lock:
+        if _status["state"] in ("running", "done"):
+            return dict(_status)
+        _status.update(state="running", started_at=time.time(), finished_at=None, steps={}, error=None)
+    try:
+        from src.graph import get_graph
+        from src.nodes import get_kb_retriever
+        from src.agents import get_rag_agent, get_sentiment_agent
+        from src.classifier import get_fastpath_classifier
+
+        _step("graph_ms", get_graph)
+        _step("kb_index_ms", get_kb_retriever)
+        _step("fastpath_ms", get_fastpath_classifier)
+        _step("rag_agent_ms", get_rag_agent)
+        if os.getenv("WARMUP_SENTIMENT", "true").lower() in ("1", "true", "yes"):
+            _step("sentiment_agent_ms", get_sentiment_agent)
+        state, error = "done", None
+    except Exception as e:
+        state, error = "failed", repr(e)
+    with _status_lock:
+        _status.update(state=state, error=error, finished_at=time.time())
+        return dict(_status)
+
+
+def start_background_warm_up():
+    """Lance `warm_up()` dans un thread démon (idempotent)."""
+    global _thread
+    with _status_lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    _thread.start()
+
+
+def warmup_status():
+    with _status_lock:
+        status = dict(_status)
+        status["steps"] = dict(_status["steps"])
+    return status
@@ -0,0 +1,61 @@
+import os
+import json
+import random
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class OfflinePipeline:
+    """Fake LLM and outbox sink for whole-graph runs; `sentiment` fixes the LLM's sentiment answer."""
+
+    def __init__(self, fake, outbox):
+        self.fake = fake
+        self.outbox = outbox
+        self.sentiment = "positive"
+
+    def answer(self, text, rng):
+        from benchmarks.fakes import default_answer
+
+        lowered = text.lower()
+        if "texts (json):" in lowered:
+            texts = json.loads(text.split("Texts (JSON):", 1)[1])
+            return json.dumps({k: self.sentiment for k in texts})
+        if "classify the sentiment" in lowered:
+            return self.sentiment
+        return default_answer(text, rng)
+
+    @staticmethod
+    def tickets(n=9, mix=(("information_search", 1), ("feedback", 1), ("product_complaint", 1))):
+        from benchmarks.bench_pipeline import _templates, synthetic_tickets
+
+        return synthetic_tickets(n, dict(mix), _templates(os.path.join(_ROOT, "ticket.json")))
+
+
+@pytest.fixture
+def offline(monkeypatch, tmp_path):
+    """Run the graph offline: fake LLM, outbox without SMTP, fresh singletons."""
+    import src.agents as agents
+    import src.llm as llm
+    import src.review as review
+    import tool.outbox as outbox_module
+    from benchmarks.fakes import install_fake_llm, install_outbox_sink
+
+    for name, value in {
+        "RESULT_CACHE_ENABLED": "false", "FASTPATH_ENABLED": "false", "WARMUP_ON_STARTUP": "false",
+        "THREADS_ENABLED": "false", "EMAIL_DELIVERY_MODE": "outbox", "REVIEW_MODE": "queue",
+        "CHECKPOINTER": "none", "GRAPH_MODE": "batch", "KB_PATH": os.path.join(_ROOT, "agentia.txt"),
+        "REVIEW_PATH": str(tmp_path / "reviews.sqlite3"), "EMBEDDING_CACHE_ENABLED": "false",
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(agents, "_singletons", {})
+    monkeypatch.setattr(review, "_queue", None)
+    pipeline = OfflinePipeline(None, None)
+    pipeline.fake = install_fake_llm(latency=0.0, jitter=0.0, answer=pipeline.answer)
+    pipeline.fake._rng = random.Random(0)
+    pipeline.outbox = install_outbox_sink()
+    yield pipeline
+    pipeline.outbox.stop()
+    outbox_module._outbox = None
+    llm.set_client_factory(None)
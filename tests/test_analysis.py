@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from src.analysis import MAX_QUERIES, _valid, parse_analysis
+
+
+def _entry(**overrides):
+    entry = {"category": "product_complaint", "sentiment": "negative", "queries": ["refund policy"]}
+    entry.update(overrides)
+    return entry
+
+
+def test_valid_normalizes_labels_and_queries():
+    entry = _valid(_entry(category=" 'Feedback'. ", sentiment="POSITIVE",
+                          queries=["  first ", "", 3, "second", "third", "fourth"]))
+    assert entry == {"category": "feedback", "sentiment": "positive", "queries": ["first", "second", "third"]}
+    assert len(entry["queries"]) == MAX_QUERIES
+
+
+def test_valid_defaults_to_no_queries():
+    entry = _entry()
+    del entry["queries"]
+    assert _valid(entry)["queries"] == []
+
+
+@pytest.mark.parametrize("entry", [
+    None,
+    "product_complaint",
+    ["product_complaint", "negative"],
+    _entry(category="billing"),
+    _entry(sentiment="angry"),
+    _entry(sentiment=None),
+    _entry(queries="refund policy"),
+])
+def test_valid_rejects_entries_outside_the_schema(entry):
+    assert _valid(entry) is None
+
+
+def test_parse_analysis_keeps_expected_valid_entries():
+    raw = json.dumps({"1": _entry(), " 2 ": _entry(category="information_search", sentiment="neutral"),
+                      "3": _entry(category="billing"), "99": _entry()})
+    found = parse_analysis(raw, [1, 2, 3])
+    assert set(found) == {"1", "2"}
+    assert found["2"]["category"] == "information_search"
+
+
+def test_parse_analysis_tolerates_fences_and_prose():
+    raw = "Here is the analysis:\n```json\n" + json.dumps({"7": _entry()}) + "\n```\nDone."
+    assert parse_analysis(raw, ["7"]) == {"7": _valid(_entry())}
+
+
+@pytest.mark.parametrize("raw", [None, "", "no json here", "{not json}", "[1, 2]", '"{}"', "} {"])
+def test_parse_analysis_returns_nothing_for_unusable_answers(raw):
+    assert parse_analysis(raw, ["1"]) == {}
+
+
+def test_analyzer_falls_back_for_tickets_missing_from_the_answer(monkeypatch):
+    import asyncio
+
+    import src.llm as llm
+    from benchmarks.fakes import install_fake_llm
+    from src.analysis import MultiTaskAnalyzer
+
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "false")
+    monkeypatch.setattr("src.analysis.record_llm_labels", lambda labels: None)
+
+    def answer(text, rng):
+        # Only the first ticket of each request is analyzed
+        first = json.loads(text.split("Tickets to analyze (JSON):", 1)[1])[0]
+        return json.dumps({first["id"]: _entry()})
+
+    install_fake_llm(latency=0.0, jitter=0.0, answer=answer)
+    try:
+        tickets = [{"id": i, "subject": "Colis", "body": f"Colis {i} cassé"} for i in range(4)]
+        results = asyncio.run(MultiTaskAnalyzer(batch_size=2).analyze(tickets))
+    finally:
+        llm.set_client_factory(None)
+    assert [r is not None for r in results] == [True, False, True, False]
+    assert results[0] == _valid(_entry())
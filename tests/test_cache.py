@@ -0,0 +1,56 @@
+import asyncio
+
+from src.cache import ResultCache
+
+
+def _accessed(cache, key):
+    (value,) = cache._conn.execute("SELECT accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+    return value
+
+
+def _cache(tmp_path, **options):
+    return ResultCache(path=str(tmp_path / "results.sqlite3"), ttl=3600, **options)
+
+
+def test_hits_within_touch_interval_do_not_write(tmp_path):
+    cache = _cache(tmp_path, touch_interval=3600)
+    cache.set_many("category", {"a": "feedback", "b": "product_complaint"})
+    before = _accessed(cache, "a")
+    changes = cache._conn.total_changes
+    for _ in range(5):
+        assert cache.get_many("category", ["a", "b", "missing"]) == {"a": "feedback", "b": "product_complaint"}
+    assert cache._conn.total_changes == changes
+    assert _accessed(cache, "a") == before
+    assert cache.stats("category")["hits"] == 10
+
+
+def test_stale_access_time_is_refreshed(tmp_path):
+    cache = _cache(tmp_path, touch_interval=0)
+    cache.set("rag", "a", "answer")
+    cache._conn.execute("UPDATE entries SET accessed_at = 0")
+    assert cache.get("rag", "a") == "answer"
+    assert _accessed(cache, "a") > 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = _cache(tmp_path, max_entries=2, touch_interval=0)
+    cache.set_many("category", {"old": 1, "used": 2})
+    cache._conn.execute("UPDATE entries SET accessed_at = 0")
+    cache.get("category", "used")
+    cache.set("category", "new", 3)
+    with cache._lock:
+        cache._evict()
+    assert set(cache.get_many("category", ["old", "used", "new"])) == {"used", "new"}
+
+
+def test_async_variants(tmp_path):
+    cache = _cache(tmp_path)
+
+    async def run():
+        await cache.aset_many("analysis", {"a": {"category": "feedback"}})
+        await cache.aset("analysis", "b", {"category": "information_search"})
+        return await cache.aget_many("analysis", ["a", "b", "c"]), await cache.aget("analysis", "c")
+
+    found, missing = asyncio.run(run())
+    assert found == {"a": {"category": "feedback"}, "b": {"category": "information_search"}}
+    assert missing is None
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+import src.categorizer as categorizer
+from src.categorizer import CategorizationEngine
+from src.prompts import BATCH_CATEGORIZATION_PROMPT, CATEGORIZATION_PROMPT
+
+LABELS = {1: "feedback", 2: "information_search", 3: "product_complaint", 4: "feedback", 5: "information_search"}
+
+
+def _tickets(ids=LABELS):
+    return [{"id": i, "subject": f"subject {i}", "body": f"body {i}"} for i in ids]
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Fake single and batch categorization calls; `batch_answer` shapes the batch reply."""
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "false")
+    monkeypatch.setenv("FASTPATH_ENABLED", "false")
+
+    class FakeLLM:
+        singles, batches = [], []
+        in_flight = peak = 0
+        single_answer = staticmethod(lambda ticket: f"  {LABELS[ticket['id']].upper()}\n")
+        batch_answer = staticmethod(lambda tickets: json.dumps({str(t["id"]): LABELS[t["id"]] for t in tickets}))
+
+        async def _call(self, answer):
+            FakeLLM.in_flight += 1
+            FakeLLM.peak = max(FakeLLM.peak, FakeLLM.in_flight)
+            await asyncio.sleep(0.01)
+            FakeLLM.in_flight -= 1
+            return answer
+
+    fake = FakeLLM()
+
+    async def single(ticket):
+        fake.singles.append(ticket.get("id"))
+        return await fake._call(fake.single_answer(ticket))
+
+    async def batch(tickets):
+        fake.batches.append([t["id"] for t in tickets])
+        return await fake._call(fake.batch_answer(tickets))
+
+    monkeypatch.setattr(categorizer, "acategorize_ticket", single)
+    monkeypatch.setattr(categorizer, "acategorize_ticket_batch", batch)
+    return fake
+
+
+def test_only_the_single_prompt_asks_for_a_bare_name():
+    assert "return only the category name" in CATEGORIZATION_PROMPT.lower()
+    batch = BATCH_CATEGORIZATION_PROMPT.lower()
+    assert "return only" not in batch and "json object" in batch
+
+
+def test_concurrent_path_keeps_input_order_and_bounds_calls(llm):
+    labels = asyncio.run(CategorizationEngine(max_concurrency=2, batch_size=1).categorize(_tickets()))
+    assert labels == list(LABELS.values())
+    assert sorted(llm.singles) == list(LABELS)
+    assert llm.peak == 2
+
+
+def test_single_answers_outside_the_categories_are_dropped(llm):
+    llm.single_answer = lambda ticket: "billing" if ticket["id"] == 2 else LABELS[ticket["id"]]
+    labels = asyncio.run(CategorizationEngine(batch_size=1).categorize(_tickets([1, 2, 3])))
+    assert labels == ["feedback", None, "product_complaint"]
+
+
+def test_single_call_errors_leave_the_ticket_uncategorized(llm):
+    def answer(ticket):
+        if ticket["id"] == 3:
+            raise RuntimeError("quota")
+        return LABELS[ticket["id"]]
+
+    llm.single_answer = answer
+    assert asyncio.run(CategorizationEngine(batch_size=1).categorize(_tickets([1, 3]))) == ["feedback", None]
+
+
+def test_batch_path_maps_labels_back_by_id(llm):
+    # The answer lists ids in another order than the request
+    llm.batch_answer = lambda tickets: json.dumps({str(t["id"]): LABELS[t["id"]] for t in reversed(tickets)})
+    labels = asyncio.run(CategorizationEngine(batch_size=2).categorize(_tickets()))
+    assert labels == list(LABELS.values())
+    assert sorted(llm.batches) == [[1, 2], [3, 4], [5]]
+    assert llm.singles == []
+
+
+def test_batch_falls_back_to_single_calls_for_missing_or_invalid_labels(llm):
+    def answer(tickets):
+        # id 2 missing, id 3 outside the categories, id 99 not requested
+        return "```json\n" + json.dumps({"1": "Feedback", "3": "billing", "99": "feedback"}) + "\n```"
+
+    llm.batch_answer = answer
+    labels = asyncio.run(CategorizationEngine(batch_size=3).categorize(_tickets([1, 2, 3])))
+    assert labels == ["feedback", "information_search", "product_complaint"]
+    assert sorted(llm.singles) == [2, 3]
+
+
+def test_failed_or_unparsable_batches_fall_back_to_single_calls(llm):
+    def answer(tickets):
+        if tickets[0]["id"] == 1:
+            raise RuntimeError("timeout")
+        return "I cannot answer in JSON"
+
+    llm.batch_answer = answer
+    labels = asyncio.run(CategorizationEngine(batch_size=2).categorize(_tickets([1, 2, 3, 4])))
+    assert labels == [LABELS[i] for i in (1, 2, 3, 4)]
+    assert sorted(llm.singles) == [1, 2, 3, 4]
+
+
+def test_batch_sends_tickets_without_a_unique_id_individually(llm):
+    tickets = _tickets([1, 2]) + [{"id": 1, "subject": "other", "body": "text"}, {"subject": "no id", "body": "x"}]
+    llm.single_answer = lambda ticket: "feedback"
+    labels = asyncio.run(CategorizationEngine(batch_size=4).categorize(tickets))
+    assert labels == ["feedback", "information_search", "feedback", "feedback"]
+    assert llm.batches == [[1, 2]] and len(llm.singles) == 2
+
+
+def test_identical_tickets_are_sent_once(llm):
+    tickets = _tickets([1, 2]) + [dict(_tickets([1])[0], id=6)]
+    labels = asyncio.run(CategorizationEngine(batch_size=1).categorize(tickets))
+    assert labels == ["feedback", "information_search", "feedback"]
+    assert sorted(llm.singles) == [1, 2]
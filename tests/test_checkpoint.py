@@ -0,0 +1,117 @@
+import json
+import operator
+from typing import Annotated, TypedDict
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, interrupt
+
+from src.checkpoint import CompactCheckpointSaver, SQLiteCheckpointStore
+
+
+class State(TypedDict, total=False):
+    tickets: list
+    log: Annotated[list, operator.add]
+    decision: str
+
+
+def _graph(saver, calls):
+    def categorize(state):
+        calls.append("categorize")
+        return {"log": ["categorized"], "tickets": [{"id": i, "body": "x" * 400} for i in range(3)]}
+
+    def review(state):
+        return {"decision": interrupt({"action": "review_required"})}
+
+    builder = StateGraph(State)
+    builder.add_node("categorize", categorize)
+    builder.add_node("review", review)
+    builder.add_edge(START, "categorize")
+    builder.add_edge("categorize", "review")
+    builder.add_edge("review", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _saver(path, **options):
+    return CompactCheckpointSaver(SQLiteCheckpointStore(str(path)), **options)
+
+
+def _count(saver, table, thread_id=None):
+    sql = f"SELECT COUNT(*) FROM {table}" + (" WHERE thread_id = ?" if thread_id else "")
+    return saver.store._conn.execute(sql, (thread_id,) if thread_id else ()).fetchone()[0]
+
+
+def test_round_trip_and_resume_on_a_new_saver(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    calls = []
+    config = {"configurable": {"thread_id": "job-1"}}
+    first = _graph(_saver(path), calls)
+    first.invoke({"log": ["start"]}, config)
+    assert calls == ["categorize"]
+
+    # A restarted service opens the same file and resumes the interrupt
+    second = _graph(_saver(path), calls)
+    state = second.get_state(config)
+    assert state.next == ("review",)
+    assert state.values["log"] == ["start", "categorized"]
+    assert len(state.values["tickets"]) == 3
+
+    final = second.invoke(Command(resume="approved"), config)
+    assert final["decision"] == "approved"
+    assert calls == ["categorize"]
+
+
+def test_large_blobs_are_compressed_and_read_back(tmp_path):
+    saver = _saver(tmp_path / "c.sqlite3", compress_min=64)
+    graph = _graph(saver, [])
+    config = {"configurable": {"thread_id": "job-z"}}
+    graph.invoke({"log": []}, config)
+    types = {t for (t,) in saver.store._conn.execute("SELECT type FROM blobs WHERE channel = 'tickets'")}
+    assert types and all(t.startswith("z:") for t in types)
+    assert graph.get_state(config).values["tickets"][0]["body"] == "x" * 400
+
+
+def test_unchanged_channels_are_not_rewritten(tmp_path):
+    saver = _saver(tmp_path / "c.sqlite3")
+    graph = _graph(saver, [])
+    config = {"configurable": {"thread_id": "job-d"}}
+    graph.invoke({"log": []}, config)
+    checkpoints = _count(saver, "checkpoints")
+    tickets_blobs = saver.store._conn.execute("SELECT COUNT(*) FROM blobs WHERE channel = 'tickets'").fetchone()[0]
+    # Several checkpoints, one version of the tickets written once
+    assert checkpoints >= 3 and tickets_blobs == 1
+
+
+def test_gc_keeps_the_last_checkpoints_and_their_blobs(tmp_path):
+    saver = _saver(tmp_path / "c.sqlite3", keep=2)
+    graph = _graph(saver, [])
+    config = {"configurable": {"thread_id": "job-gc"}}
+    graph.invoke({"log": []}, config)
+    graph.invoke(Command(resume="ok"), config)
+    assert _count(saver, "checkpoints") > 2
+    before = graph.get_state(config).values
+
+    assert saver.gc() > 0
+    assert _count(saver, "checkpoints") == 2
+    assert graph.get_state(config).values == before
+    # Every remaining blob is referenced by a remaining checkpoint
+    live = set()
+    for (versions,) in saver.store._conn.execute("SELECT versions FROM checkpoints"):
+        live.update(json.loads(versions).items())
+    blobs = set(saver.store._conn.execute("SELECT channel, version FROM blobs").fetchall())
+    assert blobs <= live
+
+
+def test_gc_deletes_idle_threads(tmp_path):
+    saver = _saver(tmp_path / "c.sqlite3", max_age_days=1)
+    graph = _graph(saver, [])
+    for thread_id in ("old", "new"):
+        graph.invoke({"log": []}, {"configurable": {"thread_id": thread_id}})
+    saver.store._conn.execute("UPDATE checkpoints SET created_at = 0 WHERE thread_id = 'old'")
+    saver.gc()
+    assert _count(saver, "checkpoints", "old") == 0
+    assert _count(saver, "blobs", "old") == 0
+    assert _count(saver, "checkpoints", "new") > 0
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import src.categorizer as categorizer
+import src.classifier as classifier
+from src.categorizer import CategorizationEngine
+from src.classifier import FastPathClassifier, record_llm_labels
+
+EXAMPLES = [
+    ("How do I reset my password", "information_search"),
+    ("Where can I find the user guide", "information_search"),
+    ("What are your opening hours", "information_search"),
+    ("Is there documentation for the API", "information_search"),
+    ("Great service, thanks a lot", "feedback"),
+    ("I love the new interface", "feedback"),
+    ("The support team was very helpful", "feedback"),
+    ("Nice update, well done", "feedback"),
+    ("The product arrived broken", "product_complaint"),
+    ("My device stopped working after two days", "product_complaint"),
+    ("The blender is defective and leaks", "product_complaint"),
+    ("Damaged item, I want a refund", "product_complaint"),
+]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return FastPathClassifier().fit(EXAMPLES, epochs=30)
+
+
+@pytest.fixture
+def fastpath(monkeypatch, tmp_path, model):
+    """Shared fast path served by `model`, with its files under tmp_path."""
+    monkeypatch.setenv("FASTPATH_ENABLED", "true")
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "false")
+    monkeypatch.setenv("FASTPATH_MODEL_PATH", str(tmp_path / "model.json"))
+    monkeypatch.setenv("FASTPATH_TRAINING_LOG", str(tmp_path / "labels.jsonl"))
+    copy = FastPathClassifier.from_dict(model.to_dict())
+    monkeypatch.setattr(classifier, "_classifier", copy)
+    monkeypatch.setattr(classifier, "_classifier_loaded", True)
+    monkeypatch.setattr(classifier, "_unsaved", 0)
+    return copy
+
+
+def test_fit_separates_the_training_labels(model):
+    for text, label in EXAMPLES:
+        assert model.predict(text)[0] == label
+    label, confidence = model.predict("the blender arrived broken")
+    assert label == "product_complaint" and 0.0 < confidence <= 1.0
+
+
+def test_fit_rejects_unknown_labels_only():
+    with pytest.raises(ValueError):
+        FastPathClassifier().fit([("hello", "billing")])
+
+
+def test_save_load_round_trip(model, tmp_path):
+    path = str(tmp_path / "model.json")
+    model.save(path)
+    loaded = FastPathClassifier.load(path)
+    for text, _ in EXAMPLES:
+        assert loaded.predict(text)[0] == model.predict(text)[0]
+        assert loaded.predict(text)[1] == pytest.approx(model.predict(text)[1], abs=1e-4)
+
+
+def test_partial_fit_moves_towards_new_labels(model):
+    copy = FastPathClassifier.from_dict(model.to_dict())
+    text = "the invoice total looks wrong"
+    before = copy._softmax(copy._scores(copy.vectorize(text)))["product_complaint"]
+    copy.partial_fit([(text, "product_complaint")] * 20)
+    after = copy._softmax(copy._scores(copy.vectorize(text)))["product_complaint"]
+    assert after > before
+    assert copy.n_examples == model.n_examples + 20
+
+
+def test_online_updates_wait_for_readers_of_the_weights(model):
+    copy = FastPathClassifier.from_dict(model.to_dict())
+    n = copy.n_examples
+    with copy._lock:  # held by predict() and save() while they read the weights
+        learner = threading.Thread(target=copy.partial_fit, args=([("late label", "feedback")],))
+        learner.start()
+        learner.join(0.2)
+        assert learner.is_alive() and copy.n_examples == n
+    learner.join()
+    assert copy.n_examples == n + 1
+
+
+def test_concurrent_saves_do_not_collide(model, tmp_path):
+    path = str(tmp_path / "model.json")
+    errors = []
+
+    def save():
+        try:
+            for _ in range(20):
+                model.save(path)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert FastPathClassifier.load(path).n_examples == model.n_examples
+
+
+def _engine_with_llm(monkeypatch, answer="feedback"):
+    calls = []
+
+    async def fake_categorize(ticket):
+        calls.append(ticket["id"])
+        return answer
+
+    monkeypatch.setattr(categorizer, "acategorize_ticket", fake_categorize)
+    return CategorizationEngine(max_concurrency=4, batch_size=1), calls
+
+
+@pytest.mark.parametrize("threshold, expect_llm", [("0.0", False), ("1.01", True)])
+def test_threshold_decides_which_tickets_reach_the_llm(fastpath, monkeypatch, threshold, expect_llm):
+    monkeypatch.setenv("FASTPATH_CONFIDENCE", threshold)
+    engine, calls = _engine_with_llm(monkeypatch)
+    tickets = [{"id": i, "subject": text, "body": ""} for i, (text, _) in enumerate(EXAMPLES)]
+    labels = asyncio.run(engine.categorize(tickets))
+    if expect_llm:
+        assert sorted(calls) == [t["id"] for t in tickets]
+        assert labels == ["feedback"] * len(tickets)
+    else:
+        assert calls == []
+        assert labels == [label for _, label in EXAMPLES]
+
+
+def test_threshold_splits_confident_and_uncertain_tickets(fastpath, monkeypatch):
+    confident = {"id": 1, "subject": "The product arrived broken", "body": ""}
+    uncertain = {"id": 2, "subject": "zzz qqq", "body": ""}
+    split = (fastpath.predict_ticket(confident)[1] + fastpath.predict_ticket(uncertain)[1]) / 2
+    assert fastpath.predict_ticket(uncertain)[1] < split < fastpath.predict_ticket(confident)[1]
+    monkeypatch.setenv("FASTPATH_CONFIDENCE", str(split))
+    engine, calls = _engine_with_llm(monkeypatch)
+    assert asyncio.run(engine.categorize([confident, uncertain])) == ["product_complaint", "feedback"]
+    assert calls == [2]
+
+
+def test_llm_labels_are_logged_and_learned(fastpath, tmp_path):
+    n = fastpath.n_examples
+    record_llm_labels([({"subject": "odd ticket", "body": "x"}, "feedback"), ({"subject": "y"}, "billing")])
+    rows = [json.loads(line) for line in open(tmp_path / "labels.jsonl", encoding="utf-8")]
+    assert [r["category"] for r in rows] == ["feedback"]
+    assert fastpath.n_examples == n + 1
+
+
+def test_nothing_is_logged_while_the_fast_path_is_disabled(fastpath, monkeypatch, tmp_path):
+    monkeypatch.setenv("FASTPATH_ENABLED", "false")
+    n = fastpath.n_examples
+    record_llm_labels([({"subject": "odd ticket"}, "feedback")])
+    assert not (tmp_path / "labels.jsonl").exists()
+    assert fastpath.n_examples == n
+
+
+def test_training_log_is_rotated(fastpath, monkeypatch, tmp_path):
+    monkeypatch.setenv("FASTPATH_TRAINING_LOG_MAX_MB", str(200 / (1024 * 1024)))
+    for i in range(10):
+        record_llm_labels([({"subject": f"ticket number {i}", "body": "x" * 50}, "feedback")])
+    log, previous = tmp_path / "labels.jsonl", tmp_path / "labels.jsonl.1"
+    assert previous.exists()
+    assert log.stat().st_size < 400 and previous.stat().st_size < 400
+    assert not (tmp_path / "labels.jsonl.2").exists()
+
+
+def test_online_updates_are_saved_every_n_labels(fastpath, monkeypatch, tmp_path):
+    monkeypatch.setenv("FASTPATH_SAVE_EVERY", "3")
+    path = tmp_path / "model.json"
+    record_llm_labels([({"subject": "first"}, "feedback"), ({"subject": "second"}, "feedback")])
+    assert not path.exists()
+    record_llm_labels([({"subject": "third"}, "feedback")])
+    assert FastPathClassifier.load(str(path)).n_examples == fastpath.n_examples
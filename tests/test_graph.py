@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from src.checkpoint import CompactCheckpointSaver, SQLiteCheckpointStore
+from src.graph import create_graph
+
+
+async def _run(graph, payload, config):
+    interrupts = []
+    async for chunk in graph.astream(payload, config, stream_mode="updates"):
+        interrupts.extend(chunk.get("__interrupt__", ()))
+    return interrupts
+
+
+@pytest.fixture
+def saver(tmp_path):
+    saver = CompactCheckpointSaver(SQLiteCheckpointStore(str(tmp_path / "checkpoints.sqlite3")))
+    yield saver
+    saver.store.close()
+
+
+@pytest.mark.parametrize("review_mode", ["queue", "interrupt"])
+def test_checkpointed_run_without_negative_feedback_finishes(offline, saver, monkeypatch, review_mode):
+    monkeypatch.setenv("REVIEW_MODE", review_mode)
+    graph = create_graph("batch", checkpointer=saver)
+    config = {"configurable": {"thread_id": f"no-review-{review_mode}"}}
+    interrupts = asyncio.run(_run(graph, {"tickets": offline.tickets()}, config))
+    assert interrupts == []
+    state = graph.get_state(config)
+    assert state.next == ()
+    assert state.values["ticket_sentiments"] and "negative" not in state.values["ticket_sentiments"].values()
+
+
+def test_queue_mode_never_pauses_on_negative_feedback(offline, saver):
+    offline.sentiment = "negative"
+    graph = create_graph("batch", checkpointer=saver)
+    config = {"configurable": {"thread_id": "queued-review"}}
+    assert asyncio.run(_run(graph, {"tickets": offline.tickets()}, config)) == []
+    assert graph.get_state(config).next == ()
+
+
+def test_interrupt_mode_pauses_for_review_then_finishes(offline, saver, monkeypatch):
+    from langgraph.types import Command
+
+    monkeypatch.setenv("REVIEW_MODE", "interrupt")
+    offline.sentiment = "negative"
+    graph = create_graph("batch", checkpointer=saver)
+    config = {"configurable": {"thread_id": "interrupted-review"}}
+    interrupts = asyncio.run(_run(graph, {"tickets": offline.tickets()}, config))
+    assert [i.value["action"] for i in interrupts] == ["review_required"]
+    # Rejecting every ticket: nothing validated, so no tool step either
+    assert asyncio.run(_run(graph, Command(resume={"validated_tickets": []}), config)) == []
+    assert graph.get_state(config).next == ()
@@ -0,0 +1,95 @@
+import io
+import json
+import asyncio
+
+import pytest
+
+from src.ingest import astream_batches, iter_batches, iter_json_array, iter_jsonl, iter_tickets
+
+TICKETS = [
+    {"id": 1, "subject": "Colis", "body": "Colis abîmé, remboursement ?"},
+    {"id": 2, "subject": "Question", "body": "Comment suivre ma commande ? [voir \"FAQ\"]"},
+    {"id": 3, "subject": "Merci", "body": "Très satisfait {vraiment}", "score": 1e-3},
+]
+
+
+def test_json_array_across_tiny_reads():
+    text = json.dumps(TICKETS + [42, 1.5e10, "x", None, [1, 2]], ensure_ascii=False, indent=2)
+    for read_size in (1, 3, 7, 64):
+        assert list(iter_json_array(io.StringIO(text), read_size=read_size)) == TICKETS + [42, 1.5e10, "x", None, [1, 2]]
+
+
+def test_number_split_between_reads_is_not_truncated():
+    assert list(iter_json_array(io.StringIO("[12345, 678]"), read_size=3)) == [12345, 678]
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "\n[\n]\n"])
+def test_empty_array(text):
+    assert list(iter_json_array(io.StringIO(text), read_size=2)) == []
+
+
+@pytest.mark.parametrize("text, error", [
+    ('{"id": 1}', "expected a JSON array"),
+    ("", "expected a JSON array"),
+    ('[{"id": 1},', "unterminated JSON array"),
+])
+def test_malformed_arrays_raise(text, error):
+    with pytest.raises(ValueError, match=error):
+        list(iter_json_array(io.StringIO(text), read_size=4))
+
+
+def test_truncated_item_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(io.StringIO('[{"id": 1}, {"id": '), read_size=4))
+
+
+def test_jsonl_skips_blank_and_invalid_lines(tmp_path, capsys):
+    path = tmp_path / "tickets.jsonl"
+    lines = [json.dumps(TICKETS[0], ensure_ascii=False), "", "{broken", json.dumps(TICKETS[1], ensure_ascii=False)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    assert list(iter_jsonl(str(path))) == TICKETS[:2]
+    assert "Ligne 3" in capsys.readouterr().out
+
+
+def test_empty_jsonl(tmp_path):
+    path = tmp_path / "empty.jsonl"
+    path.write_bytes(b"")
+    assert list(iter_jsonl(str(path))) == []
+
+
+def test_iter_tickets_sniffs_the_format_and_keeps_objects(tmp_path):
+    array = tmp_path / "export.json"
+    # BOM and leading whitespace are tolerated; non-object items are dropped
+    array.write_text("﻿ \n" + json.dumps(TICKETS + ["noise"], ensure_ascii=False), encoding="utf-8")
+    lines = tmp_path / "export.txt"
+    lines.write_text("\n".join(json.dumps(t, ensure_ascii=False) for t in TICKETS + [[1]]), encoding="utf-8")
+    assert list(iter_tickets(str(array))) == TICKETS
+    assert list(iter_tickets(str(lines))) == TICKETS
+
+
+def test_iter_batches():
+    assert list(iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_batches([], 3)) == []
+
+
+def test_astream_batches_from_file_and_list(tmp_path):
+    path = tmp_path / "export.json"
+    tickets = [{"id": i} for i in range(10)]
+    path.write_text(json.dumps(tickets), encoding="utf-8")
+
+    async def collect(source):
+        return [batch async for batch in astream_batches(source, size=4, prefetch=1)]
+
+    assert asyncio.run(collect(str(path))) == [tickets[0:4], tickets[4:8], tickets[8:]]
+    assert asyncio.run(collect(tickets)) == [tickets[0:4], tickets[4:8], tickets[8:]]
+
+
+def test_astream_batches_surfaces_reader_errors(tmp_path):
+    path = tmp_path / "export.json"
+    path.write_text('[{"id": 1}, {"id": ', encoding="utf-8")
+
+    async def collect():
+        return [batch async for batch in astream_batches(str(path), size=1)]
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect())
@@ -0,0 +1,108 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import src.agents as agents
+import src.graph as graph_module
+from src.graph import create_graph
+
+
+def test_importing_the_graph_builds_nothing():
+    code = (
+        "import sys, src.nodes, src.graph, src.agents\n"
+        "assert src.agents._singletons == {}, src.agents._singletons\n"
+        "assert src.graph._compiled is None\n"
+        "heavy = [m for m in ('langchain_core.prompts', 'langchain_google_genai', 'langchain_chroma',"
+        " 'transformers', 'onnxruntime') if m in sys.modules]\n"
+        "assert not heavy, heavy\n"
+    )
+    done = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=120)
+    assert done.returncode == 0, done.stderr
+
+
+def test_lazy_singleton_builds_once_under_concurrent_first_calls(monkeypatch):
+    monkeypatch.setattr(agents, "_singletons", {})
+    built = []
+
+    def factory():
+        time.sleep(0.05)
+        built.append(object())
+        return built[-1]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(agents.lazy_singleton("slow", factory)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1
+    assert all(r is built[0] for r in results)
+    assert agents.lazy_singleton("slow", factory) is built[0] and len(built) == 1
+
+
+def test_lazy_singleton_names_do_not_wait_for_each_other(monkeypatch):
+    monkeypatch.setattr(agents, "_singletons", {})
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return "slow"
+
+    slow = threading.Thread(target=agents.lazy_singleton, args=("blocked", blocked))
+    slow.start()
+    try:
+        started = time.perf_counter()
+        assert agents.lazy_singleton("quick", lambda: "quick") == "quick"
+        assert time.perf_counter() - started < 1
+    finally:
+        release.set()
+        slow.join()
+
+
+def test_get_graph_compiles_once(monkeypatch):
+    monkeypatch.setattr(graph_module, "_compiled", None)
+    calls = []
+    real = graph_module.create_graph
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        time.sleep(0.05)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(graph_module, "create_graph", counting)
+    monkeypatch.setenv("CHECKPOINTER", "none")
+    graphs = []
+    threads = [threading.Thread(target=lambda: graphs.append(graph_module.get_graph())) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert all(g is graphs[0] for g in graphs)
+    # `from src.graph import app` is the same instance
+    assert graph_module.app is graphs[0]
+
+
+def test_a_run_without_feedback_never_loads_the_sentiment_agent(offline):
+    tickets = offline.tickets(6, mix=(("information_search", 1), ("product_complaint", 1)))
+    asyncio.run(create_graph("batch").ainvoke({"tickets": tickets}))
+    assert "kb_indexer" in agents._singletons
+    assert "sentiment_agent" not in agents._singletons
+
+
+def test_warm_up_builds_everything_and_reports_steps(offline, monkeypatch):
+    import src.warmup as warmup
+
+    monkeypatch.setattr(graph_module, "_compiled", None)
+    monkeypatch.setattr(warmup, "_status", {"state": "idle", "started_at": None, "finished_at": None,
+                                            "steps": {}, "error": None})
+    status = warmup.warm_up()
+    assert status["state"] == "done", status["error"]
+    assert {"graph_ms", "kb_index_ms", "rag_agent_ms", "sentiment_agent_ms"} <= set(status["steps"])
+    assert graph_module._compiled is not None
+    assert {"kb_indexer", "rag_agent", "sentiment_agent"} <= set(agents._singletons)
+    # A second call does nothing more
+    assert warmup.warm_up()["steps"] == status["steps"]
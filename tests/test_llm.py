@@ -0,0 +1,99 @@
+import gc
+import asyncio
+
+import pytest
+
+import src.llm as llm
+
+
+class _Transport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, model, **settings):
+        self.model = model
+        self.client = _Transport()
+
+
+@pytest.fixture
+def factory():
+    llm.set_client_factory(FakeClient)
+    yield FakeClient
+    llm.set_client_factory(None)
+
+
+def test_clients_are_shared_per_model_and_settings(factory):
+    before = llm.registry_stats()
+    a = llm.get_llm("m1", temperature=0)
+    assert llm.get_llm("m1", temperature=0) is a
+    assert llm.get_llm("m1", temperature=1) is not a
+    stats = llm.registry_stats()
+    assert stats["clients_created"] - before["clients_created"] == 2
+    assert stats["client_reuses"] - before["client_reuses"] == 1
+    assert not any(name.startswith("connections") for name in stats)
+
+
+def test_replacing_the_factory_closes_cached_clients(factory):
+    client = llm.get_llm("m2")
+    before = llm.registry_stats()
+    llm.set_client_factory(FakeClient)
+    assert client.client.closed
+    after = llm.registry_stats()
+    assert after["clients_closed"] - before["clients_closed"] == 1
+    assert after["clients_alive"] == before["clients_alive"] - 1
+    assert llm.get_llm("m2") is not client
+
+
+class _AsyncTransport:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncFakeClient(FakeClient):
+    def __init__(self, model, **settings):
+        super().__init__(model, **settings)
+        self.async_client_running = _AsyncTransport()
+
+
+def test_aclose_all_awaits_async_transports():
+    llm.set_client_factory(AsyncFakeClient)
+    try:
+        client = llm.get_llm("m3")
+        asyncio.run(llm.aclose_all())
+        assert client.client.closed and client.async_client_running.closed
+        assert llm.registry_stats()["clients_alive"] == 0
+    finally:
+        llm.set_client_factory(None)
+
+
+def test_close_all_discards_async_closes_without_warning(recwarn):
+    llm.set_client_factory(AsyncFakeClient)
+    try:
+        client = llm.get_llm("m4")
+        llm.close_all()
+        gc.collect()
+        # Nothing can await it outside a loop: the coroutine is closed unawaited
+        assert client.client.closed and not client.async_client_running.closed
+        assert not [w for w in recwarn if "never awaited" in str(w.message)]
+    finally:
+        llm.set_client_factory(None)
+
+
+def test_service_shutdown_closes_llm_clients(offline, monkeypatch):
+    import service
+    import src.jobs as jobs
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(jobs, "_manager", jobs.JobManager())
+    llm.set_client_factory(AsyncFakeClient)
+    with TestClient(service.app):
+        client = llm.get_llm("m5")
+    assert client.async_client_running.closed
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import src.metrics as metrics
+
+pytest.importorskip("prometheus_client")
+from prometheus_client.parser import text_string_to_metric_families  # noqa: E402
+
+
+@pytest.fixture
+def client(offline, monkeypatch):
+    import service
+    import src.jobs as jobs
+
+    monkeypatch.setattr(jobs, "_manager", jobs.JobManager())
+    with TestClient(service.app) as c:
+        yield c
+
+
+def _scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE_LATEST
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+
+def _delta(before, after, name, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    return after.get(key, 0.0) - before.get(key, 0.0)
+
+
+def test_metrics_expose_a_job_run(client, offline):
+    before = _scrape(client)
+    tickets = offline.tickets(9)
+    job_id = client.post("/jobs", json={"tickets": tickets}).json()["job_id"]
+    deadline = time.monotonic() + 30
+    while client.get(f"/jobs/{job_id}").json()["status"] != "done":
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    after = _scrape(client)
+
+    for node in ("load_tickets", "process_ticket", "route_ticket"):
+        assert _delta(before, after, "graph_node_duration_seconds_count", node=node) == 1
+    assert _delta(before, after, "llm_calls_total", agent="categorizer", outcome="ok") > 0
+    assert _delta(before, after, "llm_call_duration_seconds_count", agent="categorizer") > 0
+    routed = sum(_delta(before, after, "tickets_routed_total", category=c)
+                 for c in ("information_search", "feedback", "product_complaint"))
+    assert routed == len(tickets)
+    assert _delta(before, after, "sentiment_backend_total", backend="llm") > 0
+    # Queue depths are refreshed on every scrape
+    assert after[("queue_depth", (("queue", "jobs"),))] == 0
+    assert ("queue_depth", (("queue", "reviews"),)) in after
+    assert ("queue_depth", (("queue", "outbox"),)) in after
+
+
+def test_metrics_endpoint_is_404_when_disabled(client, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_helpers_are_noops_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+
+    async def node(state):
+        return state
+
+    assert metrics.instrument_node("n", node) is node
+    assert metrics.render()[0] == b""
+    noop = metrics._metric(None, "unused_total", "never registered", ("label",))
+    noop.labels("x").inc()
+    noop.labels("x").observe(1.0)
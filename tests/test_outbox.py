@@ -0,0 +1,80 @@
+import time
+
+from tool.outbox import FAILED, PENDING, SENDING, SENT, EmailOutbox, idempotency_key
+
+
+def _message(ticket_id=1, scope="run-a", body="<p>hello</p>"):
+    return {"subject": f"[Ticket #{ticket_id}]", "body": body, "to": "support@example.com",
+            "ticket_id": ticket_id, "scope": scope}
+
+
+def _outbox(tmp_path, sender=None, **kwargs):
+    return EmailOutbox(path=str(tmp_path / "outbox.sqlite3"), sender=sender or (lambda ms: [True] * len(ms)), **kwargs)
+
+
+def test_same_message_in_same_run_is_queued_once(tmp_path):
+    outbox = _outbox(tmp_path)
+    first = outbox.submit_many([_message(), _message()])
+    again = outbox.submit_many([_message()])
+    assert [s for _, s in first] == ["queued", "duplicate"]
+    assert [s for _, s in again] == ["duplicate"]
+    assert outbox.stats()[PENDING] == 1
+
+
+def test_same_ticket_id_and_text_in_another_run_is_queued(tmp_path):
+    outbox = _outbox(tmp_path)
+    outbox.submit_many([_message(scope="run-a")])
+    statuses = outbox.submit_many([_message(scope="run-b")])
+    assert [s for _, s in statuses] == ["queued"]
+    assert outbox.stats()[PENDING] == 2
+    assert idempotency_key(1, "a@b.c", "s", "b", scope="x") != idempotency_key(1, "a@b.c", "s", "b", scope="y")
+
+
+def test_expired_keys_are_purged(tmp_path, monkeypatch):
+    monkeypatch.setenv("OUTBOX_RETENTION_DAYS", "1")
+    outbox = _outbox(tmp_path)
+    outbox.submit_many([_message()])
+    outbox.process_batch()
+    with outbox._lock:
+        outbox._conn.execute("UPDATE outbox SET created_at = created_at - 2 * 86400")
+        outbox._conn.commit()
+    outbox._purged_at = 0.0
+    assert [s for _, s in outbox.submit_many([_message()])] == ["queued"]
+
+
+def test_delivery_retries_then_fails(tmp_path):
+    outbox = _outbox(tmp_path, sender=lambda ms: [False] * len(ms), max_attempts=2, backoff=0)
+    outbox.submit_many([_message()])
+    assert outbox.process_batch() == 1
+    assert outbox.stats()[PENDING] == 1
+    assert outbox.process_batch() == 1
+    status = outbox.delivery_status([1])["1"][0]
+    assert status["status"] == FAILED and status["attempts"] == 2
+
+
+def test_successful_delivery_is_recorded(tmp_path):
+    outbox = _outbox(tmp_path)
+    outbox.submit_many([_message(ticket_id=7)])
+    outbox.process_batch()
+    status = outbox.delivery_status([7])["7"][0]
+    assert status["status"] == SENT and status["sent_at"] is not None
+
+
+def test_claims_do_not_overlap_and_expired_lease_is_reclaimed(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    a = EmailOutbox(path=path, batch_size=3, sender=lambda ms: [True] * len(ms))
+    b = EmailOutbox(path=path, batch_size=3, sender=lambda ms: [True] * len(ms))
+    a.submit_many([_message(ticket_id=i) for i in range(5)])
+    claimed_a = {r[0] for r in a._claim()}
+    claimed_b = {r[0] for r in b._claim()}
+    assert len(claimed_a) == 3 and len(claimed_b) == 2
+    assert not claimed_a & claimed_b
+    assert b._claim() == []
+
+    # The worker holding `claimed_a` crashed: once the lease expires, the
+    # rows go back to the pool
+    with a._lock:
+        a._conn.execute("UPDATE outbox SET next_attempt_at = ? WHERE status = ?", (time.time() - 1, SENDING))
+        a._conn.commit()
+    reclaimed = {r[0] for r in b._claim()} | {r[0] for r in b._claim()}
+    assert reclaimed == claimed_a | claimed_b
@@ -0,0 +1,60 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from src.graph import create_graph
+from src.jobs import summarize_state
+from src.review import get_review_queue
+
+
+def _run(mode, tickets, run_id):
+    state = asyncio.run(create_graph(mode).ainvoke({"tickets": tickets, "run_id": run_id}))
+    summary = summarize_state(state)
+    summary["tickets"] = sorted(summary["tickets"], key=lambda t: t["id"])
+    summary["sent_ids"] = sorted(summary["sent_ids"])
+    summary["product_sent_ids"] = sorted(summary["product_sent_ids"])
+    return summary
+
+
+def _emails(outbox):
+    return Counter((tid, m["to"], m["subject"]) for tid, ms in outbox.delivery_status().items() for m in ms)
+
+
+@pytest.mark.parametrize("sentiment", ["positive", "negative"])
+def test_send_fan_out_matches_batch_mode(offline, monkeypatch, sentiment):
+    offline.sentiment = sentiment
+    tickets = offline.tickets(12)
+    results, emails, reviews = {}, {}, {}
+    for mode in ("batch", "per_ticket"):
+        monkeypatch.setenv("GRAPH_MODE", mode)
+        sent, pending = _emails(offline.outbox), get_review_queue().stats()["pending"]
+        results[mode] = _run(mode, tickets, run_id=f"equivalence-{mode}")
+        emails[mode] = _emails(offline.outbox) - sent
+        reviews[mode] = get_review_queue().stats()["pending"] - pending
+
+    assert results["per_ticket"] == results["batch"]
+    assert results["batch"]["product_sent_ids"]
+    # Same emails for the same tickets; each run has its own idempotency keys
+    assert emails["per_ticket"] == emails["batch"] and emails["batch"]
+    # Negative feedback lands in the review queue once per run in both modes
+    assert reviews["per_ticket"] == reviews["batch"]
+    assert (reviews["batch"] > 0) == (sentiment == "negative")
+
+
+def test_each_ticket_gets_its_own_branch_task(offline):
+    tickets = offline.tickets(12)
+
+    async def tasks():
+        counts = Counter()
+        graph = create_graph("per_ticket")
+        async for chunk in graph.astream({"tickets": tickets}, stream_mode="updates"):
+            counts.update(node for node in chunk if node.endswith("_ticket"))
+        return counts
+
+    counts = asyncio.run(tasks())
+    state = _run("batch", tickets, run_id="fan-out-reference")
+    categories = Counter(t["category"] for t in state["tickets"])
+    assert counts["rag_ticket"] == categories["information_search"]
+    assert counts["feedback_ticket"] == categories["feedback"]
+    assert counts["product_ticket"] == categories["product_complaint"]
@@ -0,0 +1,147 @@
+import time
+import asyncio
+
+import pytest
+
+import src.llm as llm
+from benchmarks.fakes import FakeChatModel, FakeRateLimitError
+from src.ratelimit import AdaptiveRateLimiter, is_throttle_error, retry_after_hint
+
+
+class ThrottleFirst(FakeChatModel):
+    """Fake LLM that answers 429 to its first `throttles` calls."""
+
+    def __init__(self, throttles, **options):
+        super().__init__(latency=0.0, jitter=0.0, **options)
+        self.throttles = throttles
+
+    def _admit(self):
+        with self._lock:
+            if self.stats["throttled"] < self.throttles:
+                self.stats["calls"] += 1
+                self.stats["throttled"] += 1
+                raise FakeRateLimitError(self.retry_after)
+        return super()._admit()
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Route `src.llm` calls through the given limiter."""
+    monkeypatch.setenv("LLM_MAX_ATTEMPTS", "50")
+
+    def use(limiter):
+        monkeypatch.setattr(llm, "_limiter_for", lambda _llm: limiter)
+        return limiter
+
+    return use
+
+
+def test_concurrency_drops_on_429(limited):
+    limiter = limited(AdaptiveRateLimiter(initial_concurrency=8, max_concurrency=8, base_backoff=0.05))
+    # The quota admits 2 calls in flight; the other 6 of the first wave get 429
+    fake = FakeChatModel(latency=0.03, jitter=0.0, capacity=2, retry_after=0.01)
+
+    async def run():
+        return await asyncio.gather(*(llm.ainvoke(fake, "Bonjour") for _ in range(24)))
+
+    responses = asyncio.run(run())
+    stats = limiter.stats()
+    assert len(responses) == 24
+    assert fake.stats["throttled"] > 0
+    assert stats["decreases"] >= 1 and stats["throttled"] == fake.stats["throttled"]
+    assert limiter.limit < 8
+
+
+def test_probes_back_up_after_successes(limited):
+    limiter = limited(AdaptiveRateLimiter(initial_concurrency=4, min_concurrency=1, max_concurrency=4,
+                                          base_backoff=0.01, decrease_factor=0.25))
+    with pytest.raises(FakeRateLimitError):
+        with limiter.slot_sync():
+            FakeChatModel(throttle_rate=1.0).invoke("Bonjour")
+    assert limiter.limit == 1
+    fake = FakeChatModel(latency=0.0, jitter=0.0)
+    # +1 after each full window of `limit` successes: 1 + 2 + 3 calls to reach 4
+    for _ in range(6):
+        llm.invoke(fake, "Bonjour")
+    assert limiter.limit == 4
+    assert limiter.stats()["increases"] == 3
+    llm.invoke(fake, "Bonjour")
+    assert limiter.limit == 4
+
+
+def test_retry_after_is_honoured(limited):
+    limiter = limited(AdaptiveRateLimiter(initial_concurrency=4, base_backoff=0.01))
+    fake = ThrottleFirst(1, retry_after=0.3)
+    started = time.monotonic()
+    llm.invoke(fake, "Bonjour")
+    assert time.monotonic() - started >= 0.3
+    assert fake.stats["calls"] == 2
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_retry_after_pauses_every_caller(limited):
+    limiter = limited(AdaptiveRateLimiter(initial_concurrency=4, base_backoff=0.01))
+
+    async def run():
+        with pytest.raises(FakeRateLimitError):
+            async with limiter.slot():
+                raise FakeRateLimitError(retry_after=0.25)
+        started = time.monotonic()
+        await llm.ainvoke(FakeChatModel(latency=0.0, jitter=0.0), "Bonjour")
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.2
+
+
+class _Response:
+    status_code = 429
+    headers = {"Retry-After": "7"}
+
+
+class _HttpError(Exception):
+    response = _Response()
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+@pytest.mark.parametrize("exc", [
+    FakeRateLimitError(),
+    _HttpError("boom"),
+    ResourceExhausted("quota"),
+    RuntimeError("429 Too Many Requests"),
+    RuntimeError("Error calling model: RESOURCE_EXHAUSTED"),
+    RuntimeError("HTTP 429: quota exceeded"),
+    RuntimeError("rate limit exceeded for project"),
+])
+def test_throttle_errors_are_recognised(exc):
+    assert is_throttle_error(exc)
+
+
+@pytest.mark.parametrize("exc", [
+    RuntimeError("ticket 4290 could not be parsed"),
+    RuntimeError("prompt too long: 14290 tokens"),
+    ValueError("unknown id 429"),
+    ConnectionError("connection refused on port 8429"),
+    RuntimeError("invalid rate limit configuration"),
+])
+def test_errors_mentioning_429_are_not_throttles(exc):
+    assert not is_throttle_error(exc)
+
+
+def test_wrapped_throttle_error_is_recognised():
+    try:
+        try:
+            raise ResourceExhausted("quota")
+        except ResourceExhausted as e:
+            raise RuntimeError("Error calling model") from e
+    except RuntimeError as wrapped:
+        assert is_throttle_error(wrapped)
+
+
+def test_retry_after_hint_sources():
+    assert retry_after_hint(FakeRateLimitError(retry_after=1.5)) == 1.5
+    assert retry_after_hint(_HttpError()) == 7.0
+    assert retry_after_hint(RuntimeError("429 quota. Please retry in 250ms")) == 0.25
+    assert retry_after_hint(RuntimeError("429")) is None
@@ -0,0 +1,75 @@
+import asyncio
+
+from src.retrieval import KnowledgeBaseRetriever, chunk_text, reciprocal_rank_fusion
+
+KB = """Refunds are processed within five business days after the return is received.
+
+---
+
+Voice calling tools let agents phone customers directly from the dashboard.
+
+---
+
+Versioning lets you deploy a new prompt without downtime."""
+
+
+class _Doc:
+    def __init__(self, text):
+        self.page_content = text
+
+
+class FakeVectorRetriever:
+    def __init__(self, texts):
+        self.texts = texts
+
+    async def ainvoke(self, query):
+        return [_Doc(t) for t in self.texts]
+
+
+def test_chunks_follow_sections():
+    assert len(chunk_text(KB)) == 3
+
+
+def test_bm25_ranks_the_matching_chunk_first():
+    kb = KnowledgeBaseRetriever(KB, k=1)
+    assert kb.retrieve("how long do refunds take")[0].startswith("Refunds")
+
+
+def test_hybrid_fuses_only_chunks_of_the_knowledge_base():
+    chunks = chunk_text(KB)
+    stale = "An old document that was never part of the knowledge base."
+    kb = KnowledgeBaseRetriever(KB, vector_retriever=FakeVectorRetriever([stale, chunks[2], chunks[1]]), k=3)
+    found = asyncio.run(kb.aretrieve("voice calling"))
+    assert stale not in found
+    assert set(found) <= set(chunks)
+    assert found[0] == chunks[1]
+
+
+def test_vector_failure_falls_back_to_bm25():
+    class Broken:
+        async def ainvoke(self, query):
+            raise RuntimeError("store down")
+
+    kb = KnowledgeBaseRetriever(KB, vector_retriever=Broken(), k=1)
+    assert asyncio.run(kb.aretrieve("refunds")) == kb.retrieve("refunds")
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "c"]])[0] == "b"
+
+
+def _section(n):
+    return "\n\n".join(f"Paragraph {i}: the support policy number {i} explains how refunds work." for i in range(n))
+
+
+def test_chunk_boundaries_do_not_shift_after_an_edit():
+    original = chunk_text(_section(40), max_chars=300)
+    paragraphs = _section(40).split("\n\n")
+    for edited_text in (
+        "\n\n".join([paragraphs[0].replace("Paragraph 0", "New paragraph")] + paragraphs),
+        "\n\n".join(paragraphs[:20] + [paragraphs[20] + " This sentence was added by an edit."] + paragraphs[21:]),
+    ):
+        edited = chunk_text(edited_text, max_chars=300)
+        changed = set(edited) - set(original)
+        assert len(changed) <= 3
+        assert len(set(original) & set(edited)) >= len(original) - 3
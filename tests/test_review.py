@@ -0,0 +1,84 @@
+import time
+import asyncio
+
+import pytest
+
+from src.review import APPROVED, CLAIMED, PENDING, REJECTED, ReviewQueue, review_key
+
+
+def _ticket(tid=1, body="Produit cassé, très déçu.", run_id="run-a"):
+    return {"id": tid, "subject": "Commande", "body": body, "sentiment": "negative", "run_id": run_id}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return ReviewQueue(path=str(tmp_path / "reviews.sqlite3"), claim_seconds=60)
+
+
+def test_replayed_run_does_not_enqueue_twice(queue):
+    assert queue.enqueue_many([_ticket(1), _ticket(2)]) == 2
+    assert queue.enqueue_many([_ticket(1)]) == 0
+    assert queue.stats()[PENDING] == 2
+
+
+def test_same_ticket_in_another_run_gets_its_own_review(queue):
+    queue.enqueue_many([_ticket(1, run_id="run-a")])
+    assert queue.enqueue_many([_ticket(1, run_id="run-b")]) == 1
+    assert review_key(_ticket(1), scope="x") != review_key(_ticket(1), scope="y")
+
+
+def test_claims_do_not_overlap(queue):
+    queue.enqueue_many([_ticket(i) for i in range(5)])
+    ana = queue.claim("ana", limit=3)
+    bob = queue.claim("bob", limit=3)
+    assert len(ana) == 3 and len(bob) == 2
+    assert not {i["review_id"] for i in ana} & {i["review_id"] for i in bob}
+    assert all(i["status"] == CLAIMED and i["reviewer"] == "ana" for i in ana)
+
+
+def test_expired_claim_returns_to_the_pool(queue):
+    queue.enqueue_many([_ticket(1)])
+    [item] = queue.claim("ana")
+    with queue._lock:
+        queue._conn.execute("UPDATE reviews SET claimed_until = ?", (time.time() - 1,))
+        queue._conn.commit()
+    [again] = queue.claim("bob")
+    assert again["review_id"] == item["review_id"] and again["reviewer"] == "bob"
+
+
+def test_only_the_claimant_decides_a_claimed_review(queue):
+    queue.enqueue_many([_ticket(1), _ticket(2)])
+    claimed = queue.claim("ana", limit=1)
+    ids = [claimed[0]["review_id"]]
+    assert queue.decide(ids, approved=True, reviewer="bob") == []
+    [decided] = queue.decide(ids, approved=True, reviewer="ana")
+    assert decided["status"] == APPROVED
+    # Pending reviews can be decided by anyone; decided ones are final
+    other = [i["review_id"] for i in queue.list(PENDING)]
+    assert [i["status"] for i in queue.decide(other, approved=False, reviewer="bob")] == [REJECTED]
+    assert queue.decide(ids, approved=False, reviewer="ana") == []
+
+
+def test_delivery_outcome_is_recorded(queue):
+    queue.enqueue_many([_ticket(1)])
+    [item] = queue.decide([queue.list()[0]["review_id"]], approved=True)
+    queue.record_delivery({item["review_id"]: {"queued": True, "delivery": "queued"}})
+    assert queue.list()[0]["delivery"] == {"queued": True, "delivery": "queued"}
+
+
+def test_approved_tickets_with_the_same_id_from_two_runs_are_both_sent(monkeypatch):
+    pytest.importorskip("langgraph")
+    import src.nodes as nodes
+
+    submitted = []
+
+    class Outbox:
+        def submit_many(self, messages):
+            submitted.extend(messages)
+            return [(str(i), "queued") for i, _ in enumerate(messages)]
+
+    monkeypatch.setenv("EMAIL_DELIVERY_MODE", "outbox")
+    monkeypatch.setattr(nodes, "get_outbox", lambda: Outbox())
+    outcomes = asyncio.run(nodes.send_reviewed_tickets([_ticket(1, run_id="run-a"), _ticket(1, run_id="run-b")]))
+    assert [o["delivery"] for o in outcomes] == ["queued", "queued"]
+    assert sorted(m["scope"] for m in submitted) == ["run-a", "run-b"]
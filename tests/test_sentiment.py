@@ -0,0 +1,119 @@
+import asyncio
+import json
+import warnings
+
+import pytest
+
+import src.llm as llm
+from src.agents import FeedbackSentimentAgent
+
+# Each text says which label it should get
+TEXTS = ["good", "a much longer text that is bad", "meh", "short and bad", "fine, good", "ok"]
+EXPECTED = ["positive", "negative", "neutral", "negative", "positive", "neutral"]
+
+
+def _label(text):
+    return "negative" if "bad" in text else "positive" if "good" in text else "neutral"
+
+
+class FakePipeline:
+    """HF pipeline stand-in: records the order texts were handed over in."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, batch_size=None, truncation=None):
+        if isinstance(texts, str):
+            texts = [texts]
+        self.calls.append((list(texts), batch_size))
+        return [{"label": _label(t).upper(), "score": 0.9} for t in texts]
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """Agent on the LLM fallback path; `agent.prompts` counts batch and single prompts."""
+    from benchmarks.fakes import install_fake_llm
+
+    monkeypatch.setenv("SENTIMENT_BACKEND", "thread")
+    monkeypatch.setenv("SENTIMENT_LLM_BATCH_SIZE", "4")
+    prompts = {"batch": 0, "single": 0}
+
+    def answer(text, rng):
+        if "Texts (JSON):" in text:
+            prompts["batch"] += 1
+            texts = json.loads(text.split("Texts (JSON):", 1)[1])
+            return agent.batch_answer(texts)
+        prompts["single"] += 1
+        return agent.single_answer(text.split("Text: '''", 1)[1].rsplit("'''", 1)[0])
+
+    install_fake_llm(latency=0.0, jitter=0.0, answer=answer)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        agent = FeedbackSentimentAgent()
+    agent.sentiment_analyzer = None
+    agent.prompts = prompts
+    agent.batch_answer = lambda texts: json.dumps({k: _label(t) for k, t in texts.items()})
+    agent.single_answer = _label
+    yield agent
+    llm.set_client_factory(None)
+
+
+def test_pipeline_batch_sorts_by_length_and_restores_the_order(agent):
+    agent.sentiment_analyzer = FakePipeline()
+    agent.batch_size = 3
+    assert agent.analyze_batch(TEXTS) == EXPECTED
+    [(sent, batch_size)] = agent.sentiment_analyzer.calls
+    assert sent == sorted(TEXTS, key=len) and batch_size == 3
+    assert asyncio.run(agent.aanalyze_batch(TEXTS)) == EXPECTED
+
+
+def test_pipeline_batch_falls_back_to_per_text_calls(agent):
+    pipeline = FakePipeline()
+
+    def flaky(texts, **kwargs):
+        if not isinstance(texts, str):
+            raise RuntimeError("out of memory")
+        return pipeline(texts)
+
+    agent.sentiment_analyzer = flaky
+    assert agent.analyze_batch(TEXTS) == EXPECTED
+    assert len(pipeline.calls) == len(TEXTS)
+
+
+@pytest.mark.parametrize("run", ["sync", "async"])
+def test_llm_batches_map_labels_back_by_index(agent, run):
+    labels = agent.analyze_batch(TEXTS) if run == "sync" else asyncio.run(agent.aanalyze_batch(TEXTS))
+    assert labels == EXPECTED
+    # SENTIMENT_LLM_BATCH_SIZE=4: two prompts for six texts, no single calls
+    assert agent.prompts == {"batch": 2, "single": 0}
+
+
+@pytest.mark.parametrize("run", ["sync", "async"])
+def test_llm_batch_gaps_fall_back_to_single_calls(agent, run):
+    def partial(texts):
+        # Index "1" missing, "2" outside the labels, "9" not asked for
+        return "Sure:\n" + json.dumps({**{k: _label(t) for k, t in texts.items() if k not in ("1", "2")},
+                                       "2": "furious", "9": "positive"})
+
+    agent.batch_answer = partial
+    labels = agent.analyze_batch(TEXTS) if run == "sync" else asyncio.run(agent.aanalyze_batch(TEXTS))
+    assert labels == EXPECTED
+    # Asked again one by one: indexes 1 and 2 of the first chunk, 1 of the second (two texts)
+    assert agent.prompts == {"batch": 2, "single": 3}
+
+
+def test_failed_llm_calls_end_with_the_keyword_heuristic(agent):
+    def broken(_):
+        raise RuntimeError("backend down")
+
+    agent.batch_answer = broken
+    agent.single_answer = broken
+    texts = ["great, thanks", "terrible, it crashes", "a plain message"]
+    expected = ["positive", "negative", "neutral"]
+    assert agent.analyze_batch(texts) == expected
+    assert asyncio.run(agent.aanalyze_batch(texts)) == expected
+
+
+def test_empty_batches(agent):
+    assert agent.analyze_batch([]) == []
+    assert asyncio.run(agent.aanalyze_batch([])) == []
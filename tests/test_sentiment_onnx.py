@@ -0,0 +1,54 @@
+import pytest
+
+# The parity check needs the full model toolchain; the service image has none of it
+for _module in ("numpy", "onnxruntime", "tokenizers", "torch", "transformers"):
+    pytest.importorskip(_module)
+
+from src.sentiment_onnx import OnnxSentimentPipeline, export
+from src.sentiment_pool import SENTIMENT_MODEL
+
+TICKETS = [
+    "My order arrived broken and nobody answers my emails. This is unacceptable.",
+    "Thank you so much, the delivery was fast and the product works perfectly!",
+    "I was charged twice for the same subscription, please refund me immediately.",
+    "Great support team, my issue was solved in minutes. Very happy.",
+    "The app keeps crashing every time I open it, terrible experience.",
+    "I love the new dashboard, it is clear and easy to use.",
+    "Still waiting for my package after three weeks, really disappointed.",
+    "Excellent quality, I will definitely order again.",
+    "The replacement part is wrong again and I have lost a whole day of work.",
+    "Your agent was polite and helpful, thanks for the quick refund.",
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    from transformers import pipeline
+
+    try:
+        model = pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
+    except OSError as e:  # no network and no local copy of the model
+        pytest.skip(f"{SENTIMENT_MODEL} unavailable: {e}")
+    return [r["label"] for r in model(TICKETS, truncation=True)]
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory, reference):
+    out = tmp_path_factory.mktemp("sentiment-onnx")
+    export(str(out), SENTIMENT_MODEL, int8=True)
+    return str(out)
+
+
+@pytest.mark.parametrize("int8", [False, True], ids=["fp32", "int8"])
+def test_onnx_labels_match_transformers_pipeline(model_dir, reference, int8):
+    engine = OnnxSentimentPipeline(model_dir, int8=int8)
+    assert engine.path.endswith("model.int8.onnx" if int8 else "model.onnx")
+    labels = [r["label"] for r in engine(TICKETS, batch_size=4)]
+    assert labels == reference
+
+
+def test_single_text_and_scores(model_dir, reference):
+    engine = OnnxSentimentPipeline(model_dir, int8=False)
+    [result] = engine(TICKETS[0])
+    assert result["label"] == reference[0]
+    assert 0.5 <= result["score"] <= 1.0
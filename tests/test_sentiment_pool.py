@@ -0,0 +1,86 @@
+import asyncio
+import os
+import signal
+import time
+import warnings
+from concurrent.futures import BrokenExecutor
+
+import pytest
+
+from benchmarks.fakes import fake_sentiment_pipeline
+from src.sentiment_pool import SentimentProcessPool
+
+# fake_sentiment_pipeline labels these keywords negative, the rest positive
+TEXTS = ["ok", "this is broken", "a long positive message about the service", "bad", "fine", "not so bad after all"]
+EXPECTED = ["positive", "negative", "positive", "negative", "positive", "negative"]
+
+
+def failing_pipeline(threads=None):
+    raise ImportError("no model here")
+
+
+@pytest.fixture
+def pool():
+    pool = SentimentProcessPool(workers=2, batch_size=2, threads=1, factory=fake_sentiment_pipeline)
+    yield pool
+    pool.shutdown()
+
+
+def _kill_a_worker(pool):
+    process = next(iter(pool._executor._processes.values()))
+    os.kill(process.pid, signal.SIGKILL)
+    process.join(10)
+    time.sleep(0.2)  # let the executor notice
+
+
+def test_labels_come_back_in_input_order(pool):
+    # Batches of two, sorted by length, spread over two workers
+    assert pool.classify(TEXTS) == EXPECTED
+    assert asyncio.run(pool.aclassify(TEXTS)) == EXPECTED
+    assert pool.classify([]) == []
+
+
+def test_start_raises_when_the_model_cannot_load():
+    pool = SentimentProcessPool(workers=1, threads=1, factory=failing_pipeline)
+    # The worker initializer fails, which breaks the executor
+    with pytest.raises(BrokenExecutor):
+        pool.start()
+    assert pool._executor is None
+
+
+def test_a_dead_worker_fails_the_call_then_the_pool_restarts(pool):
+    pool.start()
+    broken = pool._executor
+    _kill_a_worker(pool)
+    with pytest.raises(BrokenExecutor):
+        pool.classify(TEXTS)
+    # The broken executor is dropped; the next call starts fresh workers
+    assert pool.classify(TEXTS) == EXPECTED
+    assert pool._executor is not broken
+
+
+def test_agent_falls_back_when_a_worker_dies(pool, monkeypatch):
+    from src.agents import FeedbackSentimentAgent
+
+    monkeypatch.setenv("SENTIMENT_BACKEND", "thread")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        agent = FeedbackSentimentAgent()
+    agent.pool = pool
+    assert agent.analyze_batch(TEXTS) == EXPECTED
+
+    _kill_a_worker(pool)
+    # Keyword heuristic for this call instead of an exception in the branch
+    assert asyncio.run(agent.aanalyze_batch(["great, thanks", "terrible", "hello"])) == ["positive", "negative", "neutral"]
+    assert asyncio.run(agent.aanalyze_batch(TEXTS)) == EXPECTED
+
+
+def test_agent_uses_the_in_process_pipeline_when_the_pool_cannot_start(monkeypatch):
+    import src.agents as agents
+
+    monkeypatch.setenv("SENTIMENT_BACKEND", "process")
+    failing = SentimentProcessPool(workers=1, threads=1, factory=failing_pipeline)
+    monkeypatch.setattr(agents, "get_sentiment_pool", lambda: failing)
+    with pytest.warns(RuntimeWarning, match="process pool unavailable"):
+        agent = agents.FeedbackSentimentAgent()
+    assert agent.pool is None
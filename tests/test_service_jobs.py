@@ -0,0 +1,119 @@
+import os
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.checkpoint import CompactCheckpointSaver, SQLiteCheckpointStore
+from src.graph import create_graph
+
+
+@pytest.fixture
+def client(offline, monkeypatch, tmp_path):
+    """Service client whose jobs run a checkpointed graph in the current GRAPH_MODE."""
+    import service
+    import src.jobs as jobs
+
+    saver = CompactCheckpointSaver(SQLiteCheckpointStore(str(tmp_path / "checkpoints.sqlite3")))
+    monkeypatch.setattr(jobs, "_manager", jobs.JobManager(
+        workers=2, keep=2, graph_factory=lambda: create_graph(os.environ["GRAPH_MODE"], checkpointer=saver)))
+    with TestClient(service.app) as c:
+        yield c
+    saver.store.close()
+
+
+def _wait(client, job_id, statuses=("done", "failed", "interrupted"), timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_submit_poll_result(client, offline):
+    tickets = offline.tickets()
+    submitted = client.post("/jobs", json={"tickets": tickets})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+
+    job = _wait(client, job_id)
+    assert job["status"] == "done", job
+    # The ticket list is dropped once the job finishes, the count is kept
+    assert job["tickets"] == len(tickets)
+    result = client.get(f"/jobs/{job_id}/result").json()
+    assert result["tickets"] == len(tickets)
+    assert result["result"]
+
+
+def test_result_is_409_until_finished_and_404_for_unknown_jobs(client, offline, monkeypatch):
+    monkeypatch.setenv("REVIEW_MODE", "interrupt")
+    offline.sentiment = "negative"
+    job_id = client.post("/jobs", json={"tickets": offline.tickets()}).json()["job_id"]
+    assert _wait(client, job_id)["status"] == "interrupted"
+    assert client.get(f"/jobs/{job_id}/result").status_code == 409
+    assert client.get("/jobs/missing").status_code == 404
+
+
+def test_events_stream_until_the_job_finishes(client, offline):
+    job_id = client.post("/jobs", json={"tickets": offline.tickets()}).json()["job_id"]
+    with client.stream("GET", f"/jobs/{job_id}/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert [e["seq"] for e in events] == list(range(len(events)))
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "queued" and kinds[-1] == "done"
+    assert "running" in kinds and "node" in kinds
+    # `since` skips events already seen
+    with client.stream("GET", f"/jobs/{job_id}/events", params={"since": len(events) - 1}) as response:
+        tail = [line for line in response.iter_lines() if line.startswith("event: ")]
+    assert tail == ["event: done"]
+
+
+def test_resume_continues_an_interrupted_job(client, offline, monkeypatch):
+    monkeypatch.setenv("REVIEW_MODE", "interrupt")
+    offline.sentiment = "negative"
+    job_id = client.post("/jobs", json={"tickets": offline.tickets()}).json()["job_id"]
+
+    job = _wait(client, job_id)
+    assert job["status"] == "interrupted"
+    [pending] = job["interrupts"]
+    assert pending["id"] and pending["value"]["action"] == "review_required"
+
+    resumed = client.post(f"/jobs/{job_id}/resume", json={"resume": {"validated_tickets": []}})
+    assert resumed.status_code == 202
+    assert _wait(client, job_id, ("done", "failed"))["status"] == "done"
+    # Only an interrupted job can be resumed
+    assert client.post(f"/jobs/{job_id}/resume", json={"resume": None}).status_code == 409
+
+
+def test_resume_answers_each_pending_interrupt_by_id(client, offline, monkeypatch):
+    monkeypatch.setenv("REVIEW_MODE", "interrupt")
+    monkeypatch.setenv("GRAPH_MODE", "per_ticket")
+    offline.sentiment = "negative"
+    job_id = client.post("/jobs", json={"tickets": offline.tickets()}).json()["job_id"]
+
+    pending = _wait(client, job_id)["interrupts"]
+    assert len(pending) > 1
+    # A single unkeyed answer is ambiguous, unknown ids are refused
+    assert client.post(f"/jobs/{job_id}/resume", json={"resume": {"validated_tickets": []}}).status_code == 409
+    assert client.post(f"/jobs/{job_id}/resume", json={"resumes": {"nope": {}}}).status_code == 409
+
+    answers = {i["id"]: {"validated_tickets": []} for i in pending}
+    assert client.post(f"/jobs/{job_id}/resume", json={"resumes": answers}).status_code == 202
+    assert _wait(client, job_id, ("done", "failed"))["status"] == "done"
+
+
+def test_interrupted_jobs_are_evicted_like_finished_ones(client, offline, monkeypatch):
+    monkeypatch.setenv("REVIEW_MODE", "interrupt")
+    offline.sentiment = "negative"
+    ids = []
+    for _ in range(3):
+        ids.append(client.post("/jobs", json={"tickets": offline.tickets(3)}).json()["job_id"])
+        assert _wait(client, ids[-1])["status"] == "interrupted"
+    # keep=2: the oldest interrupted job is gone
+    assert client.get(f"/jobs/{ids[0]}").status_code == 404
+    assert [client.get(f"/jobs/{i}").status_code for i in ids[1:]] == [200, 200]
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.graph import create_graph
+
+
+@pytest.fixture
+def client(offline, monkeypatch):
+    import service
+    import src.jobs as jobs
+
+    monkeypatch.setattr(jobs, "_manager", jobs.JobManager())
+    with TestClient(service.app) as c:
+        yield c
+
+
+@pytest.fixture
+def reviews(offline, client):
+    """Run the graph once with negative feedback: its tickets wait in the review queue."""
+    offline.sentiment = "negative"
+    asyncio.run(create_graph("batch").ainvoke({"tickets": offline.tickets()}))
+    items = client.get("/reviews", params={"status": "pending"}).json()["items"]
+    assert items
+    return items
+
+
+def test_approve_sends_the_tickets_and_records_the_delivery(client, reviews):
+    ids = [item["review_id"] for item in reviews]
+    response = client.post("/reviews/approve", json={"review_ids": ids, "reviewer": "ana"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["decided"] == len(ids)
+    # EMAIL_DELIVERY_MODE=outbox: the emails are handed to the durable outbox
+    assert all(item["status"] == "approved" and item["delivery"]["queued"] for item in body["items"])
+
+    stored = client.get("/reviews", params={"status": "approved"}).json()["items"]
+    assert [item["delivery"] for item in stored] == [item["delivery"] for item in body["items"]]
+    # Already decided: a second approval sends nothing
+    assert client.post("/reviews/approve", json={"review_ids": ids, "reviewer": "ana"}).json()["decided"] == 0
+
+
+def test_a_failed_send_is_recorded_on_the_approved_reviews(client, reviews, monkeypatch):
+    import src.nodes as nodes
+
+    async def broken(state):
+        raise ConnectionError("smtp down")
+
+    monkeypatch.setattr(nodes, "send_ticket_email", broken)
+    ids = [item["review_id"] for item in reviews]
+    response = client.post("/reviews/approve", json={"review_ids": ids, "reviewer": "ana"})
+    assert response.status_code == 200
+    for item in response.json()["items"]:
+        assert item["delivery"]["sent"] is False and "smtp down" in item["delivery"]["error"]
+    stored = client.get("/reviews", params={"status": "approved"}).json()["items"]
+    assert len(stored) == len(ids)
+    assert all("smtp down" in item["delivery"]["error"] for item in stored)
@@ -0,0 +1,113 @@
+import smtplib
+
+import pytest
+
+import tool.toolgmail as toolgmail
+from tool.toolgmail import SMTPConnectionPool, build_message
+
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in; `script` maps a recipient to the error its send raises."""
+
+    opened = []
+    script = {}
+    login_error = None
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        FakeSMTP.opened.append(self)
+
+    def ehlo(self):
+        return 250, b"ok"
+
+    def starttls(self):
+        return 220, b"ok"
+
+    def has_extn(self, name):
+        return name == "auth"
+
+    def login(self, user, password):
+        if FakeSMTP.login_error:
+            raise FakeSMTP.login_error
+
+    def noop(self):
+        return 250, b"ok"
+
+    def send_message(self, msg):
+        errors = FakeSMTP.script.get(msg["To"])
+        if errors:
+            error = errors.pop(0)
+            if isinstance(error, smtplib.SMTPServerDisconnected) or getattr(error, "smtp_code", None) == 421:
+                self.closed = True
+            raise error
+        self.sent.append(msg["To"])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeSMTP.opened, FakeSMTP.script, FakeSMTP.login_error = [], {}, None
+    monkeypatch.setattr(toolgmail.smtplib, "SMTP", FakeSMTP)
+    return SMTPConnectionPool(host="smtp.test", port=25, user="bot", password="secret", size=1)
+
+
+def _msg(to):
+    return build_message("Sujet", "Corps", to, "bot@example.com")
+
+
+def test_refused_recipient_fails_without_reconnecting(pool):
+    FakeSMTP.script["bad@example.com"] = [smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"no")})]
+    assert pool.send(_msg("bad@example.com")) is False
+    assert pool.send(_msg("ok@example.com")) is True
+    # The session survived the rejection and was reused
+    assert len(FakeSMTP.opened) == 1
+    assert pool.stats()["reconnects"] == 0 and pool.stats()["failures"] == 1
+
+
+def test_server_reply_error_is_not_retried(pool):
+    FakeSMTP.script["big@example.com"] = [smtplib.SMTPDataError(552, b"message too large")]
+    assert pool.send(_msg("big@example.com")) is False
+    assert len(FakeSMTP.opened) == 1
+    assert FakeSMTP.script["big@example.com"] == []
+
+
+def test_authentication_error_is_not_retried(pool):
+    FakeSMTP.login_error = smtplib.SMTPAuthenticationError(535, b"bad credentials")
+    assert pool.send(_msg("ok@example.com")) is False
+    assert len(FakeSMTP.opened) == 1
+    assert pool.send_many([_msg(f"c{i}@example.com") for i in range(3)]) == [False] * 3
+    assert len(FakeSMTP.opened) == 2
+
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPServerDisconnected("Connection unexpectedly closed"),
+    smtplib.SMTPDataError(421, b"closing channel"),
+    ConnectionResetError("reset by peer"),
+])
+def test_dropped_session_is_retried_on_a_new_one(pool, error):
+    FakeSMTP.script["ok@example.com"] = [error]
+    assert pool.send(_msg("ok@example.com")) is True
+    assert len(FakeSMTP.opened) == 2 and FakeSMTP.opened[0].closed
+    assert FakeSMTP.opened[1].sent == ["ok@example.com"]
+    assert pool.stats()["reconnects"] == 1
+
+
+def test_send_many_skips_refused_message_and_keeps_the_session(pool):
+    FakeSMTP.script["bad@example.com"] = [smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"no")})]
+    recipients = ["a@example.com", "bad@example.com", "b@example.com"]
+    assert pool.send_many([_msg(to) for to in recipients]) == [True, False, True]
+    assert len(FakeSMTP.opened) == 1
+    assert FakeSMTP.opened[0].sent == ["a@example.com", "b@example.com"]
+
+
+def test_send_many_reconnects_after_a_drop(pool):
+    FakeSMTP.script["b@example.com"] = [smtplib.SMTPServerDisconnected("gone")]
+    recipients = ["a@example.com", "b@example.com", "c@example.com"]
+    assert pool.send_many([_msg(to) for to in recipients]) == [True, True, True]
+    assert len(FakeSMTP.opened) == 2
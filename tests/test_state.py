@@ -0,0 +1,65 @@
+from typing import Annotated, Dict, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from src.nodes import _tickets_for
+from src.state import compact_ticket, merge_dicts, merge_records
+
+
+def test_merge_records_merges_fields_of_the_same_ticket():
+    left = {1: {"id": 1, "subject": "a", "category": "feedback"}, 2: {"id": 2, "subject": "b"}}
+    right = {1: {"sentiment": "negative"}, 3: {"id": 3, "subject": "c"}}
+    merged = merge_records(left, right)
+    assert merged == {
+        1: {"id": 1, "subject": "a", "category": "feedback", "sentiment": "negative"},
+        2: {"id": 2, "subject": "b"},
+        3: {"id": 3, "subject": "c"},
+    }
+    # Neither side is modified in place: checkpoints keep their own copies
+    assert left[1] == {"id": 1, "subject": "a", "category": "feedback"}
+    assert right == {1: {"sentiment": "negative"}, 3: {"id": 3, "subject": "c"}}
+
+
+def test_merge_records_later_writes_win_field_by_field():
+    merged = merge_records({1: {"validated": False, "sent": False}}, {1: {"sent": True}})
+    assert merged == {1: {"validated": False, "sent": True}}
+
+
+def test_merge_records_accepts_missing_sides():
+    assert merge_records(None, None) == {}
+    assert merge_records(None, {1: {"id": 1}}) == {1: {"id": 1}}
+    assert merge_records({1: {"id": 1}}, None) == {1: {"id": 1}}
+
+
+def test_merge_dicts_replaces_whole_values():
+    assert merge_dicts({1: "a", 2: "b"}, {2: "c"}) == {1: "a", 2: "c"}
+
+
+def test_parallel_branches_update_the_same_record():
+    class State(TypedDict):
+        ticket_table: Annotated[Dict[int, dict], merge_records]
+
+    graph = StateGraph(State)
+    graph.add_node("sentiment", lambda state: {"ticket_table": {1: {"sentiment": "negative"}}})
+    graph.add_node("email", lambda state: {"ticket_table": {1: {"sent": True}, 2: {"sent": False}}})
+    graph.add_edge(START, "sentiment")
+    graph.add_edge(START, "email")
+    graph.add_edge("sentiment", END)
+    graph.add_edge("email", END)
+    table = {1: {"id": 1, "category": "feedback"}, 2: {"id": 2, "category": "product_complaint"}}
+    final = graph.compile().invoke({"ticket_table": table})["ticket_table"]
+    assert final == {
+        1: {"id": 1, "category": "feedback", "sentiment": "negative", "sent": True},
+        2: {"id": 2, "category": "product_complaint", "sent": False},
+    }
+
+
+def test_compact_ticket_keeps_known_non_empty_fields():
+    ticket = {"id": 4, "subject": "s", "body": "b", "sender": None, "attachments": ["x"], "category": "feedback"}
+    assert compact_ticket(ticket) == {"id": 4, "subject": "s", "body": "b", "category": "feedback"}
+
+
+def test_tickets_for_follows_the_id_list():
+    state = {"ticket_table": {1: {"id": 1}, 2: {"id": 2}, 3: {"id": 3}}, "sentiment_ids": [3, 1, 9]}
+    assert _tickets_for(state, "sentiment_ids") == [{"id": 3}, {"id": 1}]
+    assert _tickets_for(state, "product_complaint_ids") == []
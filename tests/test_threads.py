@@ -0,0 +1,128 @@
+import pytest
+
+import src.threads as threads
+from src.cache import ResultCache
+from src.threads import ThreadGrouper
+
+
+def _msg(mid, body, thread="discussion_001", sender=None, source="gmail"):
+    return {"id": mid, "thread_id": thread, "source": source, "sender": sender or f"client{mid}@example.com",
+            "subject": "Commande", "body": body}
+
+
+class _FastPath:
+    def __init__(self, label, confidence):
+        self.label, self.confidence = label, confidence
+
+    def predict_ticket(self, ticket):
+        return self.label, self.confidence
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(path=str(tmp_path / "results.sqlite3"))
+
+
+@pytest.fixture
+def no_fastpath(monkeypatch):
+    monkeypatch.setattr(threads, "get_fastpath_classifier", lambda: None)
+
+
+def _grouper(cache, scope="mailbox", **kwargs):
+    return ThreadGrouper(internal_senders=kwargs.pop("senders", []), internal_domains=kwargs.pop("domains", []),
+                         cache=cache, scope=scope, **kwargs)
+
+
+def _classify(grouper, records, category, sentiment=None):
+    """One run: group, plan, categorize what needs it, remember."""
+    to_categorize, reused = grouper.plan(grouper.add(records))
+    for unit in to_categorize:
+        unit["category"] = category
+        if sentiment:
+            unit["sentiment"] = sentiment
+    grouper.remember(to_categorize + reused)
+    return to_categorize, reused
+
+
+def test_customer_messages_of_a_thread_become_one_unit(cache):
+    grouper = _grouper(cache)
+    units = grouper.add([_msg(1, "Colis abîmé."), _msg(2, "Toujours rien.", thread="discussion_002")])
+    units += grouper.add([_msg(3, "Des nouvelles ?")])
+    first = [u for u in units if u["thread_id"] == "discussion_001"]
+    assert first[0] is first[-1]
+    assert first[0]["message_ids"] == [1, 3]
+    assert "Colis abîmé." in first[0]["body"] and "Des nouvelles ?" in first[0]["body"]
+    assert grouper.stats["merged"] == 1
+
+
+def test_internal_senders_match_domains_and_full_addresses_only(cache):
+    grouper = _grouper(cache, senders=["support@example.com", "sales@"], domains=["acme-support.com"])
+    internal = [
+        _msg(1, "x", sender="support@example.com"),
+        _msg(2, "x", sender="agent@acme-support.com"),
+        _msg(3, "x", sender="bot@eu.acme-support.com"),
+    ]
+    customers = [
+        _msg(4, "x", sender="support@clientcorp.com"),
+        _msg(5, "x", sender="sales@acme.fr"),
+        _msg(6, "x", sender="client@example.com"),
+        _msg(7, "x", sender="me@notacme-support.com"),
+    ]
+    assert all(grouper.is_internal(r) for r in internal)
+    assert not any(grouper.is_internal(r) for r in customers)
+
+
+def test_unchanged_thread_reuses_category_and_sentiment(cache, no_fastpath):
+    _classify(_grouper(cache), [_msg(1, "Colis abîmé.")], "feedback", "negative")
+    to_categorize, reused = _classify(_grouper(cache), [_msg(1, "Colis abîmé.")], "feedback")
+    assert to_categorize == []
+    assert reused[0]["category"] == "feedback" and reused[0]["sentiment"] == "negative"
+
+
+def test_new_message_without_fast_path_goes_back_to_the_categorizer(cache, no_fastpath):
+    _classify(_grouper(cache), [_msg(1, "Merci, très satisfait.")], "feedback", "positive")
+    grouper = _grouper(cache)
+    to_categorize, reused = grouper.plan(grouper.add([_msg(1, "Merci, très satisfait."), _msg(2, "Produit cassé !")]))
+    assert reused == [] and len(to_categorize) == 1
+    assert "sentiment" not in to_categorize[0]
+    assert grouper.stats["reclassified"] == 1
+
+
+def test_new_message_confirmed_by_fast_path_keeps_category_but_not_sentiment(cache, monkeypatch):
+    monkeypatch.setattr(threads, "get_fastpath_classifier", lambda: _FastPath("feedback", 0.99))
+    _classify(_grouper(cache), [_msg(1, "Merci, très satisfait.")], "feedback", "positive")
+    grouper = _grouper(cache)
+    to_categorize, reused = grouper.plan(grouper.add([_msg(1, "Merci, très satisfait."), _msg(2, "Produit cassé !")]))
+    assert to_categorize == []
+    assert reused[0]["category"] == "feedback" and "sentiment" not in reused[0]
+    grouper.remember(reused)
+    # The stored entry no longer carries the old sentiment
+    [entry] = cache.get_many("thread", [threads.memory_key("mailbox", reused[0])]).values()
+    assert entry["sentiment"] is None
+
+
+def test_new_message_with_another_confident_label_is_reclassified(cache, monkeypatch):
+    monkeypatch.setattr(threads, "get_fastpath_classifier", lambda: _FastPath("product_complaint", 0.99))
+    _classify(_grouper(cache), [_msg(1, "Merci.")], "feedback", "positive")
+    grouper = _grouper(cache)
+    to_categorize, _ = grouper.plan(grouper.add([_msg(1, "Merci."), _msg(2, "Produit cassé !")]))
+    assert len(to_categorize) == 1
+
+
+def test_thread_memory_is_scoped_by_scope_and_source(cache, no_fastpath):
+    _classify(_grouper(cache, scope="export-a"), [_msg(1, "Colis abîmé.")], "feedback", "negative")
+    for grouper, record in (
+        (_grouper(cache, scope="export-b"), _msg(1, "Colis abîmé.")),
+        (_grouper(cache, scope="export-a"), _msg(1, "Colis abîmé.", source="zendesk")),
+    ):
+        to_categorize, reused = grouper.plan(grouper.add([record]))
+        assert reused == [] and len(to_categorize) == 1
+
+
+def test_sentiments_computed_later_are_stored_on_the_thread(cache, no_fastpath, monkeypatch):
+    monkeypatch.setattr(threads, "get_result_cache", lambda: cache)
+    record = _msg(1, "Colis abîmé.")
+    _classify(_grouper(cache), [record], "feedback")
+    threads.remember_thread_sentiments([record], {1: "negative"}, "mailbox")
+    _, reused = _grouper(cache).plan(_grouper(cache).add([_msg(1, "Colis abîmé.")]))
+    assert reused[0]["sentiment"] == "negative"
@@ -0,0 +1,315 @@
+# tool/outbox.py
+"""Boîte d'envoi durable (SQLite/WAL) pour les emails du graphe.
+
+Nodes used to await SMTP inline, so a slow server stalled the whole graph
+run and a failed send was printed and lost. Nodes now `enqueue` rendered
+messages and return at once; background worker threads claim pending
+rows in batches, deliver them through the pooled SMTP sessions
+(`tool.toolgmail.SMTPConnectionPool.send_many`) and record the outcome.
+
+- Every message carries an idempotency key (by default a hash of the run
+  id, ticket id, recipient, subject and body). Enqueuing the same key
+  twice is a no-op, so a resumed or replayed run never sends the same
+  email again, while another run (ticket ids restart at 1 in every
+  export) gets its own key. Sent and failed rows are deleted after
+  OUTBOX_RETENTION_DAYS, and their keys with them.
+- Failed sends are retried with exponential backoff and marked "failed"
+  after `OUTBOX_MAX_ATTEMPTS`.
+- Rows left "sending" by a crashed process are reclaimed once their lease
+  expires; delivery is therefore at-least-once across crashes and
+  exactly-once otherwise.
+
+Configuration:
+- EMAIL_DELIVERY_MODE: "outbox" (default) or "inline" (send from the node,
+  previous behaviour); read by `src.nodes`
+- OUTBOX_PATH: SQLite file (default ".cache/outbox.sqlite3")
+- OUTBOX_WORKERS: delivery threads (default 2)
+- OUTBOX_BATCH_SIZE: messages claimed per batch (default 50)
+- OUTBOX_MAX_ATTEMPTS: attempts before giving up (default 5)
+- OUTBOX_BACKOFF: first retry delay in seconds, doubled each attempt (default 5)
+- OUTBOX_POLL_INTERVAL: idle wait between polls in seconds (default 1)
+- OUTBOX_RETENTION_DAYS: days a delivered or failed message (and its
+  idempotency key) is kept (default 30)
+"""
+import os
+import time
+import sqlite3
+import atexit
+import threading
+
+from src.cache import content_hash
+
+
+PENDING, SENDING, SENT, FAILED = "pending", "sending", "sent", "failed"
+
+# A claimed batch not finished within this many seconds is considered
+# abandoned (crashed worker) and becomes pending again.
+_LEASE_SECONDS = 300
+# Expired rows are purged at most this often
+_PURGE_INTERVAL = 600
+
+
+def idempotency_key(ticket_id, to, subject, body, kind="ticket", scope=None):
+    """Clé stable d'un email : même exécution, même ticket et même contenu => même clé.
+
+    `scope` identifies the run (or job) that produced the message.
+    """
+    return content_hash("outbox", kind, scope or "", ticket_id, to, subject, body)
+
+
+class EmailOutbox:
+    """File d'emails persistante avec statut de livraison par ticket."""
+
+    def __init__(self, path=None, batch_size=None, max_attempts=None, backoff=None, sender=None):
+        self.path = path or os.getenv("OUTBOX_PATH", ".cache/outbox.sqlite3")
+        self.batch_size = max(1, int(batch_size or os.getenv("OUTBOX_BATCH_SIZE", "50")))
+        self.max_attempts = max(1, int(max_attempts or os.getenv("OUTBOX_MAX_ATTEMPTS", "5")))
+        self.backoff = float(backoff if backoff is not None else os.getenv("OUTBOX_BACKOFF", "5"))
+        self.retention = float(os.getenv("OUTBOX_RETENTION_DAYS", "30")) * 86400
+        self._purged_at = 0.0
+        # `sender(list_of_messages) -> list_of_bools`; defaults to the SMTP pool
+        self._sender = sender
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " idempotency_key TEXT NOT NULL UNIQUE,"
+                " ticket_id TEXT,"
+                " recipient TEXT NOT NULL,"
+                " subject TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL,"
+                " last_error TEXT,"
+                " created_at REAL NOT NULL,"
+                " sent_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_ticket ON outbox (ticket_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_created ON outbox (created_at)")
+            self._conn.commit()
+
+    # --- producteurs ---
+    def submit_many(self, messages):
+        """Ajoute des emails `{"subject", "body", "to", "ticket_id"?, "scope"?, "key"?}`.
+
+        Returns `(key, status)` per message, in order: "queued" when the
+        message was added, "duplicate" when its key was already in the
+        outbox (whatever its status), in which case it is ignored.
+        """
+        now = time.time()
+        keys, rows = [], []
+        for m in messages:
+            tid = m.get("ticket_id")
+            key = m.get("key") or idempotency_key(tid, m["to"], m["subject"], m["body"], scope=m.get("scope"))
+            keys.append(key)
+            rows.append((key, None if tid is None else str(tid), m["to"], m["subject"], m["body"], PENDING, now, now))
+        if not rows:
+            return []
+        with self._lock:
+            self._purge_expired(now)
+            existing = set()
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                existing.update(r[0] for r in self._conn.execute(
+                    f"SELECT idempotency_key FROM outbox WHERE idempotency_key IN ({','.join('?' * len(part))})", part
+                ))
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, ticket_id, recipient, subject, body,"
+                " status, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            added = cur.rowcount
+        if added:
+            self._wakeup.set()
+        # A key repeated within `messages` is queued once
+        statuses, seen = [], set()
+        for key in keys:
+            statuses.append((key, "duplicate" if key in existing or key in seen else "queued"))
+            seen.add(key)
+        return statuses
+
+    def enqueue_many(self, messages):
+        """Like `submit_many`; returns the idempotency keys only."""
+        return [key for key, _ in self.submit_many(messages)]
+
+    def _purge_expired(self, now):
+        """Delete sent / failed rows older than the retention (caller holds the lock)."""
+        if now - self._purged_at < _PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        self._conn.execute(
+            "DELETE FROM outbox WHERE created_at < ? AND status IN (?, ?)", (now - self.retention, SENT, FAILED)
+        )
+
+    def enqueue(self, subject, body, to, ticket_id=None, key=None, scope=None):
+        message = {"subject": subject, "body": body, "to": to, "ticket_id": ticket_id, "key": key, "scope": scope}
+        return self.enqueue_many([message])[0]
+
+    # --- livraison ---
+    def _claim(self):
+        """Atomically mark up to `batch_size` due rows as sending and return them."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so workers in other
+            # processes sharing the file never claim the same rows.
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, next_attempt_at = ? WHERE status = ? AND next_attempt_at <= ?",
+                (PENDING, now, SENDING, now),
+            )
+            rows = self._conn.execute(
+                "SELECT id, recipient, subject, body, attempts FROM outbox"
+                " WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (PENDING, now, self.batch_size),
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                    [(SENDING, now + _LEASE_SECONDS, r[0]) for r in rows],
+                )
+            self._conn.commit()
+        return rows
+
+    def _send(self, rows):
+        if self._sender is not None:
+            return self._sender([{"to": r[1], "subject": r[2], "body": r[3]} for r in rows])
+        from tool.toolgmail import build_message, get_smtp_pool
+
+        pool = get_smtp_pool()
+        return pool.send_many([build_message(r[2], r[3], r[1], pool.user) for r in rows])
+
+    def process_batch(self):
+        """Deliver one batch of due messages; returns how many were claimed."""
+        rows = self._claim()
+        if not rows:
+            return 0
+        try:
+            results = list(self._send(rows))
+            error = "send returned False"
+        except Exception as e:
+            results, error = [], repr(e)
+        results += [False] * (len(rows) - len(results))
+
+        now = time.time()
+        updates = []
+        for (row_id, _, _, _, attempts), ok in zip(rows, results):
+            attempts += 1
+            if ok:
+                updates.append((SENT, now, None, now, row_id))
+            elif attempts >= self.max_attempts:
+                updates.append((FAILED, now, error, None, row_id))
+            else:
+                delay = self.backoff * 2 ** (attempts - 1)
+                updates.append((PENDING, now + delay, error, None, row_id))
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, next_attempt_at = ?, last_error = ?, sent_at = ? WHERE id = ?",
+                updates,
+            )
+            self._conn.commit()
+        sent = sum(1 for ok in results if ok)
+        print(f"📬 Outbox : {sent}/{len(rows)} email(s) livré(s).")
+        return len(rows)
+
+    def _run(self, poll_interval):
+        while not self._stop.is_set():
+            try:
+                claimed = self.process_batch()
+            except Exception as e:
+                print(f"❌ Erreur worker outbox : {e}")
+                claimed = 0
+            if not claimed:
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
+
+    def start(self, workers=None, poll_interval=None):
+        """Démarre les threads de livraison (sans effet s'ils tournent déjà)."""
+        workers = max(1, int(workers or os.getenv("OUTBOX_WORKERS", "2")))
+        poll_interval = float(poll_interval or os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+        with self._lock:
+            if self._workers:
+                return
+            self._stop.clear()
+            for i in range(workers):
+                t = threading.Thread(target=self._run, args=(poll_interval,), name=f"outbox-{i}", daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wakeup.set()
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for t in workers:
+            t.join(timeout)
+
+    def flush(self, timeout=30.0):
+        """Wait until nothing is pending or sending; True if the outbox drained."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            counts = self.stats()
+            if not counts.get(PENDING) and not counts.get(SENDING):
+                return True
+            self._wakeup.set()
+            time.sleep(0.05)
+        return False
+
+    # --- suivi ---
+    def delivery_status(self, ticket_ids=None):
+        """`{ticket_id: [{"key", "status", "attempts", "last_error", ...}]}`."""
+        query = "SELECT ticket_id, idempotency_key, recipient, subject, status, attempts, last_error, sent_at FROM outbox"
+        params = []
+        if ticket_ids is not None:
+            ticket_ids = [str(t) for t in ticket_ids]
+            if not ticket_ids:
+                return {}
+            query += f" WHERE ticket_id IN ({','.join('?' * len(ticket_ids))})"
+            params = ticket_ids
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id", params).fetchall()
+        status = {}
+        for tid, key, to, subject, st, attempts, error, sent_at in rows:
+            status.setdefault(tid, []).append({
+                "key": key, "to": to, "subject": subject, "status": st,
+                "attempts": attempts, "last_error": error, "sent_at": sent_at,
+            })
+        return status
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+            workers = len(self._workers)
+        stats = {PENDING: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        stats.update(dict(rows))
+        stats["workers"] = workers
+        return stats
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(start=True) -> EmailOutbox:
+    """Outbox partagée du process ; ses workers démarrent au premier appel."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = EmailOutbox()
+                atexit.register(_outbox.stop)
+    if start:
+        _outbox.start()
+    return _outbox
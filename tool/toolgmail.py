@@ -1,32 +1,298 @@
 # tools/generic_email.py
+"""Outil d'envoi d'emails (SMTP Gmail) avec pool de connexions persistantes.
+
+Opening an SMTP session costs a TCP connect, STARTTLS and AUTH. The pool
+keeps up to `SMTP_POOL_SIZE` authenticated sessions open, checks idle ones
+with NOOP before reuse and reconnects transparently when the server has
+dropped them. `send_many` spreads a list of messages over a few sessions
+so a run notifying hundreds of tickets pays a handful of handshakes.
+
+Configuration (environment variables):
+- GMAIL_USER / GMAIL_APP_PASSWORD: sender credentials
+- SMTP_HOST / SMTP_PORT: server (default smtp.gmail.com:587)
+- SMTP_STARTTLS: "false" for plain local servers such as aiosmtpd (default true)
+- SMTP_POOL_SIZE: max open sessions (default 4)
+- SMTP_KEEPALIVE_CHECK: idle seconds after which a NOOP is sent before reuse (default 30)
+"""
 import os
+import time
+import queue
 import smtplib
 import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-async def send_email(subject: str, body: str, to: str = "tixaf71837@wivstore.com") -> bool:
-    """Envoie un email générique avec sujet et corps HTML ou texte."""
+from src.metrics import record_smtp_failure, record_smtp_send
+
+
+def _sender_credentials():
     sender_email = os.getenv("GMAIL_USER", "mouhamedamine21072002@gmail.com")
     app_password = os.getenv("GMAIL_APP_PASSWORD", "qvjb qycj ovwt xewe")
+    return sender_email, app_password
+
+
+# The server answered the message itself (bad credentials, refused
+# recipients, any 4xx/5xx reply): a new session would get the same answer
+_REJECTED = (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)
+# The session itself was lost: a new session may succeed
+_DROPPED = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def _session_closed(exc) -> bool:
+    """True for a dropped session, including a 421 "closing channel" reply."""
+    if isinstance(exc, _REJECTED):
+        return getattr(exc, "smtp_code", None) == 421
+    return isinstance(exc, _DROPPED)
 
-    def _send():
+
+def build_message(subject: str, body: str, to: str, sender: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = to
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "html"))
+    return msg
+
+
+class SMTPConnectionPool:
+    """Pool de sessions SMTP authentifiées, partagé entre threads."""
+
+    def __init__(self, host=None, port=None, user=None, password=None, size=None,
+                 starttls=None, timeout=30.0, keepalive_check=None):
+        default_user, default_password = _sender_credentials()
+        self.host = host or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = int(port or os.getenv("SMTP_PORT", "587"))
+        self.user = user if user is not None else default_user
+        self.password = password if password is not None else default_password
+        self.size = max(1, int(size or os.getenv("SMTP_POOL_SIZE", "4")))
+        if starttls is None:
+            starttls = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+        self.starttls = starttls
+        self.timeout = timeout
+        self.keepalive_check = float(keepalive_check if keepalive_check is not None else os.getenv("SMTP_KEEPALIVE_CHECK", "30"))
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._stats = {"connections_opened": 0, "connections_closed": 0, "reconnects": 0,
+                       "messages_sent": 0, "failures": 0}
+
+    def _count(self, field, n=1):
+        with self._lock:
+            self._stats[field] += n
+        if field == "failures":
+            record_smtp_failure(n)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
         try:
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
+            server.ehlo()
+            if self.starttls:
                 server.starttls()
-                server.login(sender_email, app_password)
+                server.ehlo()
+            # Local stand-ins usually don't offer AUTH; Gmail does after STARTTLS
+            if self.user and self.password and server.has_extn("auth"):
+                server.login(self.user, self.password)
+        except Exception:
+            self._close(server, count=False)
+            raise
+        self._count("connections_opened")
+        return server
 
-                msg = MIMEMultipart()
-                msg["From"] = sender_email
-                msg["To"] = to
-                msg["Subject"] = subject
-                msg.attach(MIMEText(body, "html"))
+    def _close(self, server, count=True):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+        if count:
+            self._count("connections_closed")
 
-                server.send_message(msg)
-            print(f"✅ Email envoyé à {to} avec sujet '{subject}'.")
+    def _healthy(self, server, idle_since):
+        if time.monotonic() - idle_since < self.keepalive_check:
             return True
-        except Exception as e:
-            print(f"❌ Erreur en envoyant email : {e}")
+        try:
+            return server.noop()[0] == 250
+        except Exception:
             return False
 
-    return await asyncio.to_thread(_send)
+    @contextmanager
+    def connection(self):
+        """Emprunte une session (réutilisée si saine) et la rend au pool."""
+        self._slots.acquire()
+        server = None
+        try:
+            while server is None:
+                try:
+                    candidate, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    server = self._connect()
+                    break
+                if self._healthy(candidate, idle_since):
+                    server = candidate
+                else:
+                    self._close(candidate)
+                    self._count("reconnects")
+            try:
+                yield server
+            except _REJECTED as e:
+                # smtplib resets a session after a rejected message, so it
+                # stays usable unless the server closed it
+                if _session_closed(e):
+                    self._close(server)
+                    server = None
+                raise
+            except Exception:
+                # Session state is unknown after an error: drop it
+                self._close(server)
+                server = None
+                raise
+        finally:
+            if server is not None:
+                self._idle.put((server, time.monotonic()))
+            self._slots.release()
+
+    def _send_on(self, server, msg):
+        started = time.perf_counter()
+        server.send_message(msg)
+        record_smtp_send(time.perf_counter() - started)
+        self._count("messages_sent")
+
+    def send(self, msg) -> bool:
+        """Envoie un message ; une reconnexion est tentée si la session a sauté.
+
+        A rejection by the server (authentication, recipients, any other
+        SMTP reply) fails at once: reconnecting would not change it.
+        """
+        for attempt in range(2):
+            try:
+                with self.connection() as server:
+                    self._send_on(server, msg)
+                return True
+            except _REJECTED as e:
+                if not _session_closed(e) or attempt == 1:
+                    self._count("failures")
+                    print(f"❌ Email refusé par le serveur : {e}")
+                    break
+                self._count("reconnects")
+            except _DROPPED as e:
+                if attempt == 1:
+                    self._count("failures")
+                    print(f"❌ Erreur en envoyant email : {e}")
+                    break
+                self._count("reconnects")
+            except Exception as e:
+                self._count("failures")
+                print(f"❌ Erreur en envoyant email : {e}")
+                break
+        return False
+
+    def _send_share(self, messages):
+        """Send a list of messages back to back on one session."""
+        results = []
+        pending = list(messages)
+        while pending:
+            try:
+                with self.connection() as server:
+                    while pending:
+                        self._send_on(server, pending[0])
+                        pending.pop(0)
+                        results.append(True)
+            except smtplib.SMTPAuthenticationError as e:
+                # No session can be opened: fail the rest of the share
+                self._count("failures", len(pending))
+                print(f"❌ Authentification SMTP refusée : {e}")
+                results.extend([False] * len(pending))
+                pending = []
+            except _REJECTED as e:
+                if _session_closed(e):
+                    self._count("reconnects")
+                    results.append(self.send(pending.pop(0)))
+                    continue
+                # This message is refused; the session goes on with the next
+                self._count("failures")
+                print(f"❌ Email refusé par le serveur : {e}")
+                pending.pop(0)
+                results.append(False)
+            except _DROPPED:
+                # Reconnect once for the message that failed, then move on
+                self._count("reconnects")
+                results.append(self.send(pending.pop(0)))
+            except Exception as e:
+                self._count("failures")
+                print(f"❌ Erreur en envoyant email : {e}")
+                pending.pop(0)
+                results.append(False)
+        return results
+
+    def send_many(self, messages):
+        """Envoie `messages` sur au plus `size` sessions ; retourne une liste de bool."""
+        messages = list(messages)
+        if not messages:
+            return []
+        sessions = min(self.size, len(messages))
+        shares = [messages[i::sessions] for i in range(sessions)]
+        with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="smtp") as pool:
+            outcomes = list(pool.map(self._send_share, shares))
+        # Re-interleave the per-session results into the input order
+        results = [False] * len(messages)
+        for i, share_results in enumerate(outcomes):
+            for j, ok in enumerate(share_results):
+                results[i + j * sessions] = ok
+        return results
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(server)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["idle_connections"] = self._idle.qsize()
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """Pool partagé du process (créé au premier envoi)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPConnectionPool()
+    return _pool
+
+
+async def send_email(subject: str, body: str, to: str = "tixaf71837@wivstore.com") -> bool:
+    """Envoie un email générique avec sujet et corps HTML ou texte."""
+    pool = get_smtp_pool()
+    msg = build_message(subject, body, to, pool.user)
+    ok = await asyncio.to_thread(pool.send, msg)
+    if ok:
+        print(f"✅ Email envoyé à {to} avec sujet '{subject}'.")
+    return ok
+
+
+async def send_many(messages) -> list:
+    """Envoie plusieurs emails `{"subject", "body", "to"}` sur des sessions partagées.
+
+    Returns one bool per message, in order.
+    """
+    pool = get_smtp_pool()
+    built = [build_message(m["subject"], m["body"], m.get("to", "tixaf71837@wivstore.com"), pool.user) for m in messages]
+    results = await asyncio.to_thread(pool.send_many, built)
+    sent = sum(1 for ok in results if ok)
+    print(f"📨 {sent}/{len(results)} email(s) envoyé(s) via {min(pool.size, len(results) or 1)} session(s) SMTP.")
+    return results